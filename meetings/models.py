@@ -138,7 +138,7 @@ class Meeting(models.Model):
         """@return: All TOPs with their id"""
         if not self.meetingtype.tops:
             return None
-        tops_list: list[tops.models.Top] = list(self.top_set.order_by("topid"))
+        tops_list: list[tops.models.Top] = list(self.top_set.select_related("user").order_by("topid"))
         start_id = self.meetingtype.first_topid
         return [(counter + start_id, top) for counter, top in enumerate(tops_list)]
 
@@ -0,0 +1,81 @@
+# pylint: disable=missing-function-docstring
+import datetime
+
+import pytest
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from mixer.backend.django import mixer
+
+from meetingtypes.models import MeetingType
+
+pytestmark = pytest.mark.django_db
+
+
+def create_meeting(attachments):
+    # a user, who may edit their own tops, so the template also looks at the user of every top
+    meetingtype = mixer.blend(
+        "meetingtypes.MeetingType",
+        public=True,
+        protokoll=True,
+        attachment_protokoll=True,
+        tops=True,
+        attachment_tops=True,
+        top_user_edit=True,
+        top_deadline=False,
+        attendance=False,
+        pad_setting=False,
+        write_protokoll_button=False,
+    )
+    meeting = mixer.blend(
+        "meetings.Meeting",
+        meetingtype=meetingtype,
+        imported=False,
+        time=timezone.now() + datetime.timedelta(days=7),
+    )
+    user = mixer.blend("auth.User")
+    user.user_permissions.add(
+        Permission.objects.get_or_create(
+            codename=meetingtype.pk,
+            content_type=ContentType.objects.get_for_model(MeetingType),
+        )[0],
+    )
+    mixer.blend("protokolle.Protokoll", meeting=meeting, published=True, approved=True)
+    for i in range(attachments):
+        mixer.blend(
+            "tops.Top",
+            meeting=meeting,
+            topid=i + 1,
+            user=user,
+            attachment=SimpleUploadedFile(f"top{i}.pdf", b"%PDF-1.4\n"),
+        )
+        mixer.blend(
+            "protokolle.Attachment",
+            meeting=meeting,
+            sort_order=i,
+            attachment=SimpleUploadedFile(f"attachment{i}.pdf", b"%PDF-1.4\n"),
+        )
+    return meeting, user
+
+
+def count_view_meeting_queries(meeting, user):
+    client = Client()
+    client.force_login(user)
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(reverse("meetings:view_meeting", args=[meeting.id]))
+    assert response.status_code == 200
+    return len(queries)
+
+
+def test_view_meeting_queries_do_not_grow_with_attachments(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    # warm up the caches (e.g. of the content types), which are only filled by the first request
+    count_view_meeting_queries(*create_meeting(attachments=0))
+    few = count_view_meeting_queries(*create_meeting(attachments=1))
+    many = count_view_meeting_queries(*create_meeting(attachments=20))
+    assert many == few, "Should not run additional queries per attachment"
@@ -13,6 +13,7 @@ from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from meetingtypes.models import MeetingType
+from meetingtypes.search import deferred_indexing
 from protokolle.models import Attachment, Protokoll
 from toptool.utils.helpers import get_meeting_or_404_on_validation_error
 from toptool.utils.permission import at_least_sitzungsleitung, auth_login_required, require
@@ -327,13 +328,15 @@ def add_meetings_series(request: AuthWSGIRequest, mt_pk: str) -> HttpResponse:
             meeting_times.append(start)
             start += datetime.timedelta(days=cycle)
 
-        for meeting_time in meeting_times:
-            Meeting.objects.create(
-                time=meeting_time,
-                room=room,
-                meetingtype=meetingtype,
-                topdeadline=(meeting_time + deadline_delta if deadline_delta else None),
-            )
+        # the meetings and their standard TOPs are indexed once at the end
+        with deferred_indexing():
+            for meeting_time in meeting_times:
+                Meeting.objects.create(
+                    time=meeting_time,
+                    room=room,
+                    meetingtype=meetingtype,
+                    topdeadline=(meeting_time + deadline_delta if deadline_delta else None),
+                )
 
         return redirect("meetingtypes:view_meetingtype", meetingtype.id)
 
@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class MeetingtypeConfig(AppConfig):
     name = "meetingtypes"
+
+    def ready(self):
+        # registers the signal listeners, which keep the search index up to date
+        # pylint: disable-next=import-outside-toplevel,unused-import
+        from meetingtypes import search  # noqa: F401
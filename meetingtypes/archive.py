@@ -0,0 +1,66 @@
+import datetime
+import os
+from contextlib import suppress
+
+from django.utils import timezone
+
+from protokolle.models import ARCHIVED_EXTENSIONS, Attachment, Protokoll
+from tops.models import Top
+from toptool.models import Blob, BLOB_DIR
+from toptool.utils.archives import archive_name, move_into_archive
+from toptool.utils.files import PRECOMPRESSED_ENCODINGS
+
+from .models import MeetingType
+
+
+def archive_cutoff(years: int) -> datetime.datetime:
+    """
+    @param years: the number of complete years, which are not archived
+    @return: the start of the first year, whose files are not archived
+    """
+    return timezone.make_aware(datetime.datetime(timezone.localdate().year - years, 1, 1))
+
+
+def archive_year(meetingtype: MeetingType, year: int, cutoff: datetime.datetime) -> int:
+    """
+    Moves the generated protokolle and the attachments of the meetings of a meetingtype in the given year into the
+    archive of this year. Attachments are only archived, if no meeting after the cutoff references the same file.
+    The script of a protokoll stays on disk, so it can still be edited.
+
+    @param meetingtype: the meetingtype
+    @param year: the year of the meetings, it has to be before the cutoff
+    @param cutoff: the start of the first year, whose files are not archived (see archive_cutoff)
+    @return: the number of bytes freed on disk
+    """
+    meetings = meetingtype.meeting_set.filter(
+        time__gte=timezone.make_aware(datetime.datetime(year, 1, 1)),
+        time__lt=min(timezone.make_aware(datetime.datetime(year + 1, 1, 1)), cutoff),
+    )
+    protokolle = list(Protokoll.objects.filter(meeting__in=meetings))
+    paths: list[str] = [protokoll.filepath + extension for protokoll in protokolle for extension in ARCHIVED_EXTENSIONS]
+
+    names: set[str] = set()
+    for model in [Attachment, Top]:
+        names.update(
+            model.objects.filter(meeting__in=meetings, attachment__startswith=BLOB_DIR + "/").values_list(
+                "attachment",
+                flat=True,
+            ),
+        )
+    for model in [Attachment, Top]:
+        names.difference_update(
+            model.objects.filter(attachment__in=names, meeting__time__gte=cutoff).values_list("attachment", flat=True),
+        )
+    paths += [blob.file.path for blob in Blob.objects.filter(file__in=names)]
+
+    freed: int = move_into_archive(archive_name(meetingtype.id, year), paths)
+    # the archive is compressed itself, so the compressed copies of archived files are not needed anymore
+    for protokoll in protokolle:
+        for extension in ARCHIVED_EXTENSIONS:
+            if os.path.exists(protokoll.filepath + extension):
+                continue
+            for compressed in PRECOMPRESSED_ENCODINGS.values():
+                with suppress(FileNotFoundError):
+                    freed += os.path.getsize(protokoll.filepath + extension + compressed)
+                    os.remove(protokoll.filepath + extension + compressed)
+    return freed
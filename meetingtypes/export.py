@@ -0,0 +1,96 @@
+import os
+from typing import Iterator, Optional, Union
+
+from django.contrib.auth.models import AnonymousUser, User  # pylint: disable=imported-auth-user
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from meetings.models import Meeting
+from protokolle.models import Attachment, Protokoll
+from tops.models import Top
+
+from .models import MeetingType
+
+PROTOKOLL_FILETYPES = ["pdf", "html", "txt"]
+
+
+def archive_files(
+    meetingtype: MeetingType,
+    year: int,
+    user: Union[User, AnonymousUser],
+) -> Iterator[tuple[str, str]]:
+    """
+    Lists the protokolle and attachments of all past meetings of a meetingtype in the given year, which the user may
+    download. The rules are the same as for protokolle.views.show_protokoll, protokolle.views.show_attachment and
+    tops.views.show_attachment. The user has to be allowed to view the meetingtype.
+
+    @param meetingtype: the meetingtype
+    @param year: the year of the meetings
+    @param user: the user downloading the archive
+    @return: the name in the archive and the path of each file (pdfs, which fail to generate, are skipped)
+    """
+    is_admin: bool = user.has_perm(meetingtype.admin_permission)
+    has_access: bool = user.has_perm(meetingtype.access_permission)
+    meetings = (
+        meetingtype.past_meetings_by_year(year)
+        .select_related("protokoll")
+        .prefetch_related(
+            "minute_takers",
+            Prefetch("attachment_set", queryset=Attachment.objects.order_by("sort_order")),
+            Prefetch("top_set", queryset=Top.objects.exclude(attachment="").order_by("topid")),
+        )
+    )
+    for meeting in meetings:
+        directory: str = _meeting_directory(meeting)
+        try:
+            protokoll: Optional[Protokoll] = meeting.protokoll
+        except Protokoll.DoesNotExist:
+            protokoll = None
+        special_access: bool = is_admin or (
+            user.is_authenticated and (user.pk == meeting.sitzungsleitung_id or user in meeting.minute_takers.all())
+        )
+        if protokoll and meetingtype.protokoll:
+            publicly_accessible = meetingtype.public and protokoll.published and protokoll.approved
+            # show_protokoll requires a login, also for public protokolle
+            if user.is_authenticated and (publicly_accessible or (special_access and has_access)):
+                filetypes: list[str] = PROTOKOLL_FILETYPES
+                if meetingtype.lazy_pdf:
+                    try:
+                        protokoll.ensure_pdf()
+                    except RuntimeError:
+                        filetypes = [filetype for filetype in PROTOKOLL_FILETYPES if filetype != "pdf"]
+                for filetype in filetypes:
+                    yield f"{directory}/protokoll.{filetype}", f"{protokoll.filepath}.{filetype}"
+            if (
+                has_access
+                and not meeting.imported
+                and meetingtype.attachment_protokoll
+                and (protokoll.published or special_access)
+            ):
+                for counter, attachment in enumerate(meeting.attachment_set.all(), start=1):
+                    name = _filename(f"{counter:02}_{attachment.name}", attachment.attachment.name)
+                    yield f"{directory}/anhaenge/{name}", attachment.attachment.path
+        if (
+            (meetingtype.public or has_access)
+            and not meeting.imported
+            and meetingtype.tops
+            and meetingtype.attachment_tops
+        ):
+            for top in meeting.top_set.all():
+                if top.attachment:
+                    name = _filename(f"{top.topid:02}_{top.title}", top.attachment.name)
+                    yield f"{directory}/tops/{name}", top.attachment.path
+
+
+def _meeting_directory(meeting: Meeting) -> str:
+    time = timezone.localtime(meeting.time)
+    return get_valid_filename(f"{time:%Y-%m-%d_%H%M}_{meeting.get_title()}")
+
+
+def _filename(name: str, stored_name: str) -> str:
+    """
+    @return: a valid filename with the given name and the extension of the stored file
+    """
+    extension: str = os.path.splitext(stored_name)[1].lower()
+    return get_valid_filename(name[:100]) + extension
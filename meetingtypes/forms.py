@@ -4,11 +4,13 @@ from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
+from django.db.models import QuerySet
 from django.utils.translation import gettext_lazy as _
 
 from toptool.forms import DualListField, UserDualListField
 
 from .models import MeetingType
+from .search import parse_cursor
 
 
 class MTBaseForm(forms.ModelForm):
@@ -66,3 +68,46 @@ class MTAddForm(MTBaseForm):
     class Meta:
         model = MeetingType
         exclude = ["ical_key", "custom_template"]
+
+
+class SearchForm(forms.Form):
+    query = forms.CharField(
+        max_length=200,
+        label=_("Suchbegriff"),
+        widget=forms.TextInput(attrs={"type": "search", "placeholder": _("Suchbegriff eingeben...")}),
+    )
+    meetingtype = forms.ChoiceField(
+        required=False,
+        label=_("Sitzungsgruppe"),
+    )
+    year = forms.IntegerField(
+        required=False,
+        min_value=1951,
+        max_value=2049,
+        label=_("Jahr"),
+    )
+    fuzzy = forms.BooleanField(
+        required=False,
+        label=_("Unscharfe Suche"),
+        help_text=_("Findet auch andere Schreibweisen und Tippfehler, z.B. „Gebuehr“ oder „Gebür“ für „Gebühr“."),
+    )
+    after = forms.CharField(
+        required=False,
+        widget=forms.HiddenInput(),
+    )
+
+    def __init__(self, *args, **kwargs):
+        meetingtypes: QuerySet[MeetingType] = kwargs.pop("meetingtypes")
+        super().__init__(*args, **kwargs)
+        self.fields["meetingtype"].choices = [("", _("Alle Sitzungsgruppen"))] + [
+            (meetingtype.id, meetingtype.name) for meetingtype in meetingtypes.order_by("name")
+        ]
+
+    def clean_after(self):
+        after = self.cleaned_data["after"]
+        if not after:
+            return None
+        try:
+            return parse_cursor(after)
+        except ValueError as error:
+            raise forms.ValidationError(_("Ungültige Seite")) from error
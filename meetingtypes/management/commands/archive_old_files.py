@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from meetingtypes.archive import archive_cutoff, archive_year
+from meetingtypes.models import MeetingType
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves the generated protokolle and the attachments of old meetings into compressed archives "
+        "per meetingtype and year. The files are still served from the archives."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("meetingtype", nargs="*", help="The ids of the meetingtypes (default: all).")
+        parser.add_argument(
+            "--years",
+            type=int,
+            default=settings.ARCHIVE_AFTER_YEARS,
+            help="The number of complete years, which are not archived (default: settings.ARCHIVE_AFTER_YEARS).",
+        )
+
+    def handle(self, *args, **options):
+        if options["years"] < 1:
+            raise CommandError("At least the current year has to stay unarchived.")
+        meetingtypes = MeetingType.objects.all()
+        if options["meetingtype"]:
+            meetingtypes = meetingtypes.filter(pk__in=options["meetingtype"])
+            missing = set(options["meetingtype"]) - set(meetingtypes.values_list("pk", flat=True))
+            if missing:
+                raise CommandError(f"Meetingtypes {', '.join(sorted(missing))} do not exist.")
+        cutoff = archive_cutoff(options["years"])
+        freed = 0
+        for meetingtype in meetingtypes:
+            for year in meetingtype.years:
+                if year < cutoff.year:
+                    freed += archive_year(meetingtype, year, cutoff)
+                    self.stdout.write(f"{meetingtype.id} {year}: archived")
+        self.stdout.write(f"freed {freed} bytes")
@@ -0,0 +1,47 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+
+from meetingtypes.export import archive_files
+from meetingtypes.models import MeetingType
+from toptool.utils.files import stream_zip
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes the protokolle and attachments of all past meetings of a meetingtype in the given year as a zip file. "
+        "Only the files, which the given user (or the public, if no user is given) may download, are included."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("meetingtype", help="The id of the meetingtype.")
+        parser.add_argument("year", type=int)
+        parser.add_argument("--user", help="The username of the user, whose permissions are used.")
+        parser.add_argument("--output", default="-", help="The zip file to write (default: stdout).")
+
+    def handle(self, *args, **options):
+        try:
+            meetingtype = MeetingType.objects.get(pk=options["meetingtype"])
+        except MeetingType.DoesNotExist as err:
+            raise CommandError(f"Meetingtype {options['meetingtype']} does not exist.") from err
+        if options["user"]:
+            try:
+                user = get_user_model().objects.get_by_natural_key(options["user"])
+            except get_user_model().DoesNotExist as err:
+                raise CommandError(f"User {options['user']} does not exist.") from err
+        else:
+            user = AnonymousUser()
+        if not meetingtype.public and not user.has_perm(meetingtype.access_permission):
+            raise CommandError(f"The meetingtype {meetingtype.id} is not visible for this user.")
+
+        chunks = stream_zip(archive_files(meetingtype, options["year"], user))
+        if options["output"] == "-":
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+        else:
+            with open(options["output"], "wb") as file:
+                for chunk in chunks:
+                    file.write(chunk)
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from meetings.models import Meeting
+from meetingtypes.models import SearchTerm
+from meetingtypes.search import INDEX_BATCH_SIZE, index_meetings
+
+
+class Command(BaseCommand):
+    help = (
+        "Indexes the titles, TOPs and protokolle of all meetings for the search. "
+        "The meetings are indexed in batches, so only the texts of one batch are held in memory. "
+        "Afterwards the words, which are not used anymore, are removed from the vocabulary of the fuzzy search."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=INDEX_BATCH_SIZE,
+            help=f"The number of meetings indexed at once (default: {INDEX_BATCH_SIZE}).",
+        )
+
+    def handle(self, *args, **options):
+        total = Meeting.objects.count()
+        done = 0
+        last_pk = None
+        while True:
+            # keyset pagination, so each batch is found by the index of the primary key
+            batch = Meeting.objects.order_by("pk")
+            if last_pk is not None:
+                batch = batch.filter(pk__gt=last_pk)
+            meeting_ids = list(batch.values_list("pk", flat=True)[: options["batch_size"]])
+            if not meeting_ids:
+                break
+            index_meetings(meeting_ids)
+            done += len(meeting_ids)
+            last_pk = meeting_ids[-1]
+            self.stdout.write(f"indexed {done}/{total} meetings")
+
+        unused_terms = SearchTerm.objects.filter(entries=None)
+        removed = unused_terms.count()
+        unused_terms.delete()
+        self.stdout.write(f"removed {removed} unused words")
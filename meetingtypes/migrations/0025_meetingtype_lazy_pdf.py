@@ -0,0 +1,22 @@
+# Generated by Django 4.1.13 on 2026-10-18 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("meetingtypes", "0024_alter_meetingtype_id"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="meetingtype",
+            name="lazy_pdf",
+            field=models.BooleanField(
+                default=False,
+                help_text="Das Erstellen des Protokolls geht dadurch schneller, der erste Abruf des PDFs dauert länger.",
+                verbose_name="PDF-Version des Protokolls erst beim ersten Abruf erzeugen",
+            ),
+        ),
+    ]
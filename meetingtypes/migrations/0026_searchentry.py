@@ -0,0 +1,87 @@
+# Generated by Django 4.1.13 on 2026-10-18 16:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# SQLite: an external content FTS5 table, which is kept in sync with the entries by triggers
+SQLITE_CREATE = [
+    "CREATE VIRTUAL TABLE meetingtypes_searchentry_fts USING fts5("
+    "text, content='meetingtypes_searchentry', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER meetingtypes_searchentry_ai AFTER INSERT ON meetingtypes_searchentry BEGIN "
+    "INSERT INTO meetingtypes_searchentry_fts(rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER meetingtypes_searchentry_ad AFTER DELETE ON meetingtypes_searchentry BEGIN "
+    "INSERT INTO meetingtypes_searchentry_fts(meetingtypes_searchentry_fts, rowid, text) "
+    "VALUES ('delete', old.id, old.text); END",
+    "CREATE TRIGGER meetingtypes_searchentry_au AFTER UPDATE ON meetingtypes_searchentry BEGIN "
+    "INSERT INTO meetingtypes_searchentry_fts(meetingtypes_searchentry_fts, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    "INSERT INTO meetingtypes_searchentry_fts(rowid, text) VALUES (new.id, new.text); END",
+]
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS meetingtypes_searchentry_ai",
+    "DROP TRIGGER IF EXISTS meetingtypes_searchentry_ad",
+    "DROP TRIGGER IF EXISTS meetingtypes_searchentry_au",
+    "DROP TABLE IF EXISTS meetingtypes_searchentry_fts",
+]
+# PostgreSQL: a generated tsvector column with a GIN index
+POSTGRESQL_CREATE = [
+    "ALTER TABLE meetingtypes_searchentry ADD COLUMN search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('german', text)) STORED",
+    "CREATE INDEX meetingtypes_searchentry_search_vector ON meetingtypes_searchentry USING GIN (search_vector)",
+]
+POSTGRESQL_DROP = [
+    "DROP INDEX IF EXISTS meetingtypes_searchentry_search_vector",
+    "ALTER TABLE meetingtypes_searchentry DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def create_index(apps, schema_editor):
+    statements = {"sqlite": SQLITE_CREATE, "postgresql": POSTGRESQL_CREATE}
+    for statement in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def drop_index(apps, schema_editor):
+    statements = {"sqlite": SQLITE_DROP, "postgresql": POSTGRESQL_DROP}
+    for statement in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("meetings", "0011_alter_meeting_topdeadline"),
+        ("meetingtypes", "0025_meetingtype_lazy_pdf"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchEntry",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("title", "Titel"), ("tops", "Tagesordnung"), ("protokoll", "Protokoll")],
+                        max_length=10,
+                        verbose_name="Art",
+                    ),
+                ),
+                ("text", models.TextField(verbose_name="Text")),
+                (
+                    "meeting",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="search_entries",
+                        to="meetings.meeting",
+                        verbose_name="Sitzung",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="searchentry",
+            constraint=models.UniqueConstraint(fields=("meeting", "kind"), name="unique_search_entry"),
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.1.13 on 2026-10-18 16:56
+
+import django.core.validators
+from django.db import migrations, models
+
+
+def check_reserved_id(apps, schema_editor):
+    # the root url /search/ takes precedence over the meetingtype with this id, so it would be unreachable
+    MeetingType = apps.get_model("meetingtypes", "MeetingType")
+    if MeetingType.objects.filter(id="search").exists():
+        raise RuntimeError(
+            'The URL-Kurzname "search" is reserved now, rename the meetingtype "search" before migrating.',
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("meetingtypes", "0026_searchentry"),
+    ]
+
+    operations = [
+        migrations.RunPython(check_reserved_id, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="meetingtype",
+            name="id",
+            field=models.CharField(
+                max_length=20,
+                primary_key=True,
+                serialize=False,
+                validators=[
+                    django.core.validators.RegexValidator("^[a-z]+$", "Nur Buchstaben von a-z erlaubt!"),
+                    django.core.validators.RegexValidator(
+                        "^(admin|i18n|profile|meeting|meeting|protokoll|person|meetingtype|list|overview|static|media|login|logout|oidc|search)$",
+                        "Name ist reserviert!",
+                        inverse_match=True,
+                    ),
+                    django.core.validators.MinLengthValidator(
+                        2,
+                        "Der URL-Kurzname muss mindestens 2 Buchstaben enthalten.",
+                    ),
+                ],
+                verbose_name="URL-Kurzname",
+            ),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.1.13 on 2026-10-18 16:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("meetingtypes", "0027_reserve_search_id"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchSnippet",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("query", models.CharField(max_length=200, verbose_name="Suchanfrage")),
+                ("snippet", models.TextField(verbose_name="Ausschnitt")),
+                (
+                    "entry",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="snippets",
+                        to="meetingtypes.searchentry",
+                        verbose_name="Sucheintrag",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="searchsnippet",
+            constraint=models.UniqueConstraint(fields=("entry", "query"), name="unique_search_snippet"),
+        ),
+    ]
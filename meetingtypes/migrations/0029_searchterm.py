@@ -0,0 +1,50 @@
+# Generated by Django 4.1.13 on 2026-10-18 17:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("meetingtypes", "0028_searchsnippet"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchTerm",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("word", models.CharField(max_length=100, unique=True, verbose_name="Wort")),
+                ("trigram_count", models.PositiveSmallIntegerField(verbose_name="Anzahl der Trigramme")),
+                (
+                    "entries",
+                    models.ManyToManyField(
+                        related_name="terms",
+                        to="meetingtypes.searchentry",
+                        verbose_name="Sucheinträge",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="SearchTrigram",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("trigram", models.CharField(max_length=3, verbose_name="Trigramm")),
+                (
+                    "term",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="trigrams",
+                        to="meetingtypes.searchterm",
+                        verbose_name="Wort",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="searchtrigram",
+            constraint=models.UniqueConstraint(fields=("trigram", "term"), name="unique_search_trigram"),
+        ),
+    ]
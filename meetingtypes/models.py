@@ -29,7 +29,7 @@ class MeetingType(models.Model):
             RegexValidator(r"^[a-z]+$", _("Nur Buchstaben von a-z erlaubt!")),
             RegexValidator(
                 r"^(admin|i18n|profile|meeting|meeting|protokoll|person|meetingtype|list|overview|"
-                r"static|media|login|logout|oidc)$",
+                r"static|media|login|logout|oidc|search|upload)$",
                 _("Name ist reserviert!"),
                 inverse_match=True,
             ),
@@ -59,6 +59,11 @@ class MeetingType(models.Model):
     point_of_order_tag = models.BooleanField(_("Kurze Syntax für GO-Anträge im Protokoll verwenden"))
     attachment_protokoll = models.BooleanField(_("Anhänge zum Protokoll ermöglichen"))
     pad_setting = models.BooleanField(_("Protokoll auch online schreiben (mit Etherpad)"))
+    lazy_pdf = models.BooleanField(
+        _("PDF-Version des Protokolls erst beim ersten Abruf erzeugen"),
+        default=False,
+        help_text=_("Das Erstellen des Protokolls geht dadurch schneller, der erste Abruf des PDFs dauert länger."),
+    )
 
     # tops
     tops = models.BooleanField(_("Tagesordnung verwenden"))
@@ -248,6 +253,103 @@ class MeetingType(models.Model):
         return self.send_tops_enabled or self.send_invitation_enabled or self.send_minutes_enabled
 
 
+class SearchEntry(models.Model):
+    """
+    A searchable text of a meeting: its title, its TOPs or the text of its protokoll (see meetingtypes.search).
+    The full-text index of the database (FTS5 with SQLite, a tsvector with PostgreSQL) is kept in sync with this table.
+    """
+
+    TITLE = "title"
+    TOPS = "tops"
+    PROTOKOLL = "protokoll"
+    # the locations shown in the search results, in this order
+    KINDS = [
+        (TITLE, _("Titel")),
+        (TOPS, _("Tagesordnung")),
+        (PROTOKOLL, _("Protokoll")),
+    ]
+
+    meeting = models.ForeignKey(
+        "meetings.Meeting",
+        on_delete=models.CASCADE,
+        related_name="search_entries",
+        verbose_name=_("Sitzung"),
+    )
+    kind = models.CharField(_("Art"), max_length=10, choices=KINDS)
+    text = models.TextField(_("Text"))
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["meeting", "kind"], name="unique_search_entry")]
+
+    def __str__(self) -> str:
+        return f"{self.meeting_id} ({self.kind})"
+
+
+class SearchSnippet(models.Model):
+    """
+    The highlighted snippet of a search entry for a query, generated by the full-text index (see meetingtypes.search).
+    The snippets are deleted with their entry, so they are generated again, when the meeting is reindexed.
+    """
+
+    # longer queries are not cached
+    MAX_QUERY_LENGTH = 200
+
+    entry = models.ForeignKey(
+        SearchEntry,
+        on_delete=models.CASCADE,
+        related_name="snippets",
+        verbose_name=_("Sucheintrag"),
+    )
+    # the normalized query (see meetingtypes.search.search_meetings_page)
+    query = models.CharField(_("Suchanfrage"), max_length=MAX_QUERY_LENGTH)
+    snippet = models.TextField(_("Ausschnitt"))
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["entry", "query"], name="unique_search_snippet")]
+
+    def __str__(self) -> str:
+        return f"{self.entry} ({self.query})"
+
+
+class SearchTerm(models.Model):
+    """
+    A word of the search entries for the fuzzy search, it is folded (see meetingtypes.search.fold).
+    The words are found by their trigrams, so similar words are found without scanning all of them.
+    """
+
+    # longer words are not indexed
+    MAX_WORD_LENGTH = 100
+
+    word = models.CharField(_("Wort"), max_length=MAX_WORD_LENGTH, unique=True)
+    # the number of distinct trigrams of the word, needed for the similarity
+    trigram_count = models.PositiveSmallIntegerField(_("Anzahl der Trigramme"))
+    entries = models.ManyToManyField(SearchEntry, related_name="terms", verbose_name=_("Sucheinträge"))
+
+    def __str__(self) -> str:
+        return self.word
+
+
+class SearchTrigram(models.Model):
+    """
+    A trigram of a SearchTerm (see meetingtypes.search.trigrams).
+    """
+
+    term = models.ForeignKey(
+        SearchTerm,
+        on_delete=models.CASCADE,
+        related_name="trigrams",
+        verbose_name=_("Wort"),
+    )
+    trigram = models.CharField(_("Trigramm"), max_length=3)
+
+    class Meta:
+        # the trigram is the first field, so the constraint is also the index for the lookup of the words
+        constraints = [models.UniqueConstraint(fields=["trigram", "term"], name="unique_search_trigram")]
+
+    def __str__(self) -> str:
+        return f"{self.trigram} ({self.term})"
+
+
 # pylint: disable=unused-argument
 @receiver(pre_delete, sender=MeetingType)
 def delete_protokoll(sender: type[MeetingType], instance: MeetingType, **kwargs: Any) -> None:
@@ -0,0 +1,805 @@
+import re
+import threading
+import unicodedata
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager, suppress
+from typing import Any, Callable, Iterable, Iterator, Optional, Union
+from uuid import UUID
+
+from django.contrib.auth.models import AnonymousUser, User  # pylint: disable=imported-auth-user
+from django.db import connection, IntegrityError, transaction
+from django.db.models import Count, ExpressionWrapper, F, FloatField, OuterRef, Prefetch, Q, QuerySet, Subquery
+from django.db.models.functions import Cast
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.html import escape
+from django.utils.safestring import mark_safe, SafeString
+
+from meetings.models import Meeting
+from protokolle.models import Protokoll, protokoll_generated
+from tops.models import Top
+from toptool.utils.files import open_file
+
+from .models import MeetingType, SearchEntry, SearchSnippet, SearchTerm, SearchTrigram
+
+# the full-text index of SearchEntry.text with SQLite, kept in sync by triggers (see migration 0026)
+FTS_TABLE = "meetingtypes_searchentry_fts"
+ENTRY_TABLE = SearchEntry._meta.db_table  # pylint: disable=protected-access
+TERM_ENTRY_TABLE = SearchTerm.entries.through._meta.db_table  # pylint: disable=protected-access
+# converts the meeting ids of the raw queries, they are stored as hex strings with SQLite
+MEETING_ID_FIELD = Meeting._meta.get_field("id")  # pylint: disable=protected-access
+# the locations shown in the search results for the kinds of the entries
+LOCATIONS = {
+    SearchEntry.TITLE: "Titel",
+    SearchEntry.TOPS: "Tagesordnung",
+    SearchEntry.PROTOKOLL: "Protokoll",
+}
+WORD_RE = re.compile(r"\w+")
+ALL_KINDS = [kind for kind, _label in SearchEntry.KINDS]
+# the number of meetings on a page of the results of the global search
+SEARCH_PAGE_SIZE = 20
+# separates the rank and the meeting id in the cursor of a page of results
+SEARCH_CURSOR_SEPARATOR = "_"
+# mark the matches in the snippets of the results, the snippets are escaped before they are replaced by html
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_END = "\x03"
+SNIPPET_ELLIPSIS = " … "
+# the number of words of a snippet
+SNIPPET_WORDS = 12
+# umlauts are folded to their spelling without umlauts, case folding replaces ß by ss
+UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue"})
+# the minimal similarity of a word to a word of the query in the fuzzy search (the default of pg_trgm)
+FUZZY_THRESHOLD = 0.3
+# distinguishes the cached snippets of the fuzzy search from those of the full-text search
+FUZZY_SNIPPET_PREFIX = "~"
+# the number of words looked up at once while indexing, bounds the number of parameters of the query
+TERM_BATCH_SIZE = 500
+# the number of meetings indexed at once, bounds the memory used for their texts
+INDEX_BATCH_SIZE = 100
+
+
+class SearchBackend(ABC):
+    """
+    Finds the meetings matching a query with the full-text index of the database.
+    """
+
+    @abstractmethod
+    def search(
+        self,
+        entries: QuerySet[SearchEntry],
+        words: list[str],
+        after: Optional[tuple[float, UUID]] = None,
+        limit: Optional[int] = None,
+    ) -> list[tuple[Any, float, str]]:
+        """
+        @param entries: the entries to search
+        @param words: the words of the query, all of them have to be contained (as prefix of a word)
+        @param after: the rank and the id of the last meeting of the previous page (see SEARCH_CURSOR_SEPARATOR)
+        @param limit: the maximum number of meetings returned
+        @return: the id of the meeting (as stored in the database), the rank of its best entry (lower is better)
+            and the comma separated kinds of its matching entries, ordered by rank and id
+        """
+
+    @abstractmethod
+    def snippets(self, entry_ids: list[int], words: list[str]) -> dict[int, str]:
+        """
+        @param entry_ids: the ids of matching entries
+        @param words: the words of the query
+        @return: a snippet with a few words around the matches of each entry, the matches are enclosed by
+            HIGHLIGHT_START and HIGHLIGHT_END (see highlight)
+        """
+
+
+class SQLiteSearchBackend(SearchBackend):
+    def search(
+        self,
+        entries: QuerySet[SearchEntry],
+        words: list[str],
+        after: Optional[tuple[float, UUID]] = None,
+        limit: Optional[int] = None,
+    ) -> list[tuple[Any, float, str]]:
+        match: str = " ".join(f'"{word}"*' for word in words)
+        entries_sql, entries_params = entries.values("pk").query.sql_with_params()
+        having_sql, limit_sql, page_params = _page_sql("MIN(entry_rank)", after, limit)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT meeting_id, MIN(entry_rank) AS best_rank, group_concat(kind) FROM ("  # nosec: no user input
+                f"SELECT entry.meeting_id, entry.kind, {FTS_TABLE}.rank AS entry_rank "
+                f"FROM {FTS_TABLE} JOIN {ENTRY_TABLE} entry ON entry.id = {FTS_TABLE}.rowid "
+                f"WHERE {FTS_TABLE} MATCH %s AND entry.id IN ({entries_sql})"
+                f") GROUP BY meeting_id {having_sql} ORDER BY best_rank, meeting_id {limit_sql}",
+                [match, *entries_params, *page_params],
+            )
+            return list(cursor.fetchall())
+
+    def snippets(self, entry_ids: list[int], words: list[str]) -> dict[int, str]:
+        match: str = " ".join(f'"{word}"*' for word in words)
+        placeholders: str = ", ".join(["%s"] * len(entry_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, snippet({FTS_TABLE}, 0, %s, %s, %s, %s) FROM {FTS_TABLE} "  # nosec: no user input
+                f"WHERE {FTS_TABLE} MATCH %s AND rowid IN ({placeholders})",
+                [HIGHLIGHT_START, HIGHLIGHT_END, SNIPPET_ELLIPSIS, SNIPPET_WORDS, match, *entry_ids],
+            )
+            return dict(cursor.fetchall())
+
+
+class PostgreSQLSearchBackend(SearchBackend):
+    def search(
+        self,
+        entries: QuerySet[SearchEntry],
+        words: list[str],
+        after: Optional[tuple[float, UUID]] = None,
+        limit: Optional[int] = None,
+    ) -> list[tuple[Any, float, str]]:
+        tsquery: str = " & ".join(f"{word}:*" for word in words)
+        entries_sql, entries_params = entries.values("pk").query.sql_with_params()
+        having_sql, limit_sql, page_params = _page_sql("MIN(entry_rank)", after, limit)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT meeting_id, MIN(entry_rank) AS best_rank, string_agg(kind, ',') FROM ("  # nosec
+                "SELECT entry.meeting_id, entry.kind, -ts_rank(entry.search_vector, query) AS entry_rank "
+                f"FROM {ENTRY_TABLE} entry, to_tsquery('german', %s) query "
+                f"WHERE entry.search_vector @@ query AND entry.id IN ({entries_sql})"
+                f") matches GROUP BY meeting_id {having_sql} ORDER BY best_rank, meeting_id {limit_sql}",
+                [tsquery, *entries_params, *page_params],
+            )
+            return list(cursor.fetchall())
+
+    def snippets(self, entry_ids: list[int], words: list[str]) -> dict[int, str]:
+        tsquery: str = " & ".join(f"{word}:*" for word in words)
+        options: str = (
+            f'StartSel="{HIGHLIGHT_START}", StopSel="{HIGHLIGHT_END}", FragmentDelimiter="{SNIPPET_ELLIPSIS}", '
+            f"MaxFragments=2, MaxWords={SNIPPET_WORDS}, MinWords={SNIPPET_WORDS // 2}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT id, ts_headline('german', text, to_tsquery('german', %s), %s) FROM {ENTRY_TABLE} "  # nosec
+                "WHERE id = ANY(%s)",
+                [tsquery, options, entry_ids],
+            )
+            return dict(cursor.fetchall())
+
+
+class SubstringSearchBackend(SearchBackend):
+    """
+    Used with databases without a supported full-text index, the entries are scanned by the database.
+    All matches are ranked equally.
+    """
+
+    def search(
+        self,
+        entries: QuerySet[SearchEntry],
+        words: list[str],
+        after: Optional[tuple[float, UUID]] = None,
+        limit: Optional[int] = None,
+    ) -> list[tuple[Any, float, str]]:
+        for word in words:
+            entries = entries.filter(text__icontains=word)
+        if after is not None:
+            entries = entries.filter(meeting_id__gt=after[1])
+        kinds: dict[UUID, list[str]] = {}
+        for meeting_id, kind in entries.order_by("meeting_id").values_list("meeting_id", "kind"):
+            kinds.setdefault(meeting_id, []).append(kind)
+        return [(meeting_id, 0.0, ",".join(meeting_kinds)) for meeting_id, meeting_kinds in kinds.items()][:limit]
+
+    def snippets(self, entry_ids: list[int], words: list[str]) -> dict[int, str]:
+        pattern = re.compile("|".join(re.escape(word) for word in words), re.IGNORECASE)
+        snippets: dict[int, str] = {}
+        for entry_id, text in SearchEntry.objects.filter(pk__in=entry_ids).values_list("pk", "text"):
+            spans: list[tuple[int, int]] = [found.span() for found in pattern.finditer(text)]
+            if spans:
+                snippets[entry_id] = _cut_snippet(text, spans)
+        return snippets
+
+
+def _page_sql(
+    rank_sql: str,
+    after: Optional[tuple[float, UUID]],
+    limit: Optional[int],
+    having_sql: str = "",
+) -> tuple[str, str, list[Any]]:
+    """
+    @param rank_sql: the aggregate computing the rank of a meeting
+    @param having_sql: a condition all meetings have to fulfill
+    @return: the HAVING and the LIMIT clause for the page of results after the given one and their parameters
+    """
+    conditions: list[str] = [having_sql] if having_sql else []
+    limit_sql, params = "", []
+    if after is not None:
+        rank, meeting_id = after
+        conditions.append(f"({rank_sql} > %s OR ({rank_sql} = %s AND meeting_id > %s))")
+        params += [rank, rank, MEETING_ID_FIELD.get_db_prep_value(meeting_id, connection)]
+    if limit is not None:
+        limit_sql = "LIMIT %s"
+        params.append(limit)
+    return f"HAVING {' AND '.join(conditions)}" if conditions else "", limit_sql, params
+
+
+def _cut_snippet(text: str, spans: list[tuple[int, int]]) -> str:
+    """
+    @param text: the text of an entry
+    @param spans: the start and the end of each match in the text, in order
+    @return: about SNIPPET_WORDS words around the first match, the matches are enclosed by HIGHLIGHT_START and
+        HIGHLIGHT_END
+    """
+    start: int = max(spans[0][0] - 3 * SNIPPET_WORDS, 0)
+    end: int = min(spans[0][1] + 3 * SNIPPET_WORDS, len(text))
+    parts: list[str] = [SNIPPET_ELLIPSIS if start > 0 else ""]
+    position: int = start
+    for span_start, span_end in spans:
+        if span_end > end:
+            break
+        if span_start >= position:
+            parts += [text[position:span_start], HIGHLIGHT_START, text[span_start:span_end], HIGHLIGHT_END]
+            position = span_end
+    parts += [text[position:end], SNIPPET_ELLIPSIS if end < len(text) else ""]
+    return "".join(parts)
+
+
+def get_backend() -> SearchBackend:
+    """
+    @return: the search backend for the database
+    """
+    if connection.vendor == "sqlite":
+        return SQLiteSearchBackend()
+    if connection.vendor == "postgresql":
+        return PostgreSQLSearchBackend()
+    return SubstringSearchBackend()
+
+
+def meetingtype_permissions(
+    user: Union[User, AnonymousUser],
+) -> tuple[Optional[set[str]], Optional[set[str]]]:
+    """
+    Reads the permissions of the user for all meetingtypes at once (instead of calling has_perm for each one).
+
+    @param user: the user
+    @return: the ids of the meetingtypes the user has access to and of those the user administrates,
+        None means all meetingtypes (for superusers)
+    """
+    if user.is_active and user.is_superuser:
+        return None, None
+    access: set[str] = set()
+    admin: set[str] = set()
+    for permission in user.get_all_permissions():
+        if not permission.startswith(MeetingType.APP_NAME):
+            continue
+        codename: str = permission[len(MeetingType.APP_NAME) :]
+        if codename.endswith(MeetingType.ADMIN):
+            admin.add(codename[: -len(MeetingType.ADMIN)])
+        else:
+            access.add(codename)
+    return access, admin
+
+
+def accessible_meetingtypes(user: Union[User, AnonymousUser]) -> QuerySet[MeetingType]:
+    """
+    @param user: the user
+    @return: the public meetingtypes and the meetingtypes the user has access to
+    """
+    access, _admin = meetingtype_permissions(user)
+    if access is None:
+        return MeetingType.objects.all()
+    return MeetingType.objects.filter(Q(public=True) | Q(id__in=access))
+
+
+def searchable_entries(user: Union[User, AnonymousUser], meetings: QuerySet[Meeting]) -> Q:
+    """
+    Protokolle are only searched, if the user may view them (like in protokolle.views.show_protokoll).
+    The permissions are checked by the database, so they do not have to be checked for each result.
+
+    @param user: the user searching
+    @param meetings: the meetings to search, the user has to have access to all of them
+    @return: the condition for the search entries the user may search
+    """
+    _access, admin = meetingtype_permissions(user)
+    if admin is None:
+        may_view = Q(meeting__protokoll__isnull=False)
+    else:
+        may_view = Q(meeting__protokoll__published=True)
+        if admin:
+            may_view |= Q(meeting__protokoll__isnull=False, meeting__meetingtype_id__in=admin)
+        if user.is_authenticated:
+            may_view |= Q(meeting__protokoll__isnull=False) & (
+                Q(meeting__sitzungsleitung=user) | Q(meeting__in=Meeting.objects.filter(minute_takers=user))
+            )
+        if not user.is_authenticated:
+            may_view &= Q(meeting__protokoll__approved=True)
+    return Q(meeting__in=meetings) & (~Q(kind=SearchEntry.PROTOKOLL) | may_view)
+
+
+def format_cursor(after: tuple[float, UUID]) -> str:
+    """
+    @param after: the rank and the id of the last meeting of a page of results
+    @return: the cursor of the next page used in urls (see parse_cursor)
+    """
+    rank, meeting_id = after
+    return f"{rank!r}{SEARCH_CURSOR_SEPARATOR}{meeting_id.hex}"
+
+
+def parse_cursor(cursor: str) -> tuple[float, UUID]:
+    """
+    @param cursor: the cursor of a page of results (see format_cursor)
+    @return: the rank and the id of the last meeting of the previous page
+    @raise ValueError: if the cursor is invalid
+    """
+    rank, _separator, meeting_id = cursor.partition(SEARCH_CURSOR_SEPARATOR)
+    return float(rank), UUID(meeting_id)
+
+
+def fold(text: str) -> str:
+    """
+    Folds a text for the fuzzy search: the case is folded, umlauts are replaced by their spelling without umlauts
+    (e.g. "Gebühr" by "gebuehr"), ß by ss and other diacritics are removed.
+
+    @param text: the text
+    @return: the folded text
+    """
+    text = unicodedata.normalize("NFC", text).casefold().translate(UMLAUTS)
+    return "".join(char for char in unicodedata.normalize("NFKD", text) if not unicodedata.combining(char))
+
+
+def trigrams(word: str) -> set[str]:
+    """
+    @param word: a folded word
+    @return: the trigrams of the word, it is padded like in pg_trgm, so the start and the end of a word weigh more
+    """
+    padded: str = f"  {word} "
+    return {padded[index : index + 3] for index in range(len(padded) - 2)}
+
+
+def search_meetings(
+    user: Union[User, AnonymousUser],
+    meetings: QuerySet[Meeting],
+    search_query: str,
+    fuzzy: bool = False,
+) -> OrderedDict[Meeting, list[tuple[str, SafeString]]]:
+    """
+    Searches the titles, TOPs and protokolle of the meetings with a single ranked query on the search index.
+
+    @param user: the user searching
+    @param meetings: the meetings to search, the user has to have access to all of them
+    @param search_query: the query, all words of it have to be found
+    @param fuzzy: find similar words instead of words starting with the words of the query (see fuzzy_search)
+    @return: the matching meetings (best match first) and where the query was found with a highlighted snippet
+    """
+    results, _next_page = search_meetings_page(user, meetings, search_query, fuzzy=fuzzy)
+    return results
+
+
+def search_meetings_page(
+    user: Union[User, AnonymousUser],
+    meetings: QuerySet[Meeting],
+    search_query: str,
+    after: Optional[tuple[float, UUID]] = None,
+    limit: Optional[int] = None,
+    fuzzy: bool = False,
+) -> tuple[OrderedDict[Meeting, list[tuple[str, SafeString]]], Optional[tuple[float, UUID]]]:
+    """
+    Searches a page of the results, it is continued after the last meeting of the previous page (keyset pagination).
+    The number of queries does not depend on the number of results.
+
+    @param user: the user searching
+    @param meetings: the meetings to search, the user has to have access to all of them
+    @param search_query: the query, all words of it have to be found
+    @param after: the rank and the id of the last meeting of the previous page, None for the first page
+    @param limit: the maximum number of meetings on the page, None for all of them
+    @param fuzzy: find similar words instead of words starting with the words of the query (see fuzzy_search)
+    @return: the matching meetings (best match first) and where the query was found with a highlighted snippet,
+        and the rank and the id of the last meeting, if there are more results
+    """
+    words: list[str] = WORD_RE.findall(fold(search_query) if fuzzy else search_query.lower())
+    if not words:
+        return OrderedDict(), None
+    entries: QuerySet[SearchEntry] = SearchEntry.objects.filter(searchable_entries(user, meetings))
+    page_limit: Optional[int] = None if limit is None else limit + 1
+    if fuzzy:
+        matches, similar_words = fuzzy_search(entries, words, after, page_limit)
+        snippet_query: str = FUZZY_SNIPPET_PREFIX + " ".join(words)
+
+        def generate_snippets(entry_ids: list[int]) -> dict[int, str]:
+            return _word_snippets(entry_ids, similar_words)
+
+    else:
+        matches = get_backend().search(entries, words, after, page_limit)
+        snippet_query = " ".join(words)
+
+        def generate_snippets(entry_ids: list[int]) -> dict[int, str]:
+            return get_backend().snippets(entry_ids, words)
+
+    next_page: Optional[tuple[float, UUID]] = None
+    if limit is not None and len(matches) > limit:
+        matches = matches[:limit]
+        # the raw query returns the uuids as stored in the database
+        next_page = (matches[-1][1], MEETING_ID_FIELD.to_python(matches[-1][0]))
+
+    kinds: dict[UUID, set[str]] = {
+        MEETING_ID_FIELD.to_python(meeting_id): set(meeting_kinds.split(","))
+        for meeting_id, _rank, meeting_kinds in matches
+    }
+    found: dict[UUID, Meeting] = (
+        Meeting.objects.select_related("meetingtype", "protokoll", "sitzungsleitung")
+        .prefetch_related("minute_takers")
+        .in_bulk(kinds)
+    )
+    snippets: dict[tuple[UUID, str], SafeString] = _snippets(kinds, snippet_query, generate_snippets)
+    results: OrderedDict[Meeting, list[tuple[str, SafeString]]] = OrderedDict()
+    for meeting_id, meeting_kinds in kinds.items():
+        if meeting_id in found:
+            results[found[meeting_id]] = [
+                (LOCATIONS[kind], snippets.get((meeting_id, kind), SafeString()))
+                for kind, _label in SearchEntry.KINDS
+                if kind in meeting_kinds
+            ]
+    return results, next_page
+
+
+def fuzzy_search(
+    entries: QuerySet[SearchEntry],
+    words: list[str],
+    after: Optional[tuple[float, UUID]] = None,
+    limit: Optional[int] = None,
+) -> tuple[list[tuple[Any, float, str]], set[str]]:
+    """
+    Finds the meetings containing words similar to all words of the query, e.g. with other spellings of umlauts or
+    with typos. The similar words are looked up by their trigrams (see SearchTerm) with one query for each word of
+    the query, the similarity is the share of common trigrams (like in pg_trgm). The best similarities of the meetings
+    are aggregated by the database, so only the meetings on the page are read.
+
+    @param entries: the entries to search
+    @param words: the folded words of the query (see fold)
+    @param after: the rank and the id of the last meeting of the previous page
+    @param limit: the maximum number of meetings returned
+    @return: the matches like SearchBackend.search, the rank is the negative mean similarity of the best matching
+        words; and the words similar to the words of the query
+    """
+    word_terms: list[str] = []
+    word_terms_params: list[Any] = []
+    similar_words: set[str] = set()
+    for index, word in enumerate(dict.fromkeys(words)):
+        word_trigrams: set[str] = trigrams(word)
+        terms = (
+            SearchTerm.objects.filter(trigrams__trigram__in=word_trigrams)
+            .annotate(shared=Count("trigrams"))
+            .annotate(
+                similarity=ExpressionWrapper(
+                    Cast("shared", FloatField()) / (len(word_trigrams) + F("trigram_count") - F("shared")),
+                    output_field=FloatField(),
+                ),
+            )
+            .filter(similarity__gte=FUZZY_THRESHOLD)
+        )
+        found_words: list[str] = list(terms.values_list("word", flat=True))
+        if not found_words:
+            return [], set()
+        similar_words.update(found_words)
+        terms_sql, terms_params = terms.values("pk", "similarity").query.sql_with_params()
+        word_terms.append(f"SELECT %s AS word_index, term.id AS term_id, term.similarity FROM ({terms_sql}) term")
+        word_terms_params += [index, *terms_params]
+
+    # the best similarity of the words of each meeting to each word of the query, all of them have to be found
+    entries_sql, entries_params = entries.values("pk").query.sql_with_params()
+    # the kinds of the matching entries are aggregated as a flag for each kind
+    entry_kinds_sql: str = ", ".join(
+        f"MAX(CASE WHEN entry.kind = %s THEN 1 ELSE 0 END) AS has_kind_{index}" for index in range(len(ALL_KINDS))
+    )
+    meeting_kinds_sql: str = ", ".join(f"MAX(has_kind_{index})" for index in range(len(ALL_KINDS)))
+    having_sql, limit_sql, page_params = _page_sql("-AVG(best)", after, limit, f"COUNT(*) = {len(word_terms)}")
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT meeting_id, -AVG(best) AS best_rank, {meeting_kinds_sql} FROM ("  # nosec: no user input
+            f"SELECT entry.meeting_id, MAX(word_terms.similarity) AS best, {entry_kinds_sql} "
+            f"FROM {ENTRY_TABLE} entry JOIN {TERM_ENTRY_TABLE} entry_term ON entry_term.searchentry_id = entry.id "
+            f"JOIN ({' UNION ALL '.join(word_terms)}) word_terms ON word_terms.term_id = entry_term.searchterm_id "
+            f"WHERE entry.id IN ({entries_sql}) GROUP BY entry.meeting_id, word_terms.word_index"
+            f") best_words GROUP BY meeting_id {having_sql} ORDER BY best_rank, meeting_id {limit_sql}",
+            [*ALL_KINDS, *word_terms_params, *entries_params, *page_params],
+        )
+        matches: list[tuple[Any, float, str]] = [
+            (meeting_id, rank, ",".join(kind for kind, has_kind in zip(ALL_KINDS, has_kinds) if has_kind))
+            for meeting_id, rank, *has_kinds in cursor.fetchall()
+        ]
+    return matches, similar_words
+
+
+def _word_snippets(entry_ids: list[int], words: set[str]) -> dict[int, str]:
+    """
+    @param entry_ids: the ids of matching entries
+    @param words: the folded words to highlight
+    @return: a snippet around the words of each entry (see SearchBackend.snippets)
+    """
+    snippets: dict[int, str] = {}
+    for entry_id, text in SearchEntry.objects.filter(pk__in=entry_ids).values_list("pk", "text"):
+        spans: list[tuple[int, int]] = [
+            found.span() for found in WORD_RE.finditer(text) if fold(found.group()) in words
+        ]
+        if spans:
+            snippets[entry_id] = _cut_snippet(text, spans)
+    return snippets
+
+
+def _snippets(
+    kinds: dict[UUID, set[str]],
+    query: str,
+    generate: Callable[[list[int]], dict[int, str]],
+) -> dict[tuple[UUID, str], SafeString]:
+    """
+    Reads the cached snippets of the matching entries, the missing ones are generated and cached (see SearchSnippet).
+
+    @param kinds: the kinds of the matching entries of each meeting
+    @param query: the normalized query, the snippets are cached for
+    @param generate: generates the snippets of entries (see SearchBackend.snippets)
+    @return: the highlighted snippet of each matching entry (meeting and kind)
+    """
+    if not kinds:
+        return {}
+    cached_snippets = SearchSnippet.objects.filter(entry=OuterRef("pk"), query=query).values("snippet")[:1]
+    entries = (
+        SearchEntry.objects.filter(meeting_id__in=kinds)
+        .annotate(cached_snippet=Subquery(cached_snippets))
+        .values_list("pk", "meeting_id", "kind", "cached_snippet")
+    )
+    snippets: dict[tuple[UUID, str], SafeString] = {}
+    missing: dict[int, tuple[UUID, str]] = {}
+    for entry_id, meeting_id, kind, cached_snippet in entries:
+        if kind not in kinds[meeting_id]:
+            continue
+        if cached_snippet is None:
+            missing[entry_id] = (meeting_id, kind)
+        else:
+            snippets[(meeting_id, kind)] = highlight(cached_snippet)
+    if not missing:
+        return snippets
+
+    generated: dict[int, str] = generate(list(missing))
+    if len(query) <= SearchSnippet.MAX_QUERY_LENGTH:
+        # the entry may have been reindexed in the meantime, then the snippet is generated again by the next search
+        with suppress(IntegrityError), transaction.atomic():
+            SearchSnippet.objects.bulk_create(
+                [
+                    SearchSnippet(entry_id=entry_id, query=query, snippet=snippet)
+                    for entry_id, snippet in generated.items()
+                ],
+                ignore_conflicts=True,
+            )
+    for entry_id, snippet in generated.items():
+        snippets[missing[entry_id]] = highlight(snippet)
+    return snippets
+
+
+def highlight(snippet: str) -> SafeString:
+    """
+    @param snippet: a snippet, whose matches are enclosed by HIGHLIGHT_START and HIGHLIGHT_END
+    @return: the escaped snippet with the matches marked in html
+    """
+    return mark_safe(  # nosec: the snippet is escaped
+        escape(snippet).replace(HIGHLIGHT_START, "<mark>").replace(HIGHLIGHT_END, "</mark>"),
+    )
+
+
+def index_meetings(meeting_ids: Iterable[UUID], kinds: Iterable[str] = ALL_KINDS) -> int:
+    """
+    Replaces the search entries of the meetings with their current title, TOPs and protokoll.
+    The texts of all given meetings are held in memory at once, so large numbers of meetings have to be indexed
+    in batches (see the rebuild_search_index command).
+
+    @param meeting_ids: the ids of the meetings; ids of deleted meetings are ignored
+    @param kinds: the kinds of entries to replace (see SearchEntry.KINDS)
+    @return: the number of meetings indexed
+    """
+    meeting_ids, kinds = list(meeting_ids), list(kinds)
+    meetings = Meeting.objects.filter(pk__in=meeting_ids).select_related("meetingtype", "protokoll")
+    if SearchEntry.TOPS in kinds:
+        meetings = meetings.prefetch_related(
+            Prefetch("top_set", queryset=Top.objects.order_by("topid").only("meeting_id", "title", "description")),
+        )
+    entries: list[SearchEntry] = []
+    count = 0
+    for meeting in meetings:
+        for kind in kinds:
+            text: str = _TEXTS[kind](meeting)
+            if text:
+                entries.append(SearchEntry(meeting=meeting, kind=kind, text=text))
+        count += 1
+    with transaction.atomic():
+        SearchEntry.objects.filter(meeting_id__in=meeting_ids, kind__in=kinds).delete()
+        SearchEntry.objects.bulk_create(entries)
+        if not connection.features.can_return_rows_from_bulk_insert:
+            entries = list(SearchEntry.objects.filter(meeting_id__in=meeting_ids, kind__in=kinds))
+        _index_terms(entries)
+    return count
+
+
+def _index_terms(entries: list[SearchEntry]) -> None:
+    """
+    Adds the folded words of the entries with their trigrams to the vocabulary of the fuzzy search (see SearchTerm).
+
+    @param entries: the saved entries
+    """
+    words_of_entry: dict[int, set[str]] = {
+        entry.pk: {word for word in WORD_RE.findall(fold(entry.text)) if len(word) <= SearchTerm.MAX_WORD_LENGTH}
+        for entry in entries
+    }
+    words: set[str] = set().union(*words_of_entry.values())
+    term_ids: dict[str, int] = _term_ids(words)
+    new_words: set[str] = words - term_ids.keys()
+    if new_words:
+        # the same words may be added concurrently, so conflicts are ignored and the ids are read afterwards
+        SearchTerm.objects.bulk_create(
+            [SearchTerm(word=word, trigram_count=len(trigrams(word))) for word in new_words],
+            ignore_conflicts=True,
+        )
+        new_term_ids: dict[str, int] = _term_ids(new_words)
+        SearchTrigram.objects.bulk_create(
+            [
+                SearchTrigram(term_id=term_id, trigram=trigram)
+                for word, term_id in new_term_ids.items()
+                for trigram in trigrams(word)
+            ],
+            ignore_conflicts=True,
+        )
+        term_ids.update(new_term_ids)
+    entry_terms = SearchTerm.entries.through
+    entry_terms.objects.bulk_create(
+        entry_terms(searchterm_id=term_ids[word], searchentry_id=entry_id)
+        for entry_id, entry_words in words_of_entry.items()
+        for word in entry_words
+    )
+
+
+def _term_ids(words: set[str]) -> dict[str, int]:
+    """
+    @param words: folded words
+    @return: the ids of the words, which are already in the vocabulary
+    """
+    ordered_words: list[str] = sorted(words)
+    term_ids: dict[str, int] = {}
+    for start in range(0, len(ordered_words), TERM_BATCH_SIZE):
+        term_ids.update(
+            SearchTerm.objects.filter(word__in=ordered_words[start : start + TERM_BATCH_SIZE]).values_list(
+                "word",
+                "pk",
+            ),
+        )
+    return term_ids
+
+
+def _title_text(meeting: Meeting) -> str:
+    return meeting.title or meeting.meetingtype.defaultmeetingtitle
+
+
+def _tops_text(meeting: Meeting) -> str:
+    return "\n".join(f"{top.title}\n{top.description}" for top in meeting.top_set.all())
+
+
+def _protokoll_text(meeting: Meeting) -> str:
+    try:
+        protokoll: Protokoll = meeting.protokoll
+    except Protokoll.DoesNotExist:
+        return ""
+    if not protokoll.t2t:
+        return ""
+    try:
+        # the protokolle of old meetings may be archived
+        with open_file(protokoll.filepath + ".txt") as file:
+            text: str = file.read().decode("UTF-8")
+            return text
+    except FileNotFoundError:
+        return ""
+
+
+_TEXTS: dict[str, Callable[[Meeting], str]] = {
+    SearchEntry.TITLE: _title_text,
+    SearchEntry.TOPS: _tops_text,
+    SearchEntry.PROTOKOLL: _protokoll_text,
+}
+
+
+class _IndexingState(threading.local):
+    def __init__(self) -> None:
+        super().__init__()
+        # the changed entries (meeting and kind), which are indexed after the transaction is committed
+        self.pending: set[tuple[UUID, str]] = set()
+        # the changed entries collected inside deferred_indexing
+        self.deferred: Optional[set[tuple[UUID, str]]] = None
+
+
+_state = _IndexingState()
+
+
+def schedule_indexing(meeting_id: UUID, kind: str) -> None:
+    """
+    Reindexes an entry of a meeting, after the current transaction is committed.
+    Changes in the same transaction (e.g. the TOPs sorted in one request) are indexed only once.
+
+    @param meeting_id: the id of the meeting
+    @param kind: the kind of the entry (see SearchEntry.KINDS)
+    """
+    key = (meeting_id, kind)
+    if _state.deferred is not None:
+        _state.deferred.add(key)
+        return
+    _state.pending.add(key)
+    # each change registers a callback, as the callbacks of rolled back savepoints are dropped
+    transaction.on_commit(lambda: _index_pending({key}))
+
+
+@contextmanager
+def deferred_indexing() -> Iterator[None]:
+    """
+    Defers the indexing of all changes inside the block until it is left, e.g. for bulk imports.
+    Then each affected entry is indexed once (after the transaction is committed).
+    """
+    if _state.deferred is not None:
+        # nested blocks are indexed with the outermost one
+        yield
+        return
+    _state.deferred = set()
+    try:
+        yield
+    finally:
+        keys: set[tuple[UUID, str]] = _state.deferred
+        _state.deferred = None
+        if keys:
+            _state.pending |= keys
+            transaction.on_commit(lambda: _index_pending(keys))
+
+
+def _index_pending(keys: set[tuple[UUID, str]]) -> None:
+    """
+    @param keys: the entries to index, if they were not indexed by an earlier callback
+    """
+    todo: set[tuple[UUID, str]] = keys & _state.pending
+    _state.pending -= todo
+    kinds_of_meeting: dict[UUID, set[str]] = {}
+    for meeting_id, kind in todo:
+        kinds_of_meeting.setdefault(meeting_id, set()).add(kind)
+    # meetings with the same changed kinds are indexed together
+    meetings_of_kinds: dict[frozenset[str], list[UUID]] = {}
+    for meeting_id, kinds in kinds_of_meeting.items():
+        meetings_of_kinds.setdefault(frozenset(kinds), []).append(meeting_id)
+    for changed_kinds, meeting_ids in meetings_of_kinds.items():
+        for start in range(0, len(meeting_ids), INDEX_BATCH_SIZE):
+            index_meetings(meeting_ids[start : start + INDEX_BATCH_SIZE], changed_kinds)
+
+
+# pylint: disable=unused-argument
+@receiver(post_save, sender=Meeting)
+def index_meeting_title(sender: type[Meeting], instance: Meeting, **kwargs: Any) -> None:
+    """
+    Signal listener that reindexes the title of a saved meeting.
+    The entries of a deleted meeting are deleted with it.
+    """
+    schedule_indexing(instance.pk, SearchEntry.TITLE)
+
+
+@receiver(post_save, sender=MeetingType)
+def index_meeting_titles(sender: type[MeetingType], instance: MeetingType, **kwargs: Any) -> None:
+    """
+    Signal listener that reindexes the meetings without a title, as their default title may have changed.
+    """
+    for meeting_id in instance.meeting_set.filter(title="").values_list("pk", flat=True):
+        schedule_indexing(meeting_id, SearchEntry.TITLE)
+
+
+@receiver(post_save, sender=Top)
+@receiver(post_delete, sender=Top)
+def index_tops(sender: type[Top], instance: Top, **kwargs: Any) -> None:
+    """
+    Signal listener that reindexes the TOPs of the meeting of a saved or deleted TOP.
+    """
+    schedule_indexing(instance.meeting_id, SearchEntry.TOPS)
+
+
+@receiver(protokoll_generated)
+@receiver(post_delete, sender=Protokoll)
+def index_protokoll(sender: type[Protokoll], instance: Protokoll, **kwargs: Any) -> None:
+    """
+    Signal listener that reindexes the text of a generated or deleted protokoll.
+    """
+    schedule_indexing(instance.meeting_id, SearchEntry.PROTOKOLL)
+
+
+# pylint: enable=unused-argument
@@ -0,0 +1,84 @@
+# pylint: disable=missing-function-docstring
+import datetime
+import os
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from mixer.backend.django import mixer
+
+from toptool.models import ArchivedFile
+
+pytestmark = pytest.mark.django_db
+
+
+def blend_meeting(meetingtype, year, attachment):
+    meeting = mixer.blend(
+        "meetings.Meeting",
+        meetingtype=meetingtype,
+        imported=False,
+        time=timezone.make_aware(datetime.datetime(year, 3, 1, 18)),
+    )
+    protokoll = mixer.blend(
+        "protokolle.Protokoll",
+        meeting=meeting,
+        published=True,
+        approved=True,
+        t2t=SimpleUploadedFile("protokoll.t2t", b"Protokoll"),
+    )
+    for filetype in ["html", "txt", "pdf", "html.gz"]:
+        with open(f"{protokoll.filepath}.{filetype}", "w", encoding="UTF-8") as file:
+            file.write(f"{filetype} {year}")
+    mixer.blend("tops.Top", meeting=meeting, topid=1, attachment=SimpleUploadedFile("top.pdf", attachment))
+    return protokoll
+
+
+def test_archive_old_files(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    meetingtype = mixer.blend(
+        "meetingtypes.MeetingType",
+        public=True,
+        protokoll=True,
+        tops=True,
+        attachment_tops=True,
+        standard_tops=False,
+        other_in_tops=False,
+        lazy_pdf=False,
+    )
+    year = timezone.now().year
+    old = blend_meeting(meetingtype, year - 10, b"%PDF-1.4\nalt")
+    shared = blend_meeting(meetingtype, year - 10, b"%PDF-1.4\nbeide")
+    new = blend_meeting(meetingtype, year, b"%PDF-1.4\nbeide")
+
+    call_command("archive_old_files", "--years", "5")
+
+    assert os.path.exists(tmp_path / "archive" / str(meetingtype.id) / f"{year - 10}.zip")
+    for protokoll in [old, shared]:
+        assert not any(os.path.exists(f"{protokoll.filepath}.{filetype}") for filetype in ["html", "txt", "html.gz"])
+        assert os.path.exists(protokoll.t2t.path), "Should keep the script, so the protokoll can be edited"
+    assert os.path.exists(f"{new.filepath}.html")
+    old_top, shared_top = old.meeting.top_set.get(), shared.meeting.top_set.get()
+    assert not os.path.exists(old_top.attachment.path)
+    assert os.path.exists(shared_top.attachment.path), "Should keep files referenced by recent meetings"
+    assert ArchivedFile.objects.count() == 2 * 3 + 1
+
+    client = Client()
+    client.force_login(mixer.blend("auth.User", is_superuser=True))
+    response = client.get(reverse("protokolle:show_protokoll", args=[old.meeting.id, "txt"]))
+    assert b"".join(response.streaming_content) == f"txt {year - 10}".encode()
+    assert "Content-Encoding" not in response
+    response = client.get(reverse("tops:show_attachment", args=[old_top.id]))
+    assert b"".join(response.streaming_content) == b"%PDF-1.4\nalt"
+
+
+def test_deleted_protokoll_is_removed_from_index(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    meetingtype = mixer.blend("meetingtypes.MeetingType")
+    protokoll = blend_meeting(meetingtype, timezone.now().year - 10, b"%PDF-1.4\n")
+    call_command("archive_old_files")
+
+    protokoll.delete()
+    assert not ArchivedFile.objects.filter(name__startswith="protokolle/").exists()
@@ -0,0 +1,145 @@
+# pylint: disable=missing-function-docstring
+import datetime
+import io
+import zipfile
+
+import pytest
+from django.contrib.auth.models import AnonymousUser, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from mixer.backend.django import mixer
+
+from meetingtypes.export import archive_files
+from meetingtypes.models import MeetingType
+from protokolle.models import Protokoll
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(name="meetingtype")
+def fixture_meetingtype(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    meetingtype = mixer.blend(
+        "meetingtypes.MeetingType",
+        public=True,
+        protokoll=True,
+        attachment_protokoll=True,
+        tops=True,
+        attachment_tops=True,
+        lazy_pdf=False,
+    )
+    year = timezone.now().year - 1
+    for day, (published, approved) in enumerate([(True, True), (True, False)], start=1):
+        meeting = mixer.blend(
+            "meetings.Meeting",
+            meetingtype=meetingtype,
+            imported=False,
+            title=f"Sitzung {day}",
+            time=timezone.make_aware(datetime.datetime(year, 3, day, 18)),
+        )
+        protokoll = mixer.blend(
+            "protokolle.Protokoll",
+            meeting=meeting,
+            published=published,
+            approved=approved,
+            t2t=SimpleUploadedFile("protokoll.t2t", b"Protokoll"),
+        )
+        for filetype in ["html", "txt", "pdf"]:
+            with open(f"{protokoll.filepath}.{filetype}", "w", encoding="UTF-8") as file:
+                file.write(f"{filetype} {day}")
+        mixer.blend(
+            "protokolle.Attachment",
+            meeting=meeting,
+            name="Haushalt",
+            sort_order=0,
+            attachment=SimpleUploadedFile("haushalt.pdf", b"%PDF-1.4\n"),
+        )
+        mixer.blend(
+            "tops.Top",
+            meeting=meeting,
+            topid=1,
+            title="Finanzen",
+            attachment=SimpleUploadedFile("finanzen.pdf", b"%PDF-1.4\n"),
+        )
+    return meetingtype
+
+
+def test_public_archive(meetingtype):
+    names = [name for name, _path in archive_files(meetingtype, timezone.now().year - 1, AnonymousUser())]
+    year = timezone.now().year - 1
+    first = f"{year}-03-01_1800_Sitzung_1"
+    second = f"{year}-03-02_1800_Sitzung_2"
+    assert names == [
+        f"{first}/tops/01_Finanzen.pdf",
+        f"{second}/tops/01_Finanzen.pdf",
+    ], "Should only include the attachments of the tops for anonymous users, the protokolle require a login"
+
+    names = [name for name, _path in archive_files(meetingtype, year, mixer.blend("auth.User"))]
+    assert names == [
+        f"{first}/protokoll.pdf",
+        f"{first}/protokoll.html",
+        f"{first}/protokoll.txt",
+        f"{first}/tops/01_Finanzen.pdf",
+        f"{second}/tops/01_Finanzen.pdf",
+    ], "Should only include approved protokolle and no protokoll attachments for logged-in users without access"
+
+
+def test_failed_lazy_pdf_is_skipped(meetingtype, monkeypatch):
+    meetingtype.lazy_pdf = True
+    meetingtype.save()
+
+    def fail(_self):
+        raise RuntimeError(b"pdflatex: broken preamble")
+
+    monkeypatch.setattr(Protokoll, "ensure_pdf", fail)
+    names = [name for name, _path in archive_files(meetingtype, timezone.now().year - 1, mixer.blend("auth.User"))]
+    assert f"{timezone.now().year - 1}-03-01_1800_Sitzung_1/protokoll.html" in names
+    assert not any(name.endswith(".pdf") and "protokoll" in name for name in names), "Should only skip the pdf"
+
+
+def test_archive_with_access(meetingtype):
+    user = mixer.blend("auth.User")
+    user.user_permissions.add(
+        Permission.objects.get_or_create(
+            codename=meetingtype.pk,
+            content_type=ContentType.objects.get_for_model(MeetingType),
+        )[0],
+    )
+    names = [name for name, _path in archive_files(meetingtype, timezone.now().year - 1, user)]
+    assert len(names) == 3 + 1 + 1 + 1 + 1, "Should include the attachments of published protokolle"
+    assert not any(name.startswith(f"{timezone.now().year - 1}-03-02") and "protokoll." in name for name in names)
+
+    meetingtype.meeting_set.get(title="Sitzung 2").minute_takers.add(user)
+    names = [name for name, _path in archive_files(meetingtype, timezone.now().year - 1, user)]
+    assert len(names) == 10, "Should include unapproved protokolle for minute takers"
+
+
+def test_export_archive_command(meetingtype, tmp_path):
+    output = tmp_path / "archive.zip"
+    user = mixer.blend("auth.User")
+    call_command("export_archive", meetingtype.pk, timezone.now().year - 1, user=user.username, output=str(output))
+    with zipfile.ZipFile(io.BytesIO(output.read_bytes())) as archive:
+        assert len(archive.namelist()) == 5
+        assert archive.read(archive.namelist()[1]) == b"html 1"
+
+
+def test_export_view(meetingtype, client):
+    url = reverse("meetingtypes:export_archive", args=[meetingtype.pk, timezone.now().year - 1])
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response["Content-Type"] == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content))) as archive:
+        assert len(archive.namelist()) == 2, "Should not include protokolle for anonymous users"
+
+    client.force_login(mixer.blend("auth.User"))
+    with zipfile.ZipFile(io.BytesIO(b"".join(client.get(url).streaming_content))) as archive:
+        assert len(archive.namelist()) == 5
+
+    client.logout()
+    meetingtype.public = False
+    meetingtype.save()
+    response = client.get(url)
+    assert response.status_code == 302, "Should redirect to the login"
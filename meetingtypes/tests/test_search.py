@@ -0,0 +1,275 @@
+# pylint: disable=missing-function-docstring
+import datetime
+import io
+
+import pytest
+from django.contrib.auth.models import AnonymousUser, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from mixer.backend.django import mixer
+
+from meetings.models import Meeting
+from meetingtypes import search
+from meetingtypes.models import MeetingType, SearchEntry, SearchSnippet
+from meetingtypes.search import search_meetings
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(name="meetingtype")
+def fixture_meetingtype(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    meetingtype = mixer.blend("meetingtypes.MeetingType", public=True, defaultmeetingtitle="Sitzung")
+    year = timezone.now().year - 1
+    for day, (title, top, text, published) in enumerate(
+        [
+            ("Haushaltssitzung", "Finanzen", "Der Haushalt wurde beschlossen.", True),
+            ("", "Haushalt", "Keine Beschlüsse.", True),
+            ("", "Sonstiges", "Haushalt vertagt.", False),
+        ],
+        start=1,
+    ):
+        meeting = mixer.blend(
+            "meetings.Meeting",
+            meetingtype=meetingtype,
+            title=title,
+            time=timezone.make_aware(datetime.datetime(year, 3, day, 18)),
+        )
+        meeting.top_set.all().delete()
+        mixer.blend("tops.Top", meeting=meeting, topid=1, title=top, description="")
+        protokoll = mixer.blend(
+            "protokolle.Protokoll",
+            meeting=meeting,
+            published=published,
+            approved=True,
+            t2t=SimpleUploadedFile("protokoll.t2t", b"Protokoll"),
+        )
+        with open(f"{protokoll.filepath}.txt", "w", encoding="UTF-8") as file:
+            file.write(text)
+    call_command("rebuild_search_index")
+    return meetingtype
+
+
+def locations(results):
+    return {meeting.time.day: [location for location, _snippet in found] for meeting, found in results.items()}
+
+
+def find(meetingtype, query):
+    return locations(search_meetings(AnonymousUser(), meetingtype.meeting_set.all(), query))
+
+
+def test_search_meetings(meetingtype):
+    assert find(meetingtype, "haushalt") == {
+        1: ["Titel", "Protokoll"],
+        2: ["Tagesordnung"],
+    }, "Should find prefixes of words, but not in unpublished protokolle"
+
+
+def test_search_all_words(meetingtype):
+    assert find(meetingtype, "Haushalt beschlossen!") == {1: ["Protokoll"]}
+
+
+def test_search_uses_fixed_number_of_queries(meetingtype, django_assert_max_num_queries):
+    with django_assert_max_num_queries(8):
+        results = search_meetings(AnonymousUser(), meetingtype.meeting_set.all(), "haushalt")
+        assert len(results) == 2
+    with django_assert_max_num_queries(4):
+        search_meetings(AnonymousUser(), meetingtype.meeting_set.all(), "haushalt")
+
+
+def test_highlighted_snippets(meetingtype):
+    meeting = meetingtype.meeting_set.get(time__day=1)
+    meeting.title = "<b>Haushaltssitzung</b>"
+    meeting.save()
+    search.index_meetings([meeting.pk])
+    results = search_meetings(AnonymousUser(), meetingtype.meeting_set.filter(pk=meeting.pk), "haushalt")
+    assert results[meeting] == [
+        ("Titel", "&lt;b&gt;<mark>Haushaltssitzung</mark>&lt;/b&gt;"),
+        ("Protokoll", "Der <mark>Haushalt</mark> wurde beschlossen."),
+    ], "Should escape the text around the matches"
+    assert SearchSnippet.objects.filter(query="haushalt").count() == 2, "Should cache the snippets"
+
+    search.index_meetings([meeting.pk])
+    assert not SearchSnippet.objects.exists(), "Should delete the snippets with their entries"
+
+
+def test_empty_query(meetingtype):
+    assert not search_meetings(AnonymousUser(), meetingtype.meeting_set.all(), " - ")
+
+
+def test_search_archive_view(meetingtype, client):
+    year = timezone.now().year - 1
+    response = client.get(reverse("meetingtypes:search_archive", args=[meetingtype.id, year]), {"query": "Finanzen"})
+    assert response.status_code == 200
+    assert list(locations(response.context["meetings"]).values()) == [["Tagesordnung"]]
+
+
+def test_incremental_indexing(meetingtype, django_capture_on_commit_callbacks):
+    meeting = meetingtype.meeting_set.get(time__day=2)
+    with django_capture_on_commit_callbacks(execute=True):
+        mixer.blend("tops.Top", meeting=meeting, topid=2, title="Wahlen", description="")
+    assert find(meetingtype, "wahlen") == {2: ["Tagesordnung"]}
+
+    with django_capture_on_commit_callbacks(execute=True):
+        meeting.title = "Wahlsitzung"
+        meeting.save()
+    assert find(meetingtype, "wahl") == {2: ["Titel", "Tagesordnung"]}
+
+    with django_capture_on_commit_callbacks(execute=True):
+        meeting.top_set.get(topid=2).delete()
+        meeting.protokoll.delete()
+    assert find(meetingtype, "wahl") == {2: ["Titel"]}
+    assert find(meetingtype, "beschlüsse") == {}
+
+
+def test_deferred_indexing(meetingtype, django_capture_on_commit_callbacks, monkeypatch):
+    indexed = []
+    monkeypatch.setattr(search, "index_meetings", lambda ids, kinds: indexed.append((set(ids), set(kinds))))
+    meeting = meetingtype.meeting_set.get(time__day=2)
+    with django_capture_on_commit_callbacks(execute=True), search.deferred_indexing():
+        for topid in range(2, 6):
+            mixer.blend("tops.Top", meeting=meeting, topid=topid)
+        assert not indexed, "Should not index inside the block"
+    assert indexed == [({meeting.pk}, {SearchEntry.TOPS})]
+
+
+def test_rebuild_search_index(meetingtype):
+    SearchEntry.objects.all().delete()
+    out = io.StringIO()
+    call_command("rebuild_search_index", "--batch-size", "2", stdout=out)
+    assert out.getvalue().splitlines() == ["indexed 2/3 meetings", "indexed 3/3 meetings", "removed 0 unused words"]
+    assert find(meetingtype, "haushalt") == {1: ["Titel", "Protokoll"], 2: ["Tagesordnung"]}
+
+
+@pytest.fixture(name="other_meetingtype")
+def fixture_other_meetingtype(meetingtype):
+    other_meetingtype = mixer.blend("meetingtypes.MeetingType", public=False, defaultmeetingtitle="Haushaltsausschuss")
+    mixer.blend("meetings.Meeting", meetingtype=other_meetingtype, title="", time=timezone.now())
+    call_command("rebuild_search_index")
+    return other_meetingtype
+
+
+def access_permission(meetingtype):
+    return Permission.objects.get_or_create(
+        codename=meetingtype.pk,
+        content_type=ContentType.objects.get_for_model(MeetingType),
+    )[0]
+
+
+def search_all(client, **params):
+    response = client.get(reverse("meetingtypes:search"), {"query": "haushalt", **params})
+    assert response.status_code == 200
+    return response
+
+
+def test_global_search_only_accessible_meetingtypes(meetingtype, other_meetingtype, client):
+    found = search_all(client).context["results"]
+    assert {meeting.meetingtype for meeting in found} == {meetingtype}, "Should only search public meetingtypes"
+
+    user = mixer.blend("auth.User")
+    user.user_permissions.add(access_permission(other_meetingtype))
+    client.force_login(user)
+    found = search_all(client).context["results"]
+    assert {meeting.meetingtype for meeting in found} == {meetingtype, other_meetingtype}
+
+
+def test_global_search_filters(meetingtype, other_meetingtype, admin_client):
+    found = search_all(admin_client, meetingtype=other_meetingtype.id).context["results"]
+    assert [meeting.meetingtype for meeting in found] == [other_meetingtype]
+    found = search_all(admin_client, year=timezone.now().year - 1).context["results"]
+    assert {meeting.meetingtype for meeting in found} == {meetingtype}
+
+
+def test_global_search_unpublished_protokolle(meetingtype, client):
+    meeting = meetingtype.meeting_set.get(time__day=3)
+    assert search_all(client, query="vertagt").context["results"] == {}
+
+    user = mixer.blend("auth.User")
+    meeting.minute_takers.add(user)
+    client.force_login(user)
+    assert locations(search_all(client, query="vertagt").context["results"]) == {meeting.time.day: ["Protokoll"]}
+
+
+def test_global_search_pages(meetingtype, other_meetingtype, admin_client, monkeypatch):
+    monkeypatch.setattr(search, "SEARCH_PAGE_SIZE", 2)
+    monkeypatch.setattr("meetingtypes.views.SEARCH_PAGE_SIZE", 2)
+    response = search_all(admin_client)
+    found = list(response.context["results"])
+    assert len(found) == 2
+    response = admin_client.get(response.context["next_url"])
+    assert response.context["next_url"] is None
+    found += list(response.context["results"])
+    assert len(set(found)) == 4, "Should continue after the last meeting of the previous page"
+
+
+def test_global_search_uses_fixed_number_of_queries(meetingtype, other_meetingtype, client):
+    user = mixer.blend("auth.User")
+    user.user_permissions.add(access_permission(other_meetingtype))
+    client.force_login(user)
+    search_all(client)
+    for meeting in Meeting.objects.all():
+        meeting.minute_takers.add(user)
+    call_command("rebuild_search_index")
+    with CaptureQueriesContext(connection) as queries:
+        found = search_all(client).context["results"]
+    for _ in range(3):
+        mixer.blend("meetings.Meeting", meetingtype=other_meetingtype, title="", time=timezone.now())
+    call_command("rebuild_search_index")
+    with CaptureQueriesContext(connection) as more_queries:
+        assert len(search_all(client).context["results"]) == len(found) + 3
+    assert len(more_queries) == len(queries)
+
+
+def test_invalid_page(meetingtype, client):
+    assert search_all(client, after="invalid").context["results"] == {}
+
+
+def test_substring_snippets(meetingtype):
+    entry = SearchEntry.objects.get(meeting__time__day=1, kind=SearchEntry.PROTOKOLL)
+    snippets = search.SubstringSearchBackend().snippets([entry.pk], ["haushalt"])
+    assert search.highlight(snippets[entry.pk]) == "Der <mark>Haushalt</mark> wurde beschlossen."
+
+
+def test_snippets_are_shown(meetingtype, client):
+    response = search_all(client, query="beschlossen")
+    assert "Der Haushalt wurde <mark>beschlossen</mark>." in response.content.decode()
+
+
+def test_fold():
+    assert search.fold("SITZUNGSGEBÜHR") == search.fold("Sitzungsgebuehr") == "sitzungsgebuehr"
+    assert search.fold("Straße Café") == "strasse cafe"
+
+
+def test_fuzzy_search(meetingtype):
+    meeting = meetingtype.meeting_set.get(time__day=3)
+    mixer.blend("tops.Top", meeting=meeting, topid=2, title="Sitzungsgebühr für Haushälter", description="")
+    search.index_meetings([meeting.pk])
+    assert not find(meetingtype, "Sitzungsgebuehr"), "Should only fold umlauts in the fuzzy search"
+
+    results = search_meetings(AnonymousUser(), meetingtype.meeting_set.all(), "SITZUNGSGEBUEHR", fuzzy=True)
+    assert list(results)[0] == meeting, "Should rank the folded word first, before similar words like 'Sitzung'"
+    assert "<mark>Sitzungsgebühr</mark> für Haushälter" in dict(results[meeting])["Tagesordnung"]
+
+    results = search_meetings(AnonymousUser(), meetingtype.meeting_set.all(), "haushalt", fuzzy=True)
+    assert [meeting.time.day for meeting in results][-1] == 3, "Should rank less similar words last"
+    assert set(locations(results)) == {1, 2, 3}
+
+
+def test_fuzzy_search_finds_typos(meetingtype, client):
+    response = search_all(client, query="Hausalt", fuzzy="on")
+    assert locations(response.context["results"]) == {1: ["Protokoll"], 2: ["Tagesordnung"]}
+    assert "Der <mark>Haushalt</mark> wurde beschlossen." in response.content.decode()
+
+
+def test_fuzzy_search_pages(meetingtype):
+    meetings = meetingtype.meeting_set.all()
+    results, next_page = search.search_meetings_page(AnonymousUser(), meetings, "haushalt", limit=1, fuzzy=True)
+    assert len(results) == 1 and next_page is not None
+    rest, last_page = search.search_meetings_page(AnonymousUser(), meetings, "haushalt", after=next_page, fuzzy=True)
+    assert last_page is None
+    assert list(results) + list(rest) == list(search_meetings(AnonymousUser(), meetings, "haushalt", fuzzy=True))
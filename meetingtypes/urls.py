@@ -21,8 +21,10 @@ urlpatterns = [
     ),
     path("list/admins/", views.list_admins, name="list_admins"),
     path("overview/", views.list_meetingtypes, name="main_overview"),
+    path("search/", views.search, name="search"),
     path("<str:mt_pk>/", views.view_meetingtype, name="view_meetingtype"),
     path("<str:mt_pk>/archive/<int:year>/", views.view_meetingtype_archive, name="view_archive"),
+    path("<str:mt_pk>/archive/<int:year>/export/", views.export_meetingtype_archive, name="export_archive"),
     path("<str:mt_pk>/search/", views.search_meetingtype, name="search_meetingtype"),
     path("<str:mt_pk>/search/archive/<int:year>/", views.search_meetingtype_archive, name="search_archive"),
     path("<str:mt_pk>/upcoming/", views.upcoming_meetings, name="upcoming_meetings"),
@@ -11,22 +11,25 @@ from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import PermissionDenied
 from django.core.handlers.wsgi import WSGIRequest
 from django.db.models import Q, QuerySet
-from django.http import Http404, HttpResponse, QueryDict
+from django.http import Http404, HttpResponse, QueryDict, StreamingHttpResponse
+from django.http.response import HttpResponseBase
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.safestring import SafeString
 from django.utils.translation import gettext as _
 from django.views.decorators.clickjacking import xframe_options_exempt
 
 from meetings.models import Meeting
-from protokolle.models import Protokoll
-from tops.models import Top
+from toptool.utils.files import stream_zip
 from toptool.utils.permission import auth_login_required
 from toptool.utils.shortcuts import get_permitted_mts_sorted, render
 from toptool.utils.typing import AuthWSGIRequest
 
-from .forms import MTAddForm, MTForm
+from .export import archive_files
+from .forms import MTAddForm, MTForm, SearchForm
 from .models import MeetingType
+from .search import accessible_meetingtypes, format_cursor, search_meetings, search_meetings_page, SEARCH_PAGE_SIZE
 
 
 def list_meetingtypes(request: WSGIRequest) -> HttpResponse:
@@ -106,6 +109,46 @@ def list_admins(request: AuthWSGIRequest) -> HttpResponse:
     return render(request, "meetingtypes/list_admins.html", context)
 
 
+def search(request: WSGIRequest) -> HttpResponse:
+    """
+    Searches the meetings of all meetingtypes the user has access to, optionally only of one meetingtype or year.
+    The results are shown in pages, the next page continues after the last meeting of the current one.
+
+    @permission: allowed by anyone, only public meetingtypes and meetingtypes the user has permission for are searched
+    @param request: a WSGIRequest
+    @return: a HttpResponse
+    """
+    meetingtypes: QuerySet[MeetingType] = accessible_meetingtypes(request.user)
+    form = SearchForm(request.GET or None, meetingtypes=meetingtypes)
+    results: OrderedDict[Meeting, list[tuple[str, SafeString]]] = OrderedDict()
+    next_url: Optional[str] = None
+    if form.is_valid():
+        if form.cleaned_data["meetingtype"]:
+            meetingtypes = meetingtypes.filter(pk=form.cleaned_data["meetingtype"])
+        meetings_qs: QuerySet[Meeting] = Meeting.objects.filter(meetingtype__in=meetingtypes)
+        if form.cleaned_data["year"]:
+            meetings_qs = meetings_qs.filter(time__year=form.cleaned_data["year"])
+        results, next_page = search_meetings_page(
+            request.user,
+            meetings_qs,
+            form.cleaned_data["query"],
+            after=form.cleaned_data["after"],
+            limit=SEARCH_PAGE_SIZE,
+            fuzzy=form.cleaned_data["fuzzy"],
+        )
+        if next_page is not None:
+            next_query: QueryDict = request.GET.copy()
+            next_query["after"] = format_cursor(next_page)
+            next_url = f"{reverse('meetingtypes:search')}?{next_query.urlencode()}"
+
+    context = {
+        "form": form,
+        "results": results,
+        "next_url": next_url,
+    }
+    return render(request, "meetingtypes/search.html", context)
+
+
 def search_meetingtype_archive(request: WSGIRequest, mt_pk: str, year: int) -> HttpResponse:
     """
     Searches the meeting archive for given year.
@@ -120,6 +163,34 @@ def search_meetingtype_archive(request: WSGIRequest, mt_pk: str, year: int) -> H
     return _view_meetingtype_archive(request, mt_pk, year, search_archive_flag=True)
 
 
+def export_meetingtype_archive(request: WSGIRequest, mt_pk: str, year: int) -> HttpResponseBase:
+    """
+    Downloads the protokolle and attachments of all meetings in the archive of the given year as a zip file.
+    The zip file is built while it is sent, only the files the user may download are included.
+
+    @permission: allowed only by users with permission for that meetingtype or allowed for public if public-bit set
+    @param request: a WSGIRequest
+    @param mt_pk: id of a MeetingType
+    @param year: the given year
+    @return: a StreamingHttpResponse containing the zip file
+    """
+    if not 1950 < year < 2050:
+        raise Http404("Invalid year. Asserted to be between 1950 and 2050")
+    meetingtype: MeetingType = get_object_or_404(MeetingType, pk=mt_pk)
+    if not meetingtype.public:  # public access disabled
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        if not request.user.has_perm(meetingtype.access_permission):
+            raise PermissionDenied
+
+    response = StreamingHttpResponse(
+        stream_zip(archive_files(meetingtype, year, request.user)),
+        content_type="application/zip",
+    )
+    response["Content-Disposition"] = f'attachment; filename="{meetingtype.id}_{year}.zip"'
+    return response
+
+
 def view_meetingtype_archive(request: WSGIRequest, mt_pk: str, year: int) -> HttpResponse:
     """
     Shows meeting archive for given year (possibly searching it).
@@ -173,54 +244,6 @@ def _get_query_string(request: WSGIRequest) -> str:
     return ""
 
 
-def _search_meeting(request: WSGIRequest, meeting: Meeting, search_query: str) -> list[str]:
-    location = []
-    top_set: list[Top] = list(meeting.top_set.order_by("topid").all())
-    for top in top_set:
-        if search_query.lower() in top.title.lower() or search_query.lower() in top.description.lower():
-            location.append("Tagesordnung")
-            break
-    try:
-        protokoll: Optional[Protokoll] = meeting.protokoll
-    except Protokoll.DoesNotExist:
-        protokoll = None
-    if protokoll and protokoll.filepath:
-        privileged_user = (
-            request.user.has_perm(meeting.meetingtype.admin_permission)
-            or request.user == meeting.sitzungsleitung
-            or request.user in meeting.minute_takers.all()
-        )
-        if (protokoll.published or privileged_user) and (protokoll.approved or request.user.is_authenticated):
-            with open(protokoll.filepath + ".txt", "r", encoding="UTF-8") as file:
-                content = file.read()
-                if search_query.lower() in content.lower():
-                    location.append("Protokoll")
-    return location
-
-
-def _search_meetings_qs(
-    request: WSGIRequest,
-    meetings: QuerySet[Meeting],
-    search_query: str,
-) -> OrderedDict[Meeting, list[str]]:
-    meeting_location = OrderedDict()
-    meeting: Meeting
-    for meeting in meetings:
-        location: list[str] = []
-        # check for substring in the title
-        title: str = meeting.title
-        if not title:
-            title = meeting.meetingtype.defaultmeetingtitle
-        if search_query.lower() in title.lower():
-            location.append("Titel")
-        # check for substring in any of the TOPs or the minutes
-        location.extend(_search_meeting(request, meeting, search_query))
-
-        if location:
-            meeting_location[meeting] = location
-    return meeting_location
-
-
 def _view_meetingtype(request: WSGIRequest, mt_pk: str, search_mt: bool) -> HttpResponse:
     """
     Shows single meetingtype (possibly searching it).
@@ -251,13 +274,13 @@ def _view_meetingtype(request: WSGIRequest, mt_pk: str, search_mt: bool) -> Http
     if search_mt:
         if not search_query:
             return redirect("meetingtypes:view_meetingtype", mt_pk)
-        past_meetings_dict: OrderedDict[Meeting, list[str]] = _search_meetings_qs(
-            request,
+        past_meetings_dict: OrderedDict[Meeting, list[tuple[str, SafeString]]] = search_meetings(
+            request.user,
             past_meetings_qs,
             search_query,
         )
-        upcoming_meetings_dict: OrderedDict[Meeting, list[str]] = _search_meetings_qs(
-            request,
+        upcoming_meetings_dict: OrderedDict[Meeting, list[tuple[str, SafeString]]] = search_meetings(
+            request.user,
             upcoming_meetings_qs,
             search_query,
         )
@@ -335,7 +358,11 @@ def _view_meetingtype_archive(request: WSGIRequest, mt_pk: str, year: int, searc
     if search_archive_flag:
         if not search_query:
             return redirect("meetingtypes:view_archive", mt_pk, year)
-        meetings: OrderedDict[Meeting, list[str]] = _search_meetings_qs(request, meetings_qs, search_query)
+        meetings: OrderedDict[Meeting, list[tuple[str, SafeString]]] = search_meetings(
+            request.user,
+            meetings_qs,
+            search_query,
+        )
     else:
         # OrderedDict.fromkeys returns a OrderedDict and not a dict, as mypy thinks
         meetings = OrderedDict.fromkeys(meetings_qs, [])
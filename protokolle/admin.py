@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from .models import Attachment, Protokoll
+from .models import Attachment, GenerationJob, Protokoll
 
 admin.site.register(Protokoll)
 admin.site.register(Attachment)
+admin.site.register(GenerationJob)
@@ -4,7 +4,7 @@ from django.template import defaultfilters
 from django.utils.translation import get_language
 from django.utils.translation import gettext_lazy as _
 
-from toptool.forms import UserChoiceField
+from toptool.forms import ChunkedFileInput, UserChoiceField
 
 from .models import Attachment, Protokoll
 
@@ -123,11 +123,16 @@ class AttachmentForm(forms.ModelForm):
     class Meta:
         model = Attachment
         exclude = ["sort_order", "meeting"]
+        widgets = {
+            "attachment": ChunkedFileInput(),
+        }
 
     def __init__(self, *args, **kwargs):
         self.meeting = kwargs.pop("meeting")
+        user = kwargs.pop("user")
 
         super().__init__(*args, **kwargs)
+        self.fields["attachment"].widget.user = user
 
     def save(self, commit=True):
         instance = super().save(False)
@@ -0,0 +1,95 @@
+import hashlib
+import os
+import re
+from pathlib import Path
+from subprocess import PIPE, Popen  # nosec: used in a secure manner
+from tempfile import TemporaryDirectory
+from typing import Optional
+
+from django.conf import settings
+
+# everything before the title is the same for all protokolle using the same template
+PREAMBLE_END_RE = re.compile(r"^\\title\b|^\\begin\{document\}", re.MULTILINE)
+# printed by pdflatex if a format can not be loaded (e.g. it was dumped by a different TeX Live version)
+FORMAT_ERROR_RE = re.compile(rb"Fatal format file error|I can't find the format file")
+
+
+def split_preamble(tex: str) -> tuple[str, str]:
+    """
+    Splits a tex file generated by txt2tags into the preamble, which can be precompiled, and the rest of the document.
+
+    @param tex: the content of the tex file
+    @return: the preamble and the body (which starts with the \\title)
+    """
+    match = PREAMBLE_END_RE.search(tex)
+    if match is None:
+        return "", tex
+    return tex[: match.start()], tex[match.start() :]
+
+
+def format_name(preamble: str) -> str:
+    """
+    @param preamble: the preamble of a tex file (see split_preamble)
+    @return: the name of the format containing this preamble
+    """
+    return "protokoll-" + hashlib.sha256(preamble.encode("UTF-8")).hexdigest()[:16]
+
+
+def get_format(preamble: str) -> Optional[str]:
+    """
+    @param preamble: the preamble of a tex file (see split_preamble)
+    @return: the path of the precompiled format for this preamble (without the .fmt extension) or None if there is none
+    """
+    format_dir: Optional[Path] = settings.PROTOKOLL_LATEX_FORMAT_DIR
+    if not preamble or format_dir is None:
+        return None
+    path = Path(format_dir) / format_name(preamble)
+    if not path.with_suffix(".fmt").exists():
+        return None
+    return str(path)
+
+
+def remove_format(fmt: str) -> None:
+    """
+    Removes a format, which pdflatex could not load, so that the next generations use a normal run right away.
+
+    @param fmt: the path of the format as returned by get_format
+    """
+    try:
+        os.remove(fmt + ".fmt")
+    except OSError:
+        pass
+
+
+def dump_format(preamble: str, format_dir: Path) -> Path:
+    """
+    Precompiles the preamble into a format in format_dir (usually settings.PROTOKOLL_LATEX_FORMAT_DIR).
+    The format is written to a temporary directory first, so pdflatex never loads a partially written format.
+
+    @param preamble: the preamble of a tex file (see split_preamble)
+    @param format_dir: the directory of the formats
+    @return: the path of the dumped .fmt file
+    """
+    format_dir.mkdir(parents=True, exist_ok=True)
+    name = format_name(preamble)
+    with TemporaryDirectory(dir=format_dir) as tmp_dir:
+        source = Path(tmp_dir) / "preamble.tex"
+        source.write_text(preamble + "\n\\dump\n", encoding="UTF-8")
+        cmd = [
+            "pdflatex",
+            "-ini",
+            "-interaction",
+            "nonstopmode",
+            "-jobname",
+            name,
+            "-output-directory",
+            tmp_dir,
+            "&pdflatex",
+            str(source),
+        ]
+        with Popen(cmd, stdout=PIPE, stderr=PIPE) as process:  # nosec: used in a secure manner
+            stdout, stderr = process.communicate()
+        dumped = Path(tmp_dir) / (name + ".fmt")
+        if stderr or not dumped.exists():
+            raise RuntimeError(stderr or stdout)
+        return dumped.replace(format_dir / (name + ".fmt"))
@@ -0,0 +1,64 @@
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Optional
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import get_template
+
+from meetingtypes.models import MeetingType
+from protokolle import latex_formats, t2t_engines
+
+
+class Command(BaseCommand):
+    help = (
+        "Precompiles the pdflatex preamble of the standard template and of every custom template into a format, "
+        "which is used by the protokoll generation. Run it again after changing a template or updating TeX Live."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--clean",
+            action="store_true",
+            help="Remove the formats, which do not belong to any of the current templates.",
+        )
+
+    def handle(self, *args, **options):
+        format_dir: Optional[Path] = settings.PROTOKOLL_LATEX_FORMAT_DIR
+        if format_dir is None:
+            raise CommandError("PROTOKOLL_LATEX_FORMAT_DIR is not set.")
+        format_dir = Path(format_dir)
+        template_names: set[str] = {"protokolle/script.t2t"}
+        template_names.update(
+            MeetingType.objects.exclude(custom_template="").values_list("custom_template", flat=True).distinct(),
+        )
+        dumped: set[Path] = set()
+        for template_name in sorted(template_names):
+            preamble: str = self._get_preamble(template_name)
+            if not preamble:
+                self.stderr.write(f"{template_name}: no preamble found")
+                continue
+            try:
+                path = latex_formats.dump_format(preamble, format_dir)
+            except (OSError, RuntimeError) as err:
+                self.stderr.write(f"{template_name}: {err}")
+                continue
+            dumped.add(path)
+            self.stdout.write(f"{template_name}: {path}")
+        if options["clean"]:
+            for path in format_dir.glob("protokoll-*.fmt"):
+                if path not in dumped:
+                    os.remove(path)
+                    self.stdout.write(f"removed {path}")
+
+    @staticmethod
+    def _get_preamble(template_name: str) -> str:
+        # the preamble only depends on the config lines of the template, not on the meeting
+        script: str = get_template(template_name).render({"text": ""})
+        with TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "preamble.tex")
+            t2t_engines.get_engine().parse(script).write("tex", path)
+            with open(path, "r", encoding="UTF-8") as file:
+                preamble, _body = latex_formats.split_preamble(file.read())
+        return preamble
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from protokolle.models import GenerationJob
+
+
+class Command(BaseCommand):
+    help = "Worker, which generates the queued protokolle (html, txt and pdf)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit as soon as the queue is empty instead of waiting for new jobs.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=2.0,
+            help="Seconds to wait before polling an empty queue again.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            job = GenerationJob.claim_next()
+            if job is None:
+                # jobs of crashed workers are only picked up again, when there is nothing else to do
+                if GenerationJob.requeue_stale():
+                    continue
+                if options["once"]:
+                    return
+                time.sleep(options["interval"])
+                continue
+            job.run()
+            if job.state == GenerationJob.SUCCESS:
+                timings = ", ".join(f"{stage}={value:.2f}" for stage, value in job.timings.items())
+                self.stdout.write(f"{job}: done ({timings})")
+            else:
+                self.stderr.write(f"{job}: {job.error}")
@@ -0,0 +1,34 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from protokolle.models import Protokoll
+
+
+class Command(BaseCommand):
+    help = "Generates the missing pdf files of recent protokolle, whose meetingtype generates the pdf on the first request."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=30,
+            help="Only consider meetings of the last DAYS days.",
+        )
+
+    def handle(self, *args, **options):
+        protokolle = Protokoll.objects.filter(
+            meeting__meetingtype__lazy_pdf=True,
+            meeting__meetingtype__protokoll=True,
+            meeting__time__gte=timezone.now() - datetime.timedelta(days=options["days"]),
+        ).select_related("meeting__meetingtype")
+        for protokoll in protokolle.iterator():
+            if protokoll.pdf_is_current():
+                continue
+            try:
+                protokoll.ensure_pdf()
+            except (OSError, RuntimeError) as err:
+                self.stderr.write(f"{protokoll}: {err}")
+            else:
+                self.stdout.write(f"{protokoll}: done")
@@ -0,0 +1,60 @@
+# Generated by Django 4.1.13 on 2026-10-18 15:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("meetings", "0011_alter_meeting_topdeadline"),
+        ("protokolle", "0009_alter_attachment_attachment"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GenerationJob",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("script", models.TextField(verbose_name="t2t-Skript")),
+                (
+                    "state",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Wartend"),
+                            ("running", "Wird generiert"),
+                            ("success", "Erfolgreich"),
+                            ("failed", "Fehlgeschlagen"),
+                        ],
+                        default="pending",
+                        max_length=10,
+                        verbose_name="Status",
+                    ),
+                ),
+                ("error", models.TextField(blank=True, verbose_name="Fehlermeldung")),
+                ("created", models.DateTimeField(auto_now_add=True, verbose_name="Erstellt")),
+                ("started", models.DateTimeField(blank=True, null=True, verbose_name="Gestartet")),
+                ("finished", models.DateTimeField(blank=True, null=True, verbose_name="Beendet")),
+                (
+                    "meeting",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="meetings.meeting",
+                        verbose_name="Sitzung",
+                    ),
+                ),
+                (
+                    "requested_by",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Angefordert von",
+                    ),
+                ),
+            ],
+        ),
+    ]
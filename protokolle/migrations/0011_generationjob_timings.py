@@ -0,0 +1,18 @@
+# Generated by Django 4.1.13 on 2026-10-18 15:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("protokolle", "0010_generationjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="generationjob",
+            name="timings",
+            field=models.JSONField(blank=True, default=dict, verbose_name="Laufzeiten (in Sekunden)"),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.1.13 on 2026-10-18 16:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("protokolle", "0011_generationjob_timings"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="attachment",
+            name="attachment_content_type",
+            field=models.CharField(blank=True, editable=False, max_length=100, verbose_name="Dateityp"),
+        ),
+        migrations.AddField(
+            model_name="attachment",
+            name="attachment_sha256",
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name="SHA-256"),
+        ),
+        migrations.AddField(
+            model_name="attachment",
+            name="attachment_size",
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True, verbose_name="Dateigröße"),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.1.13 on 2026-10-18 16:14
+
+from django.db import migrations
+
+import protokolle.models
+import toptool.utils.files
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("protokolle", "0012_attachment_metadata"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="attachment",
+            name="attachment",
+            field=toptool.utils.files.AttachmentField(
+                help_text="Erlaubte Dateiformate: %(filetypes)s",
+                storage=protokolle.models.AttachmentStorage(),
+                upload_to=protokolle.models.attachment_path,
+                validators=[toptool.utils.files.validate_file_type],
+                verbose_name="Anhang",
+            ),
+        ),
+    ]
@@ -1,37 +1,99 @@
 import datetime
+import fcntl
 import glob
+import hashlib
+import json
+import logging
 import os
-from contextlib import suppress
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, suppress
 from subprocess import PIPE, Popen  # nosec: used in a secure manner
-from typing import Any, Optional
+from tempfile import mkdtemp, NamedTemporaryFile
+from time import perf_counter
+from typing import Any, Iterator, Optional
 
 from django.conf import settings
 from django.contrib import messages
 from django.core.files.storage import FileSystemStorage
-from django.db import models
-from django.db.models.signals import pre_delete
-from django.dispatch import receiver
+from django.db import models, transaction
+from django.db.models import Exists, OuterRef
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver, Signal
 from django.http import HttpResponse
 from django.shortcuts import redirect
 from django.template import Context, Template, TemplateSyntaxError
 from django.template.loader import get_template
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 # pylint: disable-next=unused-import
 import meetings.models
-from toptool.utils.files import validate_file_type
+from protokolle import latex_formats, t2t_engines, template_cache
+from toptool.models import ArchivedFile, Blob, release_attachment, store_attachment
+from toptool.utils import thumbnails
+from toptool.utils.files import AttachmentField, precompress_file, sniff_file, validate_file_type
 from toptool.utils.typing import AuthWSGIRequest
 
+logger = logging.getLogger(__name__)
+
+# the txt2tags targets, the tex file is used to generate the pdf
+T2T_TARGETS = ["tex", "html", "txt"]
+# the targets, which are served with compression (see send_precompressed_file)
+PRECOMPRESSED_TARGETS = ["html", "txt"]
+# the generated files, which are moved into the archive for old meetings (see meetingtypes.archive)
+ARCHIVED_EXTENSIONS = [".html", ".txt", ".pdf"]
+# pdflatex is rerun until these files are stable (or MAX_PDFLATEX_PASSES is reached)
+LATEX_AUX_EXTENSIONS = [".aux", ".toc", ".out"]
+LATEX_RERUN_RE = re.compile(r"Rerun to get|Please rerun|Rerun LaTeX")
+MAX_PDFLATEX_PASSES = 3
+
+
+# sent after the files of a protokoll were generated successfully (see Protokoll.generate)
+protokoll_generated = Signal()
+
 
 class IllegalCommandException(Exception):
     pass
 
 
+def _generation_error_output(err: RuntimeError) -> str:
+    """
+    @param err: the error raised by a program of the protokoll generation pipeline
+    @return: the output of the program or the message of the error, if it was not raised with the output
+    """
+    if err.args and isinstance(err.args[0], bytes):
+        return err.args[0].decode("utf-8", errors="replace").strip()
+    return str(err).strip()
+
+
+def generation_error_message(err: Exception) -> Optional[str]:
+    """
+    Translates an error raised by the protokoll generation pipeline into a message for the user.
+
+    @param err: the error raised while rendering or generating the protokoll
+    @return: the message or None if the error is unexpected (not caused by the user's protokoll)
+    """
+    if isinstance(err, TemplateSyntaxError):
+        return _("Template-Syntaxfehler: {error_message}").format(error_message=err.args[0])
+    if isinstance(err, IllegalCommandException):
+        error_message = _("Befehle (Zeilen, die mit '%!' beginnen) sind nicht erlaubt")
+        return _("Template-Syntaxfehler: {error_message}").format(error_message=error_message)
+    if isinstance(err, UnicodeDecodeError):
+        return str(_("Encoding-Fehler: Die Protokoll-Datei ist nicht UTF-8 kodiert."))
+    if isinstance(err, RuntimeError):
+        lines = _generation_error_output(err).splitlines()
+        if lines and lines[-1].startswith("txt2tags.error"):
+            return lines[-1]
+    return None
+
+
 class AttachmentStorage(FileSystemStorage):
-    def url(self, name):
-        attachment = Attachment.objects.get(attachment=name)
-        return reverse("protokolle:show_attachment_protokoll", args=[attachment.id])
+    """
+    The storage of the attachments, their urls are built by Attachment.get_attachment_url (see AttachmentFieldFile).
+    """
 
 
 def protokoll_path(instance: "Protokoll", filename: str) -> str:
@@ -64,7 +126,7 @@ def attachment_path(instance: "Attachment", filename: str) -> str:
 class Attachment(models.Model):
     meeting = models.ForeignKey("meetings.Meeting", on_delete=models.CASCADE, verbose_name=_("Sitzung"))
     name = models.CharField(_("Name"), max_length=100)
-    attachment = models.FileField(
+    attachment = AttachmentField(
         _("Anhang"),
         upload_to=attachment_path,
         validators=[validate_file_type],
@@ -74,8 +136,45 @@ class Attachment(models.Model):
         ),
     )
 
+    # sniffed when the file is uploaded, see toptool.utils.files.sniff_file
+    attachment_content_type = models.CharField(_("Dateityp"), max_length=100, blank=True, editable=False)
+    attachment_size = models.PositiveBigIntegerField(_("Dateigröße"), blank=True, null=True, editable=False)
+    attachment_sha256 = models.CharField(_("SHA-256"), max_length=64, blank=True, editable=False)
+
     sort_order = models.IntegerField(_("Index für Sortierung"))
 
+    def save(self, *args, **kwargs):
+        previous: Optional[str] = None
+        with transaction.atomic():
+            # pylint: disable-next=protected-access
+            if self.attachment and not self.attachment._committed:
+                if not self._state.adding:
+                    # the attachment is replaced, its previous file is released after saving
+                    previous = Attachment.objects.filter(pk=self.pk).values_list("attachment", flat=True).first()
+                self.attachment_content_type, self.attachment_size, self.attachment_sha256 = sniff_file(self.attachment)
+                store_attachment(self.attachment, self.attachment_sha256)
+                thumbnails.generate_thumbnail_later(
+                    self.attachment.path,
+                    self.attachment_sha256,
+                    self.attachment_content_type,
+                )
+            super().save(*args, **kwargs)
+            release_attachment(previous)
+
+    def get_attachment_url(self) -> str:
+        """
+        @return: the url the attachment is served at
+        """
+        return reverse("protokolle:show_attachment_protokoll", args=[self.id])
+
+    def get_thumbnail_url(self) -> str:
+        """
+        @return: the url the thumbnail of the attachment is served at or an empty string, if it has no thumbnail
+        """
+        if not self.attachment_sha256 or not thumbnails.supports_thumbnail(self.attachment_content_type):
+            return ""
+        return reverse("protokolle:show_attachment_thumbnail", args=[self.id, self.attachment_sha256])
+
     @property
     def full_filename(self) -> str:
         """
@@ -149,81 +248,351 @@ class Protokoll(models.Model):
         files = glob.glob(self.filepath + ".*")
         for file in files:
             os.remove(file)
+        self._remove_staging_directories()
+        ArchivedFile.forget(self.filepath + extension for extension in ARCHIVED_EXTENSIONS)
 
     def handle_generation(self, request: AuthWSGIRequest) -> Optional[HttpResponse]:
         """
         Handles all the different error-cases, that can occur during the protocol generation pipeline.
 
+        If settings.PROTOKOLL_GENERATION_QUEUE is set, only the t2t-script is rendered here.
+        The expensive txt2tags/pdflatex-steps are queued as a GenerationJob for the generate_protokolle worker.
+
         @param request: a WSGIRequest by a logged-in user
-        @return: a HttpResponse if the Protokoll generation was successful
+        @return: a HttpResponse if the Protokoll generation was successful (or queued)
         """
 
         try:
             script: str = self._render_protokoll_to_t2t_script(request)
-            self._generate_different_file_formats(script)
-        except TemplateSyntaxError as err:
-            error = _("Template-Syntaxfehler: {error_message}").format(error_message=err.args[0])
-            messages.error(request, error)
-        except IllegalCommandException:
-            error_message = _("Befehle (Zeilen, die mit '%!' beginnen) sind nicht erlaubt")
-            error = _("Template-Syntaxfehler: {error_message}").format(error_message=error_message)
-            messages.error(request, error)
-        except UnicodeDecodeError:
-            error = _("Encoding-Fehler: Die Protokoll-Datei ist nicht UTF-8 kodiert.")
-            messages.error(request, error)
-        except RuntimeError as err:
-            lines = err.args[0].decode("utf-8").strip().splitlines()
-            if lines[-1].startswith("txt2tags.error"):
-                messages.error(request, lines[-1])
+            if settings.PROTOKOLL_GENERATION_QUEUE:
+                GenerationJob.enqueue(self.meeting, request.user, script)
             else:
-                # delete protokoll, which failed to generate
-                self.delete()
+                self.generate(script)
+        except (TemplateSyntaxError, IllegalCommandException, UnicodeDecodeError, RuntimeError) as err:
+            error: Optional[str] = generation_error_message(err)
+            # delete protokoll, which failed to generate
+            self.delete()
+            if error is None:
                 raise err
+            messages.error(request, error)
         else:
-            # the Protocol is done 🥳
+            # the Protocol is done (or at least queued) 🥳
             return redirect("protokolle:success_protokoll", self.meeting.id)
-        # delete protokoll, which failed to generate
-        self.delete()
         return None
 
-    def _generate_different_file_formats(self, script: str) -> None:
+    def generate(self, script: str) -> dict[str, float]:
+        """
+        Generates the different file formats from the script, but only one generation per protokoll at a time.
+
+        Requests arriving while a generation is running are coalesced: they wait for it and then only the newest of
+        their scripts is generated in exactly one follow-up run, whose result the other requests share.
+        If the follow-up run fails, the other requests repeat it, so the error is raised to all of them.
+        @return: the wall-clock time (in seconds) each stage took, empty if a concurrent request generated the script
+        """
+        # the newest script always wins, older waiting scripts are overwritten
+        with NamedTemporaryFile(
+            "w",
+            encoding="UTF-8",
+            dir=self.base_filepath,
+            prefix=self.filename + ".next.",
+            delete=False,
+        ) as next_file:
+            next_file.write(script)
+        os.replace(next_file.name, self.filepath + ".next")
+        with self._generation_lock():
+            try:
+                os.replace(self.filepath + ".next", self.filepath + ".running")
+            except FileNotFoundError:
+                # a request, which waited with us, already generated our script (or a newer one) successfully
+                return {}
+            with open(self.filepath + ".running", "r", encoding="UTF-8") as running_file:
+                script = running_file.read()
+            try:
+                timings: dict[str, float] = self._generate_different_file_formats(script)
+            except BaseException:
+                # the requests waiting for this script generate it again, so they see the failure as well
+                # (unless a newer script is waiting already)
+                with suppress(FileExistsError):
+                    os.link(self.filepath + ".running", self.filepath + ".next")
+                raise
+            finally:
+                os.remove(self.filepath + ".running")
+        protokoll_generated.send(sender=Protokoll, instance=self)
+        return timings
+
+    @contextmanager
+    def _generation_lock(self) -> Iterator[None]:
+        """
+        Serializes the generation of the files of this protokoll, also across processes and workers.
+        """
+        with open(self.filepath + ".lock", "w", encoding="UTF-8") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _generate_different_file_formats(self, script: str) -> dict[str, float]:
         """
         Generates the pdf, html and txt file from a protokoll
+
+        Files, whose inputs (see t2t_engines.script_hash) did not change since the last generation, are reused.
+        The html and txt files are published together with their compressed copies (see precompress_file).
+        If settings.PROTOKOLL_CONCURRENT_GENERATION is set, the txt2tags-targets run in parallel
+        and pdflatex starts as soon as the tex file is ready.
+        @return: the wall-clock time (in seconds) each stage took
         """
-        # generate html, txt and tex files
-        for target in ["html", "txt", "tex"]:
-            args = [
-                "txt2tags",
-                "-t",
-                target,
-                "-q",  # quiet
-                "-i",
-                "-",
-                "-o",
-                self.filepath + "." + target,
-            ]
-            with Popen(args, stdin=PIPE, stdout=PIPE, stderr=PIPE) as process:  # nosec: used in a secure manner.
-                _stdout, stderr = process.communicate(input=script.encode("utf-8"))
-            if stderr:
-                raise RuntimeError(stderr)
-        # generate pdf files from tex files
+        start = perf_counter()
+        engine: t2t_engines.T2TEngine = t2t_engines.get_engine()
+        hashes: dict[str, str] = {target: t2t_engines.script_hash(engine, script, target) for target in T2T_TARGETS}
+        hashes["pdf"] = hashes["tex"]
+        cached_hashes: dict[str, str] = self._read_artifact_hashes()
+        stale: list[str] = [
+            target
+            for target in [*T2T_TARGETS, "pdf"]
+            if cached_hashes.get(target) != hashes[target] or not os.path.exists(self.filepath + "." + target)
+            # files generated before the compressed copies were introduced
+            or (target in PRECOMPRESSED_TARGETS and not os.path.exists(self.filepath + "." + target + ".gz"))
+        ]
+        lazy_pdf: bool = self.meeting.meetingtype.lazy_pdf and "pdf" in stale
+        if lazy_pdf:
+            # the pdf is generated on the first request (see ensure_pdf)
+            stale.remove("pdf")
+            del hashes["pdf"]
+        timings: dict[str, float] = {}
+        if stale:
+            inputs: list[str] = LATEX_AUX_EXTENSIONS + ([".tex"] if "pdf" in stale and "tex" not in stale else [])
+            with self._staged_files(inputs) as staged_filepath:
+                timings.update(self._generate_stale_file_formats(script, stale, staged_filepath))
+                compressed: list[str] = self._precompress_staged_files(staged_filepath, stale)
+                # the hashes are only valid again, once all files are published
+                with suppress(OSError):
+                    os.remove(self.filepath + ".hashes")
+                outputs: list[str] = ["." + target for target in stale] + compressed
+                if "pdf" in stale:
+                    outputs += LATEX_AUX_EXTENSIONS
+                self._publish_staged_files(staged_filepath, outputs)
+        if lazy_pdf:
+            with suppress(OSError):
+                os.remove(self.filepath + ".pdf")
+        if stale:
+            self._write_artifact_hashes(hashes)
+        timings["total"] = perf_counter() - start
+        return timings
+
+    def _generate_stale_file_formats(self, script: str, stale: list[str], filepath: str) -> dict[str, float]:
+        start = perf_counter()
+        document: t2t_engines.T2TDocument = t2t_engines.get_engine().parse(script)
+        timings: dict[str, float] = {"parse": perf_counter() - start}
+        targets: list[str] = [target for target in T2T_TARGETS if target in stale]
+        if settings.PROTOKOLL_CONCURRENT_GENERATION:
+            with ThreadPoolExecutor(max_workers=settings.PROTOKOLL_GENERATION_WORKERS) as executor:
+                futures = {
+                    target: executor.submit(self._run_txt2tags, document, target, filepath) for target in targets
+                }
+                if "tex" in futures:
+                    timings["tex"] = futures.pop("tex").result()
+                if "pdf" in stale:
+                    timings["pdflatex"], timings["pdflatex_passes"] = self._run_pdflatex(filepath)
+                for target, future in futures.items():
+                    timings[target] = future.result()
+        else:
+            for target in targets:
+                timings[target] = self._run_txt2tags(document, target, filepath)
+            if "pdf" in stale:
+                timings["pdflatex"], timings["pdflatex_passes"] = self._run_pdflatex(filepath)
+        return timings
+
+    @staticmethod
+    def _precompress_staged_files(staged_filepath: str, stale: list[str]) -> list[str]:
+        """
+        @return: the extensions of the compressed copies, which are published after the files they were compressed from
+        """
+        compressed: list[str] = []
+        for target in PRECOMPRESSED_TARGETS:
+            if target in stale:
+                with suppress(FileNotFoundError):
+                    extensions: list[str] = precompress_file(staged_filepath + "." + target)
+                    compressed += ["." + target + extension for extension in extensions]
+        return compressed
+
+    @contextmanager
+    def _staged_files(self, inputs: list[str]) -> Iterator[str]:
+        """
+        Provides a temporary directory on the same filesystem as the files of this protokoll, into which the stages
+        of the generation write. Thus, the served files are never half-written and can be read without locks.
+        The directory and everything left in it (e.g. the log of pdflatex) is removed afterwards.
+
+        @param inputs: extensions of the existing files, which are copied into the directory (e.g. ".tex")
+        @return: the path of the staged files including the filename, but without the extension (like filepath)
+        """
+        # left over, if a generation was killed (all generations of this protokoll hold the generation lock)
+        self._remove_staging_directories()
+        staging_dir: str = mkdtemp(dir=self.base_filepath, prefix=f".staging-{self.filename}-")
+        try:
+            staged_filepath: str = os.path.join(staging_dir, self.filename)
+            for extension in inputs:
+                with suppress(FileNotFoundError):
+                    shutil.copy2(self.filepath + extension, staged_filepath + extension)
+            yield staged_filepath
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def _remove_staging_directories(self) -> None:
+        for staging_dir in glob.glob(os.path.join(self.base_filepath, f".staging-{glob.escape(self.filename)}-*")):
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def _publish_staged_files(self, staged_filepath: str, extensions: list[str]) -> None:
+        """
+        Replaces the files of this protokoll by the staged files with atomic renames.
+        Readers see either the old or the new version of a file.
+
+        @param staged_filepath: the path returned by _staged_files
+        @param extensions: the extensions of the staged files to publish
+        """
+        for extension in extensions:
+            with suppress(FileNotFoundError):
+                os.replace(staged_filepath + extension, self.filepath + extension)
+
+    def ensure_pdf(self) -> None:
+        """
+        Generates the pdf file, if it was not generated together with the other files (see MeetingType.lazy_pdf).
+
+        Concurrent calls for the same protokoll (also from other processes) wait for the first pdflatex run
+        instead of starting their own. A running generation is waited for as well, as it rewrites the tex file.
+        """
+        if self.pdf_is_current():
+            return
+        with self._generation_lock():
+            # the pdf may have been generated while we were waiting for the lock
+            if self.pdf_is_current():
+                return
+            hashes: dict[str, str] = self._read_artifact_hashes()
+            with self._staged_files([".tex", *LATEX_AUX_EXTENSIONS]) as staged_filepath:
+                self._run_pdflatex(staged_filepath)
+                self._publish_staged_files(staged_filepath, [".pdf", *LATEX_AUX_EXTENSIONS])
+            if "tex" in hashes:
+                hashes["pdf"] = hashes["tex"]
+                self._write_artifact_hashes(hashes)
+
+    def pdf_is_current(self) -> bool:
+        """
+        @return: if the pdf file exists (or was archived) and was generated from the current tex file
+        """
+        if not os.path.exists(self.filepath + ".pdf") and ArchivedFile.find(self.filepath + ".pdf") is None:
+            return False
+        hashes: dict[str, str] = self._read_artifact_hashes()
+        # protokolle generated before the hashes were introduced always have a pdf
+        return not hashes or hashes.get("pdf") == hashes.get("tex")
+
+    def _read_artifact_hashes(self) -> dict[str, str]:
+        """
+        @return: the script hashes of the files generated last time (see _generate_different_file_formats)
+        """
+        try:
+            with open(self.filepath + ".hashes", "r", encoding="UTF-8") as file:
+                hashes: dict[str, str] = json.load(file)
+                return hashes
+        except (OSError, ValueError):
+            return {}
+
+    def _write_artifact_hashes(self, hashes: dict[str, str]) -> None:
+        with NamedTemporaryFile(
+            "w",
+            encoding="UTF-8",
+            dir=self.base_filepath,
+            prefix=self.filename + ".hashes.",
+            delete=False,
+        ) as file:
+            json.dump(hashes, file)
+        os.replace(file.name, self.filepath + ".hashes")
+
+    def _run_txt2tags(self, document: t2t_engines.T2TDocument, target: str, filepath: str) -> float:
+        """
+        Generates a single file format with txt2tags
+
+        @param document: the t2t-script parsed by the configured T2TEngine
+        @param target: the txt2tags target, e.g. "html"
+        @param filepath: the path of the staged files (see _staged_files)
+        @return: the wall-clock time (in seconds) this took
+        """
+        start = perf_counter()
+        document.write(target, filepath + "." + target)
+        return perf_counter() - start
+
+    def _run_pdflatex(self, filepath: str) -> tuple[float, int]:
+        """
+        Generates the pdf file from the tex file
+
+        Like latexmk, pdflatex is only run again if the run changed the auxiliary files (e.g. the table of contents)
+        or the log asks for a rerun.
+        If a precompiled format for the preamble exists (see the dump_latex_formats command), it is used instead of
+        loading the preamble again. Otherwise, or if pdflatex can not load the format, a normal run is done.
+        @param filepath: the path of the staged files (see _staged_files)
+        @return: the wall-clock time (in seconds) this took and the number of pdflatex passes
+        """
+        start = perf_counter()
         cmd = [
             "pdflatex",
             "-interaction",
             "nonstopmode",
             "-output-directory",
-            self.base_filepath,
-            self.filepath + ".tex",
+            os.path.dirname(filepath),
         ]
-        for _i in range(2):
-            with Popen(cmd, stdout=PIPE, stderr=PIPE) as process:  # nosec: used in a secure manner
-                _stdout, stderr = process.communicate()
+        fmt: Optional[str] = self._prepare_latex_format(filepath)
+        passes = 0
+        while True:
+            if fmt is not None:
+                run_cmd = cmd + ["-fmt", fmt, "-jobname", self.filename, filepath + ".body.tex"]
+            else:
+                run_cmd = cmd + [filepath + ".tex"]
+            checksums_before = self._latex_aux_checksums(filepath)
+            with Popen(run_cmd, stdout=PIPE, stderr=PIPE) as process:  # nosec: used in a secure manner
+                stdout, stderr = process.communicate()
+            if fmt is not None and latex_formats.FORMAT_ERROR_RE.search(stdout):
+                latex_formats.remove_format(fmt)
+                fmt = None
+                continue
             if stderr:
                 raise RuntimeError(stderr)
-        # remove tex files
-        for extension in [".aux", ".out", ".toc", ".log"]:
-            with suppress(OSError):
-                os.remove(self.filepath + extension)
+            passes += 1
+            if passes >= MAX_PDFLATEX_PASSES:
+                break
+            if checksums_before == self._latex_aux_checksums(filepath) and not self._latex_log_requests_rerun(filepath):
+                break
+        return perf_counter() - start, passes
+
+    @staticmethod
+    def _prepare_latex_format(filepath: str) -> Optional[str]:
+        """
+        Writes the tex file without its preamble to <filepath>.body.tex, if a format for the preamble exists.
+
+        @param filepath: the path of the staged files (see _staged_files)
+        @return: the path of the format (see latex_formats.get_format) or None if pdflatex has to do a normal run
+        """
+        with open(filepath + ".tex", "r", encoding="UTF-8") as file:
+            preamble, body = latex_formats.split_preamble(file.read())
+        fmt: Optional[str] = latex_formats.get_format(preamble)
+        if fmt is not None:
+            with open(filepath + ".body.tex", "w", encoding="UTF-8") as file:
+                file.write(body)
+        return fmt
+
+    @staticmethod
+    def _latex_aux_checksums(filepath: str) -> dict[str, str]:
+        checksums: dict[str, str] = {}
+        for extension in LATEX_AUX_EXTENSIONS:
+            try:
+                with open(filepath + extension, "rb") as file:
+                    checksums[extension] = hashlib.sha256(file.read()).hexdigest()
+            except OSError:
+                checksums[extension] = ""
+        return checksums
+
+    @staticmethod
+    def _latex_log_requests_rerun(filepath: str) -> bool:
+        try:
+            with open(filepath + ".log", "r", encoding="UTF-8", errors="replace") as file:
+                return any(LATEX_RERUN_RE.search(line) for line in file)
+        except OSError:
+            return False
 
     def _render_protokoll_to_t2t_script(self, request: AuthWSGIRequest) -> str:
         text = self._get_text_from_t2t()
@@ -273,18 +642,13 @@ class Protokoll(models.Model):
         return attendees_list
 
     def _convert_text_to_template(self, text: str) -> Template:
-        if self.meeting.meetingtype.attachment_protokoll:
-            text = text.replace("[[ anhang", "{% anhang")
-        tags_with_end = []
-        if self.meeting.meetingtype.motion_tag:
-            tags_with_end = ["antrag", "motion"]
-        if self.meeting.meetingtype.point_of_order_tag:
-            tags_with_end += ["goantrag", "point_of_order"]
-        for tag in tags_with_end:
-            text = text.replace(f"[[ {tag}", f"{{% {tag}")
-            text = text.replace(f"[[ end{tag}", f"{{% end{tag}")
-        text = text.replace("]]", "%}")
-        return Template("{% load protokoll_tags %}\n" + text)
+        meetingtype = self.meeting.meetingtype
+        return template_cache.get_protokoll_template(
+            text,
+            attachments=meetingtype.attachment_protokoll,
+            motions=meetingtype.motion_tag,
+            points_of_order=meetingtype.point_of_order_tag,
+        )
 
     def _get_text_from_t2t(self) -> str:
         with open(self.t2t.path, "r", encoding="UTF-8") as file:
@@ -336,6 +700,163 @@ class Protokoll(models.Model):
         return f"Protokoll for {self.meeting} ({self.begin}-{self.end})"
 
 
+class GenerationJob(models.Model):
+    """
+    A queued run of the txt2tags/pdflatex-steps of the protokoll generation.
+
+    The t2t-script is rendered in the request (it needs the request for absolute urls) and stored here.
+    The jobs are processed by the generate_protokolle management command.
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCESS = "success"
+    FAILED = "failed"
+    STATES = (
+        (PENDING, _("Wartend")),
+        (RUNNING, _("Wird generiert")),
+        (SUCCESS, _("Erfolgreich")),
+        (FAILED, _("Fehlgeschlagen")),
+    )
+
+    meeting = models.ForeignKey("meetings.Meeting", on_delete=models.CASCADE, verbose_name=_("Sitzung"))
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        verbose_name=_("Angefordert von"),
+    )
+    script = models.TextField(_("t2t-Skript"))
+
+    state = models.CharField(_("Status"), max_length=10, choices=STATES, default=PENDING)
+    error = models.TextField(_("Fehlermeldung"), blank=True)
+    timings = models.JSONField(_("Laufzeiten (in Sekunden)"), default=dict, blank=True)
+
+    created = models.DateTimeField(_("Erstellt"), auto_now_add=True)
+    started = models.DateTimeField(_("Gestartet"), blank=True, null=True)
+    finished = models.DateTimeField(_("Beendet"), blank=True, null=True)
+
+    @property
+    def done(self) -> bool:
+        """
+        @return: True if the job is not waiting or running anymore
+        """
+        return self.state in (GenerationJob.SUCCESS, GenerationJob.FAILED)
+
+    @staticmethod
+    def enqueue(meeting: "meetings.models.Meeting", requested_by: Any, script: str) -> "GenerationJob":
+        """
+        Queues the generation of the protokoll of a meeting.
+
+        If the meeting already has a pending job, its script is replaced by the newer one instead of queueing
+        a second job. Together with claim_next this means, that a meeting has at most one running job and
+        exactly one follow-up job, no matter how often the protokoll is generated in the meantime.
+
+        @param meeting: the meeting of the protokoll
+        @param requested_by: the user, who requested the generation
+        @param script: the rendered t2t-script
+        @return: the new or updated job
+        """
+        with transaction.atomic():
+            # lock the meeting row, so concurrent requests for the same meeting do not both create a job
+            meetings.models.Meeting.objects.select_for_update().get(pk=meeting.pk)
+            job: Optional[GenerationJob] = GenerationJob.objects.filter(
+                meeting=meeting,
+                state=GenerationJob.PENDING,
+            ).first()
+            if job is None:
+                return GenerationJob.objects.create(meeting=meeting, requested_by=requested_by, script=script)
+            job.script = script
+            job.requested_by = requested_by
+            job.save(update_fields=["script", "requested_by"])
+            return job
+
+    @staticmethod
+    def requeue_stale() -> int:
+        """
+        Puts jobs back into the queue, which are running longer than PROTOKOLL_GENERATION_TIMEOUT.
+        Such jobs were claimed by a worker, which crashed or was killed before it could record the result.
+
+        If the meeting already has a newer job, the stale job is marked as failed instead, because the
+        newer job generates a newer script anyway.
+
+        @return: the number of stale jobs
+        """
+        deadline = timezone.now() - datetime.timedelta(seconds=settings.PROTOKOLL_GENERATION_TIMEOUT)
+        stale_jobs = GenerationJob.objects.filter(state=GenerationJob.RUNNING, started__lt=deadline)
+        newer_jobs = GenerationJob.objects.filter(meeting=OuterRef("meeting"), created__gt=OuterRef("created"))
+        failed = stale_jobs.filter(Exists(newer_jobs)).update(
+            state=GenerationJob.FAILED,
+            error=str(_("Zeitüberschreitung bei der Generierung.")),
+            finished=timezone.now(),
+        )
+        requeued = stale_jobs.update(state=GenerationJob.PENDING, started=None)
+        return failed + requeued
+
+    @staticmethod
+    def claim_next() -> Optional["GenerationJob"]:
+        """
+        Claims the oldest pending job, so that concurrently running workers never process the same job.
+        Jobs of meetings, which are currently generated by another worker, are skipped until that job is done
+        or stale (see requeue_stale).
+
+        @return: the claimed job or None if the queue is empty
+        """
+        deadline = timezone.now() - datetime.timedelta(seconds=settings.PROTOKOLL_GENERATION_TIMEOUT)
+        running_meetings = GenerationJob.objects.filter(
+            state=GenerationJob.RUNNING,
+            started__gte=deadline,
+        ).values("meeting")
+        pending_jobs = GenerationJob.objects.filter(state=GenerationJob.PENDING).exclude(meeting__in=running_meetings)
+        for job in pending_jobs.order_by("created"):
+            started = timezone.now()
+            claimed = GenerationJob.objects.filter(pk=job.pk, state=GenerationJob.PENDING).update(
+                state=GenerationJob.RUNNING,
+                started=started,
+            )
+            if claimed:
+                job.state = GenerationJob.RUNNING
+                job.started = started
+                return job
+        return None
+
+    def run(self) -> None:
+        """
+        Generates the different file formats from the stored script and records the result.
+        As in Protokoll.handle_generation, a protokoll which failed to generate is deleted.
+        """
+        try:
+            protokoll: Protokoll = self.meeting.protokoll
+        except Protokoll.DoesNotExist:
+            self._finish(GenerationJob.FAILED, str(_("Das Protokoll wurde in der Zwischenzeit gelöscht.")))
+            return
+        try:
+            self.timings = protokoll.generate(self.script)
+        except RuntimeError as err:
+            error: Optional[str] = generation_error_message(err)
+            if error is None:
+                error = _generation_error_output(err)
+            protokoll.delete()
+            self._finish(GenerationJob.FAILED, error)
+        except Exception as err:  # pylint: disable=broad-except
+            # the worker has to keep running, so unexpected errors are recorded like the errors of txt2tags
+            logger.exception("generation of %s failed", self)
+            protokoll.delete()
+            self._finish(GenerationJob.FAILED, f"{type(err).__name__}: {err}")
+        else:
+            self._finish(GenerationJob.SUCCESS)
+
+    def _finish(self, state: str, error: str = "") -> None:
+        self.state = state
+        self.error = error
+        self.finished = timezone.now()
+        self.save()
+
+    def __str__(self):
+        return f"GenerationJob for {self.meeting} ({self.state})"
+
+
 # pylint: disable=unused-argument
 @receiver(pre_delete, sender=Protokoll)
 def delete_protokoll(sender: type[Protokoll], instance: Protokoll, **kwargs: Any) -> None:
@@ -348,4 +869,15 @@ def delete_protokoll(sender: type[Protokoll], instance: Protokoll, **kwargs: Any
     instance.delete_files()
 
 
+@receiver(post_delete, sender=Attachment)
+def delete_attachment(sender: type[Attachment], instance: Attachment, **kwargs: Any) -> None:
+    """
+    Signal listener that releases the file of an attachment, when the attachment object is deleted.
+
+    @param sender: the sender of the event
+    @param instance: the Attachment
+    """
+    Blob.release(instance.attachment.name)
+
+
 # pylint: enable=unused-argument
@@ -0,0 +1,182 @@
+import functools
+import hashlib
+import importlib
+import re
+import threading
+import traceback
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from subprocess import PIPE, Popen  # nosec: used in a secure manner
+from types import ModuleType
+from typing import Iterator
+
+from django.conf import settings
+
+# config lines only applying to one target, e.g. %!postproc(tex): ...
+TARGET_CONFIG_RE = re.compile(r"^%!\s*\w+\s*\((\w+)\)")
+
+
+class T2TDocument(ABC):
+    """A t2t-script, which was parsed by a T2TEngine and can be written to the different targets."""
+
+    @abstractmethod
+    def write(self, target: str, path: str) -> None:
+        """
+        Converts the document to the given txt2tags target and writes it to path.
+        Like the txt2tags command line, errors are raised as RuntimeError with the (byte-)error message.
+
+        @param target: the txt2tags target, e.g. "html"
+        @param path: the file the result should be written to
+        """
+
+
+class T2TEngine(ABC):
+    """A backend, which converts t2t-scripts with txt2tags."""
+
+    @property
+    @abstractmethod
+    def version(self) -> str:
+        """
+        @return: identifies the backend and txt2tags version, as both may change the generated files
+        """
+
+    @abstractmethod
+    def parse(self, script: str) -> T2TDocument:
+        """
+        @param script: the rendered t2t-script
+        @return: the parsed document
+        """
+
+
+class SubprocessT2TDocument(T2TDocument):
+    def __init__(self, script: str):
+        self.script = script
+
+    def write(self, target: str, path: str) -> None:
+        args = [
+            "txt2tags",
+            "-t",
+            target,
+            "-q",  # quiet
+            "-i",
+            "-",
+            "-o",
+            path,
+        ]
+        with Popen(args, stdin=PIPE, stdout=PIPE, stderr=PIPE) as process:  # nosec: used in a secure manner.
+            _stdout, stderr = process.communicate(input=self.script.encode("utf-8"))
+        if stderr:
+            raise RuntimeError(stderr)
+
+
+class SubprocessT2TEngine(T2TEngine):
+    """Runs the txt2tags command once per target. Every run parses the script again."""
+
+    @functools.cached_property
+    def version(self) -> str:
+        try:
+            with Popen(["txt2tags", "-V"], stdout=PIPE, stderr=PIPE) as process:  # nosec: used in a secure manner
+                stdout, _stderr = process.communicate()
+        except OSError:
+            return "subprocess"
+        return "subprocess " + stdout.decode("utf-8", errors="replace").strip()
+
+    def parse(self, script: str) -> T2TDocument:
+        return SubprocessT2TDocument(script)
+
+
+@contextmanager
+def _txt2tags_errors(txt2tags: ModuleType) -> Iterator[None]:
+    """
+    Raises the errors of the txt2tags module like the txt2tags command line reports them.
+    """
+    try:
+        yield
+    except (txt2tags.error, SystemExit) as err:
+        # txt2tags reports errors in the user's document by exiting, which must not end our process
+        raise RuntimeError(f"txt2tags.error: {err}".encode()) from err
+    except Exception as err:  # pylint: disable=broad-except
+        raise RuntimeError(traceback.format_exc().encode()) from err
+
+
+class InProcessT2TDocument(T2TDocument):
+    def __init__(self, engine: "InProcessT2TEngine", script: str):
+        self.engine = engine
+        txt2tags = engine.module
+        with engine.lock, _txt2tags_errors(txt2tags):
+            source = txt2tags.SourceDocument(contents=script.splitlines())
+            self.head, self.conf, self.body = source.split()
+            self.raw_config = source.get_raw_config()
+
+    def write(self, target: str, path: str) -> None:
+        txt2tags = self.engine.module
+        with self.engine.lock, _txt2tags_errors(txt2tags):
+            raw_config = self.raw_config + txt2tags.CommandLine().get_raw_config(["-t", target, "-q"])
+            config = txt2tags.ConfigMaster(raw_config).parse()
+            config["sourcefile"] = config["infile"] = txt2tags.MODULEIN
+            config["outfile"] = txt2tags.MODULEOUT
+            first_body_lineno = (len(self.head) or 1) + len(self.conf) + 1
+            lines = txt2tags.convert_file(self.head, list(self.body), config, first_body_lineno=first_body_lineno)
+        with open(path, "w", encoding="UTF-8") as file:
+            file.write("\n".join(lines) + "\n")
+
+
+class InProcessT2TEngine(T2TEngine):
+    """
+    Uses the txt2tags python module, which is imported only once per process.
+    The script is parsed once and converted to all targets from the parsed document.
+
+    txt2tags keeps its state in module globals, so all parses and conversions of a process hold one lock.
+    With PROTOKOLL_CONCURRENT_GENERATION the targets are therefore still converted one after another,
+    only pdflatex runs concurrently to the remaining conversions.
+    """
+
+    def __init__(self, module: ModuleType):
+        self.module = module
+        self.lock = threading.Lock()
+
+    @property
+    def version(self) -> str:
+        return f"inprocess txt2tags {self.module.__version__}"
+
+    def parse(self, script: str) -> T2TDocument:
+        return InProcessT2TDocument(self, script)
+
+
+def script_hash(engine: T2TEngine, script: str, target: str) -> str:
+    """
+    Hashes everything the file generated for target depends on.
+    Config lines for other targets (e.g. %!postproc(tex) for the html target) are ignored.
+
+    @param engine: the engine, which generates the file
+    @param script: the rendered t2t-script
+    @param target: the txt2tags target, e.g. "html"
+    @return: the hex-digest
+    """
+    lines = [
+        line for line in script.splitlines() if (match := TARGET_CONFIG_RE.match(line)) is None or match[1] == target
+    ]
+    digest = hashlib.sha256()
+    for part in [engine.version, target, *lines]:
+        digest.update(part.encode("utf-8") + b"\n")
+    return digest.hexdigest()
+
+
+def get_engine() -> T2TEngine:
+    """
+    Returns the engine configured in settings.PROTOKOLL_T2T_ENGINE ("inprocess" or "subprocess").
+    If the txt2tags module is not importable, the subprocess engine is used as a fallback.
+
+    @return: the engine (shared by all calls in this process)
+    """
+    return _create_engine(settings.PROTOKOLL_T2T_ENGINE)
+
+
+@functools.lru_cache(maxsize=None)
+def _create_engine(name: str) -> T2TEngine:
+    if name == "inprocess":
+        try:
+            return InProcessT2TEngine(importlib.import_module("txt2tags"))
+        except ImportError:
+            pass
+    return SubprocessT2TEngine()
@@ -0,0 +1,128 @@
+import functools
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+from django.conf import settings
+from django.template import Template
+
+# tags, which may be written with the short syntax [[ tag ... ]] instead of {% tag ... %}
+ATTACHMENT_TAGS = ["anhang"]
+MOTION_TAGS = ["antrag", "motion"]
+POINT_OF_ORDER_TAGS = ["goantrag", "point_of_order"]
+
+
+@functools.lru_cache(maxsize=None)
+def _short_syntax_re(tags: tuple[str, ...]) -> re.Pattern:
+    if not tags:
+        return re.compile(r"\]\]")
+    names = "|".join(re.escape(tag) for tag in tags)
+    return re.compile(rf"\[\[ (?=(?:{names}))|\]\]")
+
+
+def _replace_short_syntax(match: re.Match) -> str:
+    return "%}" if match.group(0) == "]]" else "{% "
+
+
+def convert_short_syntax(text: str, attachments: bool, motions: bool, points_of_order: bool) -> str:
+    """
+    Replaces the short syntax "[[ tag ... ]]" of the enabled tags by django template tags in a single pass.
+
+    @param text: the text of the protokoll
+    @param attachments: if the anhang-tag is enabled
+    @param motions: if the antrag/motion-tags are enabled
+    @param points_of_order: if the goantrag/point_of_order-tags are enabled
+    @return: the text with "{% tag ... %}" instead of "[[ tag ... ]]"
+    """
+    tags: list[str] = []
+    if attachments:
+        tags += ATTACHMENT_TAGS
+    tags_with_end: list[str] = []
+    if motions:
+        tags_with_end += MOTION_TAGS
+    if points_of_order:
+        tags_with_end += POINT_OF_ORDER_TAGS
+    for tag in tags_with_end:
+        tags += [tag, "end" + tag]
+    return _short_syntax_re(tuple(tags)).sub(_replace_short_syntax, text)
+
+
+class TemplateCache:
+    """
+    A thread-safe LRU cache of compiled templates.
+    It is bounded by the number of entries and by the total length of the template sources.
+    """
+
+    def __init__(self, max_entries: int, max_size: int):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.size = 0
+        self._templates: OrderedDict[str, tuple[Template, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compile(self, key: str, source: str, compile_template: Callable[[str], Template]) -> Template:
+        """
+        @param key: identifies the source, e.g. its hash
+        @param source: the template source, which is compiled if the key is not cached
+        @param compile_template: compiles the source
+        @return: the cached or newly compiled template
+        """
+        with self._lock:
+            if key in self._templates:
+                self._templates.move_to_end(key)
+                return self._templates[key][0]
+        # compile outside the lock, so one big template does not block all others
+        template: Template = compile_template(source)
+        if len(source) > self.max_size:
+            return template
+        with self._lock:
+            if key not in self._templates:
+                self._templates[key] = (template, len(source))
+                self.size += len(source)
+            while len(self._templates) > self.max_entries or self.size > self.max_size:
+                _key, (_template, size) = self._templates.popitem(last=False)
+                self.size -= size
+        return template
+
+    def clear(self) -> None:
+        with self._lock:
+            self._templates.clear()
+            self.size = 0
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+
+@functools.lru_cache(maxsize=None)
+def _protokoll_templates() -> TemplateCache:
+    """
+    @return: the cache of the compiled protokolle, created on first use, so the settings are not read on import
+    """
+    return TemplateCache(
+        max_entries=settings.PROTOKOLL_TEMPLATE_CACHE_ENTRIES,
+        max_size=settings.PROTOKOLL_TEMPLATE_CACHE_SIZE,
+    )
+
+
+def get_protokoll_template(text: str, attachments: bool, motions: bool, points_of_order: bool) -> Template:
+    """
+    Compiles the text of a protokoll to a template, using the short syntax of the enabled tags.
+    As protokolle are often generated again without changes, the compiled templates are cached.
+
+    @param text: the text of the protokoll
+    @param attachments: if the anhang-tag is enabled
+    @param motions: if the antrag/motion-tags are enabled
+    @param points_of_order: if the goantrag/point_of_order-tags are enabled
+    @return: the compiled template
+    """
+    flags = f"{attachments:d}{motions:d}{points_of_order:d}"
+    key: str = flags + hashlib.sha256(text.encode("UTF-8")).hexdigest()
+    return _protokoll_templates().get_or_compile(
+        key,
+        text,
+        lambda source: Template(
+            "{% load protokoll_tags %}\n" + convert_short_syntax(source, attachments, motions, points_of_order),
+        ),
+    )
@@ -152,9 +152,13 @@ def anhang(context, attachment_id: int) -> str:
     """
     meeting: Meeting = context["meeting"]
     request: WSGIRequest = context["request"]
-    attachments_with_id = meeting.attachments_with_id
-    for counted_sort_id, attachment in attachments_with_id:
-        if counted_sort_id == attachment_id:
-            url = request.build_absolute_uri(attachment.attachment.url)
-            return f"[{attachment.name} {url}]"
-    raise template.TemplateSyntaxError("Attachment not found")
+    # the attachments are only queried once per protokoll, not once per tag
+    attachments_by_id = context.render_context.get("anhang_attachments")
+    if attachments_by_id is None:
+        attachments_by_id = dict(meeting.attachments_with_id)
+        context.render_context["anhang_attachments"] = attachments_by_id
+    if attachment_id not in attachments_by_id:
+        raise template.TemplateSyntaxError("Attachment not found")
+    attachment = attachments_by_id[attachment_id]
+    url = request.build_absolute_uri(attachment.get_attachment_url())
+    return f"[{attachment.name} {url}]"
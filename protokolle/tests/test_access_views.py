@@ -16,6 +16,7 @@ from toptool.tests.test_access_views import (
 )
 
 from .. import views
+from ..models import GenerationJob
 
 
 class TestShowProtokollView(AbstractTestView):
@@ -324,6 +325,28 @@ class TestProtokollSuccessView(AbstractTestView):
         self.admin_not_public = accessible
 
 
+class TestGenerationStatusView(AbstractTestView):
+    def setup_method(self):
+        super().setup_method()
+        self.url = "protokoll/status/{}/"
+        self.view = views.generation_status
+
+        self.anonymous_public = redirect_to_login
+        self.anonymous_not_public = redirect_to_login
+        self.logged_in_public = permission_denied
+        self.logged_in_with_rights = permission_denied
+        self.logged_in_with_admin_rights = accessible
+        self.logged_in_without_rights = permission_denied
+        self.logged_in_sitzungsleitung = accessible
+        self.logged_in_protokollant = accessible
+        self.admin_public = accessible
+        self.admin_not_public = accessible
+
+    def prepare_variables(self):
+        super().prepare_variables()
+        GenerationJob.objects.create(meeting=self.meeting, script="")
+
+
 class TestSendProtokollView(AbstractTestView):
     def setup_method(self):
         super().setup_method()
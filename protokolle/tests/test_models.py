@@ -1,12 +1,452 @@
 # pylint: disable=too-few-public-methods
 # pylint: disable=missing-function-docstring
+import datetime
+import hashlib
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
 import pytest
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.dispatch import Signal
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
 from mixer.backend.django import mixer
 
+from protokolle import latex_formats
+from protokolle.models import GenerationJob, Protokoll
+from toptool.utils import files
+
 pytestmark = pytest.mark.django_db
 
 
+@pytest.fixture(name="protokoll_paths")
+def fixture_protokoll_paths(monkeypatch, tmp_path):
+    monkeypatch.setattr(Protokoll, "filepath", str(tmp_path / "protokoll"))
+    monkeypatch.setattr(Protokoll, "base_filepath", str(tmp_path))
+    monkeypatch.setattr(Protokoll, "filename", "protokoll")
+    return tmp_path
+
+
+def track_generation_lock(monkeypatch):
+    # an item is put into the returned queue, whenever a thread starts to wait for the generation lock of a protokoll
+    waiting: queue.Queue[None] = queue.Queue()
+    generation_lock = Protokoll._generation_lock  # pylint: disable=protected-access
+
+    @contextmanager
+    def tracked_generation_lock(self):
+        waiting.put(None)
+        with generation_lock(self):
+            yield
+
+    monkeypatch.setattr(Protokoll, "_generation_lock", tracked_generation_lock)
+    return waiting
+
+
 class TestMeeting:
     def test_init(self):
         obj = mixer.blend("protokolle.Protokoll")
         assert obj.pk not in (None, ""), "Should create a Protokoll instance"
+
+
+class TestAttachment:
+    def test_metadata_is_stored_on_upload(self, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+        content = b"%PDF-1.4\n%Test Inhalt\n"
+        attachment = mixer.blend("protokolle.Attachment", attachment=SimpleUploadedFile("test.pdf", content))
+        attachment.refresh_from_db()
+        assert attachment.attachment_content_type == "application/pdf"
+        assert attachment.attachment_size == len(content)
+        assert attachment.attachment_sha256 == hashlib.sha256(content).hexdigest()
+
+
+class TestGenerationJob:
+    def test_claim_next(self):
+        first = GenerationJob.objects.create(meeting=mixer.blend("meetings.Meeting"), script="first")
+        second = GenerationJob.objects.create(meeting=mixer.blend("meetings.Meeting"), script="second")
+
+        claimed = GenerationJob.claim_next()
+        assert claimed == first, "Should claim the oldest pending job"
+        assert GenerationJob.objects.get(pk=first.pk).state == GenerationJob.RUNNING
+        assert GenerationJob.claim_next() == second, "Should not claim a running job twice"
+        assert GenerationJob.claim_next() is None, "Should return None on an empty queue"
+
+    def test_enqueue_coalesces_per_meeting(self):
+        meeting = mixer.blend("meetings.Meeting")
+        running = GenerationJob.enqueue(meeting, None, "first")
+        assert GenerationJob.claim_next() == running
+
+        follow_up = GenerationJob.enqueue(meeting, None, "second")
+        assert GenerationJob.enqueue(meeting, None, "third") == follow_up, "Should update the pending job"
+        assert GenerationJob.objects.get(pk=follow_up.pk).script == "third", "Should generate the newest script"
+        assert GenerationJob.claim_next() is None, "Should not generate a meeting in two workers at once"
+
+        running.state = GenerationJob.SUCCESS
+        running.save()
+        assert GenerationJob.claim_next() == follow_up, "Should run exactly one follow-up job"
+        assert GenerationJob.objects.filter(meeting=meeting).count() == 2
+
+    def test_stale_job_does_not_block_meeting(self, settings):
+        settings.PROTOKOLL_GENERATION_TIMEOUT = 60
+        meeting = mixer.blend("meetings.Meeting")
+        stale = GenerationJob.enqueue(meeting, None, "first")
+        assert GenerationJob.claim_next() == stale
+        GenerationJob.objects.filter(pk=stale.pk).update(started=timezone.now() - datetime.timedelta(minutes=5))
+
+        follow_up = GenerationJob.enqueue(meeting, None, "second")
+        assert GenerationJob.claim_next() == follow_up, "Should not wait for a job of a killed worker"
+        assert GenerationJob.requeue_stale() == 1
+        assert GenerationJob.objects.get(pk=stale.pk).state == GenerationJob.FAILED, "Should not run the old script"
+
+    @pytest.mark.usefixtures("protokoll_paths")
+    def test_run_success(self, monkeypatch):
+        protokoll = mixer.blend("protokolle.Protokoll")
+        monkeypatch.setattr(Protokoll, "_generate_different_file_formats", lambda _self, _script: {"total": 1.0})
+        job = GenerationJob.objects.create(meeting=protokoll.meeting, script="")
+
+        job.run()
+        job.refresh_from_db()
+        assert job.state == GenerationJob.SUCCESS
+        assert job.done and job.finished is not None
+        assert job.timings == {"total": 1.0}, "Should record the timings of the stages"
+
+    @pytest.mark.usefixtures("protokoll_paths")
+    def test_run_txt2tags_error(self, monkeypatch):
+        protokoll = mixer.blend("protokolle.Protokoll")
+
+        def fail(_self, _script):
+            raise RuntimeError(b"Traceback\ntxt2tags.error: broken table")
+
+        monkeypatch.setattr(Protokoll, "_generate_different_file_formats", fail)
+        job = GenerationJob.objects.create(meeting=protokoll.meeting, script="")
+
+        job.run()
+        job.refresh_from_db()
+        assert job.state == GenerationJob.FAILED
+        assert job.error == "txt2tags.error: broken table", "Should keep the txt2tags error as job result"
+        assert not Protokoll.objects.filter(pk=protokoll.pk).exists(), "Should delete the failed protokoll"
+
+    @pytest.mark.usefixtures("protokoll_paths")
+    @pytest.mark.parametrize(
+        ("error", "message"),
+        [(RuntimeError("lock timed out"), "lock timed out"), (RuntimeError(), "")],
+    )
+    def test_run_runtime_error_without_output(self, monkeypatch, error, message):
+        protokoll = mixer.blend("protokolle.Protokoll")
+
+        def fail(_self, _script):
+            raise error
+
+        monkeypatch.setattr(Protokoll, "_generate_different_file_formats", fail)
+        job = GenerationJob.objects.create(meeting=protokoll.meeting, script="")
+
+        job.run()
+        job.refresh_from_db()
+        assert job.state == GenerationJob.FAILED
+        assert job.error == message, "Should record errors, which were not raised with the output of a program"
+
+    @pytest.mark.usefixtures("protokoll_paths")
+    def test_run_unexpected_error(self, monkeypatch):
+        protokoll = mixer.blend("protokolle.Protokoll")
+
+        def fail(_self, _script):
+            raise OSError("No space left on device")
+
+        monkeypatch.setattr(Protokoll, "_generate_different_file_formats", fail)
+        job = GenerationJob.objects.create(meeting=protokoll.meeting, script="")
+
+        job.run()
+        job.refresh_from_db()
+        assert job.state == GenerationJob.FAILED, "Should not leave the job running"
+        assert job.error == "OSError: No space left on device"
+
+    def test_requeue_stale(self, settings):
+        settings.PROTOKOLL_GENERATION_TIMEOUT = 60
+        long_ago = timezone.now() - datetime.timedelta(minutes=5)
+        stale = GenerationJob.objects.create(meeting=mixer.blend("meetings.Meeting"), script="")
+        superseded = GenerationJob.objects.create(meeting=mixer.blend("meetings.Meeting"), script="")
+        follow_up = GenerationJob.objects.create(meeting=superseded.meeting, script="")
+        running = GenerationJob.objects.create(meeting=mixer.blend("meetings.Meeting"), script="")
+        GenerationJob.objects.filter(pk__in=[stale.pk, superseded.pk]).update(
+            state=GenerationJob.RUNNING,
+            started=long_ago,
+        )
+        GenerationJob.objects.filter(pk=running.pk).update(state=GenerationJob.RUNNING, started=timezone.now())
+
+        assert GenerationJob.requeue_stale() == 2
+        assert GenerationJob.objects.get(pk=stale.pk).state == GenerationJob.PENDING, "Should queue the job again"
+        assert GenerationJob.objects.get(pk=superseded.pk).state == GenerationJob.FAILED, "Should keep one pending job"
+        assert GenerationJob.objects.get(pk=follow_up.pk).state == GenerationJob.PENDING
+        assert GenerationJob.objects.get(pk=running.pk).state == GenerationJob.RUNNING, "Should not touch live jobs"
+
+
+class TestProtokollGeneration:
+    @pytest.mark.parametrize("concurrent", [True, False])
+    @pytest.mark.usefixtures("protokoll_paths")
+    def test_generate_different_file_formats(self, monkeypatch, settings, concurrent):
+        settings.PROTOKOLL_CONCURRENT_GENERATION = concurrent
+        protokoll = mixer.blend("protokolle.Protokoll")
+        finished: list[str] = []
+
+        def run_txt2tags(_self, _document, target, _filepath):
+            finished.append(target)
+            return 1.0
+
+        def run_pdflatex(_self, _filepath):
+            assert "tex" in finished, "Should only run pdflatex after the tex file exists"
+            finished.append("pdflatex")
+            return 2.0, 1
+
+        monkeypatch.setattr(Protokoll, "_run_txt2tags", run_txt2tags)
+        monkeypatch.setattr(Protokoll, "_run_pdflatex", run_pdflatex)
+
+        timings = protokoll._generate_different_file_formats("Titel\n")  # pylint: disable=protected-access
+        assert set(finished) == {"html", "txt", "tex", "pdflatex"}
+        assert set(timings) == {"parse", "html", "txt", "tex", "pdflatex", "pdflatex_passes", "total"}
+
+    @pytest.mark.usefixtures("protokoll_paths")
+    def test_unchanged_files_are_reused(self, monkeypatch):
+        protokoll = mixer.blend("protokolle.Protokoll")
+        generated: list[str] = []
+
+        def run_txt2tags(_self, _document, target, filepath):
+            generated.append(target)
+            with open(filepath + "." + target, "w", encoding="UTF-8"):
+                pass
+            return 1.0
+
+        def run_pdflatex(_self, filepath):
+            generated.append("pdflatex")
+            with open(filepath + ".pdf", "w", encoding="UTF-8"):
+                pass
+            return 2.0, 1
+
+        monkeypatch.setattr(Protokoll, "_run_txt2tags", run_txt2tags)
+        monkeypatch.setattr(Protokoll, "_run_pdflatex", run_pdflatex)
+        script = 'Titel\n\n\n%!postproc(html): "a" "b"\n\nText\n'
+
+        protokoll._generate_different_file_formats(script)  # pylint: disable=protected-access
+        assert sorted(generated) == ["html", "pdflatex", "tex", "txt"]
+
+        generated.clear()
+        timings = protokoll._generate_different_file_formats(script)  # pylint: disable=protected-access
+        assert not generated, "Should reuse all files of an unchanged script"
+        assert set(timings) == {"total"}
+
+        protokoll._generate_different_file_formats(script.replace('"b"', '"c"'))  # pylint: disable=protected-access
+        assert generated == ["html"], "Should only regenerate the targets affected by a change"
+
+    @pytest.mark.usefixtures("protokoll_paths")
+    def test_files_are_published_after_all_stages(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(files, "brotli", None)
+        protokoll = mixer.blend("protokolle.Protokoll")
+        (tmp_path / "protokoll.html").write_text("old", encoding="UTF-8")
+
+        def run_txt2tags(_self, _document, target, filepath):
+            assert (tmp_path / "protokoll.html").read_text(encoding="UTF-8") == "old", "Should not touch served files"
+            with open(filepath + "." + target, "w", encoding="UTF-8") as file:
+                file.write("new")
+            return 1.0
+
+        def run_pdflatex(_self, filepath):
+            for extension in [".pdf", ".aux", ".log"]:
+                with open(filepath + extension, "w", encoding="UTF-8"):
+                    pass
+            return 2.0, 1
+
+        monkeypatch.setattr(Protokoll, "_run_txt2tags", run_txt2tags)
+        monkeypatch.setattr(Protokoll, "_run_pdflatex", run_pdflatex)
+
+        protokoll._generate_different_file_formats("Titel\n")  # pylint: disable=protected-access
+        assert (tmp_path / "protokoll.html").read_text(encoding="UTF-8") == "new"
+        assert sorted(path.name for path in tmp_path.iterdir()) == [
+            "protokoll.aux",
+            "protokoll.hashes",
+            "protokoll.html",
+            "protokoll.html.gz",
+            "protokoll.pdf",
+            "protokoll.tex",
+            "protokoll.txt",
+            "protokoll.txt.gz",
+        ], "Should only publish the files and keep the auxiliary files for the next generation"
+
+    @pytest.mark.usefixtures("protokoll_paths")
+    def test_lazy_pdf_generation(self, monkeypatch):
+        protokoll = mixer.blend("protokolle.Protokoll", meeting__meetingtype__lazy_pdf=True)
+        pdflatex_runs: list[int] = []
+        release = threading.Event()
+
+        def run_txt2tags(_self, _document, target, filepath):
+            with open(filepath + "." + target, "w", encoding="UTF-8"):
+                pass
+            return 1.0
+
+        def run_pdflatex(_self, filepath):
+            pdflatex_runs.append(1)
+            assert release.wait(timeout=10)
+            with open(filepath + ".pdf", "w", encoding="UTF-8"):
+                pass
+            return 2.0, 1
+
+        monkeypatch.setattr(Protokoll, "_run_txt2tags", run_txt2tags)
+        monkeypatch.setattr(Protokoll, "_run_pdflatex", run_pdflatex)
+
+        timings = protokoll._generate_different_file_formats("Titel\n")  # pylint: disable=protected-access
+        assert "pdflatex" not in timings, "Should not generate the pdf together with the other files"
+        assert not protokoll.pdf_is_current()
+
+        waiting = track_generation_lock(monkeypatch)
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = [executor.submit(protokoll.ensure_pdf) for _ in range(3)]
+            # the first pdflatex run only finishes, once all requests found the pdf missing
+            for _ in range(3):
+                waiting.get(timeout=10)
+            release.set()
+            for future in futures:
+                future.result()
+        assert len(pdflatex_runs) == 1, "Concurrent first requests should share a single pdflatex run"
+        assert protokoll.pdf_is_current()
+
+        protokoll._generate_different_file_formats("Titel\n")  # pylint: disable=protected-access
+        assert protokoll.pdf_is_current(), "Should keep the pdf of an unchanged script"
+        protokoll._generate_different_file_formats("Anderer Titel\n")  # pylint: disable=protected-access
+        assert not protokoll.pdf_is_current(), "Should remove the pdf of an outdated script"
+
+    def test_failed_lazy_pdf_generation_shows_error(self, monkeypatch):
+        protokoll = mixer.blend(
+            "protokolle.Protokoll",
+            meeting__meetingtype__protokoll=True,
+            meeting__meetingtype__lazy_pdf=True,
+        )
+
+        def fail(_self):
+            raise RuntimeError(b"pdflatex: broken preamble")
+
+        monkeypatch.setattr(Protokoll, "ensure_pdf", fail)
+        client = Client()
+        client.force_login(mixer.blend(get_user_model(), is_superuser=True))
+
+        response = client.get(reverse("protokolle:show_protokoll", args=[protokoll.meeting.id, "pdf"]))
+        assert response.status_code == 302, "Should not fail with a server error"
+        assert response.url == reverse("meetings:view_meeting", args=[protokoll.meeting.id])
+
+    @pytest.mark.usefixtures("protokoll_paths")
+    def test_concurrent_generations_are_coalesced(self, monkeypatch):
+        protokoll = mixer.blend("protokolle.Protokoll")
+        generated: list[str] = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def generate_different_file_formats(_self, script):
+            generated.append(script)
+            started.set()
+            assert release.wait(timeout=10)
+            return {"total": 0.3}
+
+        monkeypatch.setattr(Protokoll, "_generate_different_file_formats", generate_different_file_formats)
+        # the receivers would write from the other threads, while the test transaction locks the database
+        monkeypatch.setattr("protokolle.models.protokoll_generated", Signal())
+        waiting = track_generation_lock(monkeypatch)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(protokoll.generate, "first")]
+            waiting.get(timeout=10)
+            assert started.wait(timeout=10)
+            for script in ["second", "third", "fourth"]:
+                futures.append(executor.submit(protokoll.generate, script))
+                # the next script is only written, once this request waits for the running generation
+                waiting.get(timeout=10)
+            release.set()
+            results = [future.result() for future in futures]
+        assert generated == ["first", "fourth"], "Should only run one follow-up generation with the newest script"
+        assert results.count({}) == 2, "The other requests should wait for the result of the follow-up generation"
+
+    @pytest.mark.usefixtures("protokoll_paths")
+    def test_failed_coalesced_generation_is_raised_to_all_requests(self, monkeypatch):
+        protokoll = mixer.blend("protokolle.Protokoll")
+        generated: list[str] = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def generate_different_file_formats(_self, script):
+            generated.append(script)
+            started.set()
+            assert release.wait(timeout=10)
+            if script == "broken":
+                raise RuntimeError(b"txt2tags.error: broken table")
+            return {"total": 0.3}
+
+        monkeypatch.setattr(Protokoll, "_generate_different_file_formats", generate_different_file_formats)
+        monkeypatch.setattr("protokolle.models.protokoll_generated", Signal())
+        waiting = track_generation_lock(monkeypatch)
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            first = executor.submit(protokoll.generate, "first")
+            waiting.get(timeout=10)
+            assert started.wait(timeout=10)
+            followers = []
+            for script in ["second", "broken"]:
+                followers.append(executor.submit(protokoll.generate, script))
+                waiting.get(timeout=10)
+            release.set()
+            assert first.result() == {"total": 0.3}
+            for follower in followers:
+                with pytest.raises(RuntimeError):
+                    follower.result()
+        assert generated == ["first", "broken", "broken"], "Should repeat the failed generation for the waiting request"
+
+    @pytest.mark.usefixtures("protokoll_paths")
+    def test_pdflatex_reruns_only_on_changes(self, monkeypatch, tmp_path):
+        protokoll = mixer.blend("protokolle.Protokoll")
+        # fake pdflatex, which writes the same table of contents on every run
+        fake_pdflatex = tmp_path / "pdflatex"
+        fake_pdflatex.write_text('#!/bin/sh\nfor last; do :; done\necho toc > "${last%.tex}.toc"\n', encoding="UTF-8")
+        fake_pdflatex.chmod(0o755)
+        monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+        (tmp_path / "protokoll.tex").write_text("\\documentclass{article}\n", encoding="UTF-8")
+
+        _seconds, passes = protokoll._run_pdflatex(str(tmp_path / "protokoll"))  # pylint: disable=protected-access
+        assert passes == 2, "Should rerun pdflatex, as the first run changed the table of contents"
+        _seconds, passes = protokoll._run_pdflatex(str(tmp_path / "protokoll"))  # pylint: disable=protected-access
+        assert passes == 1, "Should not rerun pdflatex, if the auxiliary files did not change"
+
+    @pytest.mark.parametrize("loadable", [True, False])
+    @pytest.mark.usefixtures("protokoll_paths")
+    def test_pdflatex_uses_precompiled_format(self, monkeypatch, settings, tmp_path, loadable):
+        protokoll = mixer.blend("protokolle.Protokoll")
+        settings.PROTOKOLL_LATEX_FORMAT_DIR = tmp_path / "formats"
+        preamble = "\\documentclass{article}\n\\usepackage{eurosym}\n"
+        (tmp_path / "protokoll.tex").write_text(preamble + "\\title{Protokoll}\n\\begin{document}\n", encoding="UTF-8")
+        fmt = settings.PROTOKOLL_LATEX_FORMAT_DIR / (latex_formats.format_name(preamble) + ".fmt")
+        fmt.parent.mkdir()
+        fmt.write_text("", encoding="UTF-8")
+        # fake pdflatex, which logs its arguments and fails to load the format if it is not loadable
+        fake_pdflatex = tmp_path / "pdflatex"
+        fake_pdflatex.write_text(
+            f'#!/bin/sh\necho "$@" >> {tmp_path / "calls"}\n'
+            + ("" if loadable else 'case "$*" in *-fmt*) echo "Fatal format file error";; esac\n'),
+            encoding="UTF-8",
+        )
+        fake_pdflatex.chmod(0o755)
+        monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+
+        _seconds, passes = protokoll._run_pdflatex(str(tmp_path / "protokoll"))  # pylint: disable=protected-access
+        assert passes == 1
+        calls = (tmp_path / "calls").read_text(encoding="UTF-8").splitlines()
+        if loadable:
+            assert calls == [
+                f"-interaction nonstopmode -output-directory {tmp_path} -fmt {fmt.with_suffix('')} "
+                f"-jobname protokoll {tmp_path / 'protokoll.body.tex'}",
+            ]
+            assert (tmp_path / "protokoll.body.tex").read_text(encoding="UTF-8").startswith("\\title")
+        else:
+            assert len(calls) == 2 and calls[1].endswith(str(tmp_path / "protokoll.tex")), "Should fall back"
+            assert not fmt.exists(), "Should remove the format, which can not be loaded"
+
+    def test_split_preamble(self):
+        preamble, body = latex_formats.split_preamble("\\documentclass{article}\n\\title{A}\n\\begin{document}\n")
+        assert preamble == "\\documentclass{article}\n"
+        assert body == "\\title{A}\n\\begin{document}\n"
+        assert latex_formats.split_preamble("no latex") == ("", "no latex")
@@ -0,0 +1,36 @@
+# pylint: disable=missing-function-docstring
+import pytest
+
+from protokolle.t2t_engines import InProcessT2TEngine
+
+txt2tags = pytest.importorskip("txt2tags")
+
+SCRIPT = """Protokoll Test vom 01.01.2023
+
+
+%!options: --toc
+%!postproc(html): "Max" "Moritz"
+
+= Tagesordnung =
+**Sitzungsleitung:** Max
+"""
+
+
+@pytest.mark.parametrize("target", ["html", "txt", "tex"])
+def test_inprocess_engine(tmp_path, target):
+    document = InProcessT2TEngine(txt2tags).parse(SCRIPT)
+    path = tmp_path / f"protokoll.{target}"
+    document.write(target, str(path))
+    content = path.read_text(encoding="UTF-8")
+    assert "Sitzungsleitung" in content
+    if target == "html":
+        assert "Moritz" in content, "Should apply the target-specific postproc filters"
+    else:
+        assert "Max" in content, "Should only apply the postproc filters of the target"
+
+
+def test_inprocess_engine_error(tmp_path):
+    document = InProcessT2TEngine(txt2tags).parse('Titel\n\n\n%!postproc: "(" "x"\n\nText\n')
+    with pytest.raises(RuntimeError) as err:
+        document.write("html", str(tmp_path / "protokoll.html"))
+    assert err.value.args[0].startswith(b"txt2tags.error"), "Should report errors like the txt2tags command"
@@ -0,0 +1,56 @@
+# pylint: disable=missing-function-docstring
+import itertools
+
+import pytest
+from django.template import Template
+
+from protokolle import template_cache
+from protokolle.template_cache import TemplateCache
+
+
+def chained_replace(text, attachments, motions, points_of_order):
+    # the conversion, which was used before the single-pass tokenizer
+    if attachments:
+        text = text.replace("[[ anhang", "{% anhang")
+    tags_with_end = []
+    if motions:
+        tags_with_end = ["antrag", "motion"]
+    if points_of_order:
+        tags_with_end += ["goantrag", "point_of_order"]
+    for tag in tags_with_end:
+        text = text.replace(f"[[ {tag}", f"{{% {tag}")
+        text = text.replace(f"[[ end{tag}", f"{{% end{tag}")
+    return text.replace("]]", "%}")
+
+
+@pytest.mark.parametrize("flags", list(itertools.product([True, False], repeat=3)))
+def test_convert_short_syntax_matches_chained_replace(flags):
+    text = (
+        "[[ anhang 1 ]] [[ antrag pro=1 ]]Text[[ endantrag ]] [[ goantrag gegenrede=False ]]x[[ endgoantrag ]]\n"
+        "[[ motion pro=2 ]]y[[ endmotion ]] [[ point_of_order ]][[ endpoint_of_order ]] [[ other ]] ]]] [[[ antrag"
+    )
+    assert template_cache.convert_short_syntax(text, *flags) == chained_replace(text, *flags)
+
+
+def test_cache_reuses_templates():
+    cache = TemplateCache(max_entries=2, max_size=100)
+    compiled: list[str] = []
+
+    def compile_template(source):
+        compiled.append(source)
+        return Template(source)
+
+    first = cache.get_or_compile("a", "a", compile_template)
+    assert cache.get_or_compile("a", "a", compile_template) is first
+    assert compiled == ["a"], "Should only compile a template once"
+
+
+def test_cache_is_bounded():
+    cache = TemplateCache(max_entries=2, max_size=10)
+    for key in ["a", "b", "c"]:
+        cache.get_or_compile(key, key, Template)
+    assert len(cache) == 2, "Should evict the least recently used entry"
+    cache.get_or_compile("big", "x" * 10, Template)
+    assert len(cache) == 1 and cache.size == 10, "Should evict entries until the sources fit into max_size"
+    cache.get_or_compile("huge", "x" * 11, Template)
+    assert cache.size == 10, "Should not cache sources bigger than max_size"
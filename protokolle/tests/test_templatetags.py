@@ -0,0 +1,31 @@
+# pylint: disable=missing-function-docstring
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import Context, Template
+from django.test import RequestFactory
+from mixer.backend.django import mixer
+
+pytestmark = pytest.mark.django_db
+
+
+def test_anhang_queries_attachments_once(settings, tmp_path, django_assert_num_queries):
+    settings.MEDIA_ROOT = tmp_path
+    meeting = mixer.blend("meetings.Meeting")
+    attachments = [
+        mixer.blend(
+            "protokolle.Attachment",
+            meeting=meeting,
+            sort_order=i,
+            attachment=SimpleUploadedFile(f"anhang{i}.pdf", b"%PDF-1.4\n"),
+        )
+        for i in range(10)
+    ]
+    template = Template("{% load protokoll_tags %}" + "".join(f"{{% anhang {i} %}}\n" for i in range(1, 11)))
+    context = Context({"meeting": meeting, "request": RequestFactory().get("/")})
+
+    with django_assert_num_queries(1):
+        rendered = template.render(context)
+    assert (
+        rendered.splitlines()[0]
+        == f"[{attachments[0].name} http://testserver/protokoll/attachments/show/{attachments[0].id}/]"
+    )
@@ -29,6 +29,11 @@ urlpatterns = [
                 path("<uuid:meeting_pk>/", views.attachments, name="attachments"),
                 path("sort/<uuid:meeting_pk>/", views.sort_attachments, name="sort_attachments"),
                 path("show/<int:attachment_pk>/", views.show_attachment, name="show_attachment_protokoll"),
+                path(
+                    "thumbnail/<int:attachment_pk>/<str:sha256>/",
+                    views.show_attachment_thumbnail,
+                    name="show_attachment_thumbnail",
+                ),
                 path("edit/<int:attachment_pk>/", views.edit_attachment, name="edit_attachment"),
                 path("delete/<int:attachment_pk>/", views.del_attachment, name="del_attachment"),
             ],
@@ -39,5 +44,6 @@ urlpatterns = [
     path("edit/<uuid:meeting_pk>/", views.edit_protokoll, name="edit_protokoll"),
     path("delete/<uuid:meeting_pk>/", views.delete_protokoll, name="del_protokoll"),
     path("success/<uuid:meeting_pk>/", views.successful_protokoll_generation, name="success_protokoll"),
+    path("status/<uuid:meeting_pk>/", views.generation_status, name="generation_status"),
     path("send/<uuid:meeting_pk>/", views.send_protokoll, name="send_protokoll"),
 ]
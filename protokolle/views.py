@@ -15,7 +15,7 @@ from django.core.files.base import ContentFile
 from django.core.handlers.wsgi import WSGIRequest
 from django.db.models import Q
 from django.http import Http404, HttpResponse, HttpResponseBadRequest
-from django.http.response import JsonResponse
+from django.http.response import HttpResponseBase, JsonResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.template import Template
 from django.template.loader import get_template
@@ -24,14 +24,21 @@ from django.utils.translation import gettext_lazy as _
 from py_etherpad import EtherpadLiteClient
 
 from meetings.models import Meeting
-from toptool.utils.files import prep_file
+from toptool.utils.files import prep_file, send_file, send_precompressed_file, send_thumbnail
 from toptool.utils.helpers import get_meeting_or_404_on_validation_error
 from toptool.utils.permission import at_least_minute_taker, auth_login_required, require
 from toptool.utils.shortcuts import render, send_mail_form
 from toptool.utils.typing import AuthWSGIRequest
 
 from .forms import AttachmentForm, PadForm, ProtokollForm, TemplatesForm
-from .models import Attachment, Protokoll, protokoll_path
+from .models import (
+    Attachment,
+    generation_error_message,
+    GenerationJob,
+    PRECOMPRESSED_TARGETS,
+    Protokoll,
+    protokoll_path,
+)
 
 
 @auth_login_required()
@@ -283,7 +290,7 @@ def _get_pad_details(
 
 
 @login_required
-def show_protokoll(request: WSGIRequest, meeting_pk: UUID, filetype: str) -> HttpResponse:
+def show_protokoll(request: WSGIRequest, meeting_pk: UUID, filetype: str) -> HttpResponseBase:
     """
     Shows the protokoll of a given meeting by type.
 
@@ -293,7 +300,7 @@ def show_protokoll(request: WSGIRequest, meeting_pk: UUID, filetype: str) -> Htt
     @param request: a WSGIRequest by a logged-in user
     @param meeting_pk: uuid of a Meeting
     @param filetype: filetype of the requested protokoll. can be "html", "pdf", "txt"
-    @return: a HttpResponse
+    @return: a HttpResponse containing the file (see send_file), html and txt may be sent compressed
     """
     protokoll: Protokoll = get_object_or_404(Protokoll, meeting=meeting_pk)
     meeting: Meeting = protokoll.meeting
@@ -318,15 +325,21 @@ def show_protokoll(request: WSGIRequest, meeting_pk: UUID, filetype: str) -> Htt
             raise PermissionDenied
 
     # generate_protocol_response
-    filetype_lut = {
-        "html": HttpResponse(),
-        "txt": HttpResponse(content_type="text/plain"),
-        "pdf": HttpResponse(content_type="application/pdf"),
+    content_types = {
+        "html": "text/html; charset=utf-8",
+        "txt": "text/plain",
+        "pdf": "application/pdf",
     }
-    response = filetype_lut[filetype]
-    with open(protokoll.filepath + "." + filetype, "rb") as file:
-        response.write(file.read())
-    return response
+    if filetype == "pdf" and meeting.meetingtype.lazy_pdf:
+        try:
+            protokoll.ensure_pdf()
+        except RuntimeError as err:
+            error: Optional[str] = generation_error_message(err)
+            messages.error(request, error or _("Die PDF-Version des Protokolls konnte nicht generiert werden."))
+            return redirect("meetings:view_meeting", meeting.id)
+    if filetype in PRECOMPRESSED_TARGETS:
+        return send_precompressed_file(request, protokoll.filepath + "." + filetype, content_types[filetype])
+    return send_file(request, protokoll.filepath + "." + filetype, content_types[filetype])
 
 
 @auth_login_required()
@@ -489,15 +502,49 @@ def successful_protokoll_generation(request: AuthWSGIRequest, meeting_pk: UUID)
     if not meeting.meetingtype.protokoll:
         raise Http404
 
+    job: Optional[GenerationJob] = meeting.generationjob_set.order_by("-created").first()
+    if job and job.state == GenerationJob.FAILED:
+        messages.error(request, job.error)
+        return redirect("protokolle:edit_protokoll", meeting.id)
+
     protokoll: Protokoll = get_object_or_404(Protokoll, pk=meeting_pk)
 
     context = {
         "meeting": meeting,
         "protokoll": protokoll,
+        "job": job,
     }
     return render(request, "protokolle/successful_protokoll_generation.html", context)
 
 
+@auth_login_required()
+def generation_status(request: AuthWSGIRequest, meeting_pk: UUID) -> HttpResponse:
+    """
+    Returns the state of the latest queued protokoll generation of a given meeting.
+
+    @permission: allowed only by meetingtype-admin, sitzungsleitung and protokollant*innen
+    @param request: a WSGIRequest by a logged-in user
+    @param meeting_pk: uuid of a Meeting
+    @return: a JsonResponse
+    """
+    meeting: Meeting = get_meeting_or_404_on_validation_error(meeting_pk)
+    require(at_least_minute_taker(request, meeting))
+
+    if not meeting.meetingtype.protokoll:
+        raise Http404
+
+    job: Optional[GenerationJob] = meeting.generationjob_set.order_by("-created").first()
+    if not job:
+        raise Http404
+    return JsonResponse(
+        {
+            "state": job.state,
+            "done": job.done,
+            "error": job.error,
+        },
+    )
+
+
 @auth_login_required()
 def publish_protokoll(request: AuthWSGIRequest, meeting_pk: UUID) -> HttpResponse:
     """
@@ -706,7 +753,7 @@ def attachments(request: AuthWSGIRequest, meeting_pk: UUID) -> HttpResponse:
         "name",
     )
 
-    form = AttachmentForm(request.POST or None, request.FILES or None, meeting=meeting)
+    form = AttachmentForm(request.POST or None, request.FILES or None, meeting=meeting, user=request.user)
     if form.is_valid():
         form.save()
         return redirect("protokolle:attachments", meeting.id)
@@ -766,7 +813,7 @@ def sort_attachments(request: AuthWSGIRequest, meeting_pk: UUID) -> HttpResponse
 
 
 @auth_login_required()
-def show_attachment(request: AuthWSGIRequest, attachment_pk: int) -> HttpResponse:
+def show_attachment(request: AuthWSGIRequest, attachment_pk: int) -> HttpResponseBase:
     """
     Show a protokoll attachment.
 
@@ -776,6 +823,37 @@ def show_attachment(request: AuthWSGIRequest, attachment_pk: int) -> HttpRespons
     @return: a HttpResponse
     """
 
+    attachment: Attachment = _get_attachment_or_404(request, attachment_pk)
+    return prep_file(request, attachment.attachment.path, attachment.attachment_content_type)
+
+
+@auth_login_required()
+def show_attachment_thumbnail(request: AuthWSGIRequest, attachment_pk: int, sha256: str) -> HttpResponseBase:
+    """
+    Shows the thumbnail of a protokoll attachment.
+
+    @permission: allowed only by users with permission for the meetingtype
+    @param request: a WSGIRequest by a logged-in user
+    @param attachment_pk: id of an Attachment
+    @param sha256: the hash of the attachment, so the thumbnail can be cached until the attachment is replaced
+    @return: a HttpResponse
+    """
+
+    attachment: Attachment = _get_attachment_or_404(request, attachment_pk)
+    if sha256 != attachment.attachment_sha256:
+        raise Http404
+    return send_thumbnail(
+        request,
+        attachment.attachment.path,
+        attachment.attachment_sha256,
+        attachment.attachment_content_type,
+    )
+
+
+def _get_attachment_or_404(request: AuthWSGIRequest, attachment_pk: int) -> Attachment:
+    """
+    @return: the attachment, if the user may view it
+    """
     attachment: Attachment = get_object_or_404(Attachment, pk=attachment_pk)
     meeting: Meeting = attachment.meeting
 
@@ -796,7 +874,7 @@ def show_attachment(request: AuthWSGIRequest, attachment_pk: int) -> HttpRespons
         or request.user in meeting.minute_takers.all()
     ):
         raise Http404
-    return prep_file(attachment.attachment.path)
+    return attachment
 
 
 @auth_login_required()
@@ -830,6 +908,7 @@ def edit_attachment(request: AuthWSGIRequest, attachment_pk: int) -> HttpRespons
         request.POST or None,
         request.FILES or None,
         meeting=meeting,
+        user=request.user,
         instance=attachment,
     )
     if form.is_valid():
@@ -0,0 +1,131 @@
+// Uploads the files of inputs with a data-chunked-upload attribute in chunks before their form is submitted.
+// Interrupted chunks are retried at the offset acknowledged by the server, so a flaky connection does not restart
+// the upload. Unfinished uploads are remembered, so they are also resumed after the page was reloaded.
+(function () {
+    "use strict";
+
+    const CHUNK_SIZE = 2 * 1024 * 1024;
+    const MAX_RETRIES = 10;
+
+    function csrfToken(form) {
+        const input = form.querySelector("input[name=csrfmiddlewaretoken]");
+        return input ? input.value : "";
+    }
+
+    function storageKey(file) {
+        return "chunked-upload:" + [file.name, file.size, file.lastModified].join(":");
+    }
+
+    function sleep(milliseconds) {
+        return new Promise((resolve) => setTimeout(resolve, milliseconds));
+    }
+
+    async function request(url, options) {
+        const response = await fetch(url, Object.assign({credentials: "same-origin"}, options));
+        const data = await response.json();
+        if (!response.ok && response.status !== 409) {
+            const error = new Error(data.error || response.statusText);
+            error.fatal = response.status === 400 || response.status === 404;
+            throw error;
+        }
+        return data;
+    }
+
+    async function startUpload(input, file, token) {
+        const saved = localStorage.getItem(storageKey(file));
+        if (saved) {
+            try {
+                const upload = JSON.parse(saved);
+                const status = await request(upload.url);
+                return Object.assign(upload, status);
+            } catch (error) {
+                localStorage.removeItem(storageKey(file));
+            }
+        }
+        const body = new FormData();
+        body.append("filename", file.name);
+        body.append("size", file.size);
+        const upload = await request(input.dataset.chunkedUpload, {
+            method: "POST",
+            headers: {"X-CSRFToken": token},
+            body: body,
+        });
+        localStorage.setItem(storageKey(file), JSON.stringify({id: upload.id, url: upload.url}));
+        return upload;
+    }
+
+    async function uploadFile(input, file, token, progress) {
+        const upload = await startUpload(input, file, token);
+        let offset = upload.offset;
+        let retries = 0;
+        while (offset < file.size) {
+            progress.value = offset / file.size;
+            try {
+                const status = await request(upload.url + "?offset=" + offset, {
+                    method: "POST",
+                    headers: {"X-CSRFToken": token, "Content-Type": "application/octet-stream"},
+                    body: file.slice(offset, offset + CHUNK_SIZE),
+                });
+                offset = status.offset;
+                retries = 0;
+            } catch (error) {
+                if (error.fatal || retries >= MAX_RETRIES) {
+                    localStorage.removeItem(storageKey(file));
+                    throw error;
+                }
+                retries += 1;
+                await sleep(1000 * retries);
+                // the server may have received a part of the chunk
+                offset = (await request(upload.url).catch(() => ({offset: offset}))).offset;
+            }
+        }
+        progress.value = 1;
+        localStorage.removeItem(storageKey(file));
+        return upload.id;
+    }
+
+    async function submit(event) {
+        const form = event.target;
+        const inputs = Array.from(form.querySelectorAll("input[type=file][data-chunked-upload]"))
+            .filter((input) => input.files.length === 1);
+        if (inputs.length === 0) {
+            return;
+        }
+        event.preventDefault();
+        const token = csrfToken(form);
+        for (const button of form.querySelectorAll("[type=submit]")) {
+            button.disabled = true;
+        }
+        try {
+            for (const input of inputs) {
+                const progress = document.createElement("progress");
+                progress.className = "w-100";
+                input.after(progress);
+                const uploadId = await uploadFile(input, input.files[0], token, progress);
+                const hidden = document.createElement("input");
+                hidden.type = "hidden";
+                hidden.name = input.name + "_upload";
+                hidden.value = uploadId;
+                form.appendChild(hidden);
+                // the file was uploaded already, it must not be sent with the form again
+                input.value = "";
+                input.removeAttribute("required");
+            }
+            form.submit();
+        } catch (error) {
+            for (const button of form.querySelectorAll("[type=submit]")) {
+                button.disabled = false;
+            }
+            window.alert(error.message);
+        }
+    }
+
+    document.addEventListener("DOMContentLoaded", function () {
+        for (const input of document.querySelectorAll("input[type=file][data-chunked-upload]")) {
+            if (!input.form.dataset.chunkedUpload) {
+                input.form.dataset.chunkedUpload = "true";
+                input.form.addEventListener("submit", submit);
+            }
+        }
+    });
+})();
@@ -3,6 +3,7 @@ from django import forms
 from django.db.models import Max
 
 from meetings.models import Meeting
+from toptool.forms import ChunkedFileInput
 
 from .models import StandardTop, Top
 
@@ -15,6 +16,7 @@ class BaseTopForm(forms.ModelForm):
         exclude = ["meeting", "topid", "user"]
         widgets = {
             "description": CKEditorWidget(),
+            "attachment": ChunkedFileInput(),
         }
 
     def __init__(self, *args, **kwargs):
@@ -22,12 +24,15 @@ class BaseTopForm(forms.ModelForm):
             self.meeting: Meeting = kwargs["instance"].meeting
         else:
             self.meeting = kwargs.pop("meeting")
+        user = kwargs.pop("user")
         super().__init__(*args, **kwargs)
         if self.meeting.meetingtype.anonymous_tops:
             self.fields["author"].required = False
             self.fields["email"].required = False
         if not (self.meeting.meetingtype.attachment_tops and self.authenticated):
             del self.fields["attachment"]
+        else:
+            self.fields["attachment"].widget.user = user
 
     def save(self, commit=True):
         instance = super().save(False)
@@ -0,0 +1,29 @@
+# Generated by Django 4.1.13 on 2026-10-18 16:14
+
+from django.db import migrations
+
+import tops.models
+import toptool.utils.files
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tops", "0012_top_attachment_metadata"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="top",
+            name="attachment",
+            field=toptool.utils.files.AttachmentField(
+                blank=True,
+                help_text="Erlaubte Dateiformate: pdf, ods, xlsx, png, jpg, jpeg",
+                null=True,
+                storage=tops.models.AttachmentStorage(),
+                upload_to=tops.models.attachment_path,
+                validators=[toptool.utils.files.validate_file_type],
+                verbose_name="Anhang",
+            ),
+        ),
+    ]
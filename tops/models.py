@@ -1,19 +1,24 @@
 import uuid
+from typing import Any, Optional
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.storage import FileSystemStorage
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 
-from toptool.utils.files import validate_file_type
+from toptool.models import Blob, release_attachment, store_attachment
+from toptool.utils import thumbnails
+from toptool.utils.files import AttachmentField, sniff_file, validate_file_type
 
 
 class AttachmentStorage(FileSystemStorage):
-    def url(self, name):
-        top = Top.objects.get(attachment=name)
-        return reverse("tops:show_attachment", args=[top.id])
+    """
+    The storage of the attachments, their urls are built by Top.get_attachment_url (see AttachmentFieldFile).
+    """
 
 
 def attachment_path(instance, filename):
@@ -56,7 +61,7 @@ class Top(CommonTOP):
     author = models.CharField(_("Dein Name"), max_length=50)
     email = models.EmailField(_("Deine E-Mailadresse"))
 
-    attachment = models.FileField(
+    attachment = AttachmentField(
         _("Anhang"),
         upload_to=attachment_path,
         validators=[validate_file_type],
@@ -67,6 +72,45 @@ class Top(CommonTOP):
         blank=True,
         null=True,
     )
+    # sniffed when the file is uploaded, see toptool.utils.files.sniff_file
+    attachment_content_type = models.CharField(_("Dateityp"), max_length=100, blank=True, editable=False)
+    attachment_size = models.PositiveBigIntegerField(_("Dateigröße"), blank=True, null=True, editable=False)
+    attachment_sha256 = models.CharField(_("SHA-256"), max_length=64, blank=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        previous: Optional[str] = None
+        with transaction.atomic():
+            # pylint: disable-next=protected-access
+            if not self._state.adding and (not self.attachment or not self.attachment._committed):
+                # the attachment is removed or replaced, its previous file is released after saving
+                previous = Top.objects.filter(pk=self.pk).values_list("attachment", flat=True).first()
+            if not self.attachment:
+                self.attachment_content_type, self.attachment_size, self.attachment_sha256 = "", None, ""
+            # pylint: disable-next=protected-access
+            elif not self.attachment._committed:
+                self.attachment_content_type, self.attachment_size, self.attachment_sha256 = sniff_file(self.attachment)
+                store_attachment(self.attachment, self.attachment_sha256)
+                thumbnails.generate_thumbnail_later(
+                    self.attachment.path,
+                    self.attachment_sha256,
+                    self.attachment_content_type,
+                )
+            super().save(*args, **kwargs)
+            release_attachment(previous)
+
+    def get_attachment_url(self) -> str:
+        """
+        @return: the url the attachment is served at
+        """
+        return reverse("tops:show_attachment", args=[self.id])
+
+    def get_thumbnail_url(self) -> str:
+        """
+        @return: the url the thumbnail of the attachment is served at or an empty string, if it has no thumbnail
+        """
+        if not self.attachment_sha256 or not thumbnails.supports_thumbnail(self.attachment_content_type):
+            return ""
+        return reverse("tops:show_attachment_thumbnail", args=[self.id, self.attachment_sha256])
 
     def __str__(self) -> str:
         if self.author and self.email:
@@ -83,3 +127,18 @@ class StandardTop(CommonTOP):
 
     def __str__(self) -> str:
         return self.title
+
+
+# pylint: disable=unused-argument
+@receiver(post_delete, sender=Top)
+def delete_attachment(sender: type[Top], instance: Top, **kwargs: Any) -> None:
+    """
+    Signal listener that releases the attachment, when a TOP object is deleted.
+
+    @param sender: the sender of the event
+    @param instance: the Top
+    """
+    Blob.release(instance.attachment.name)
+
+
+# pylint: enable=unused-argument
@@ -1,6 +1,9 @@
 # pylint: disable=too-few-public-methods
 # pylint: disable=missing-function-docstring
+import hashlib
+
 import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
 from mixer.backend.django import mixer
 
 pytestmark = pytest.mark.django_db
@@ -12,3 +15,18 @@ class TestMeeting:
         assert obj.pk not in (None, ""), "Should create a Top instance"
         obj = mixer.blend("tops.StandardTop")
         assert obj.pk not in (None, ""), "Should create a StandardTop instance"
+
+
+class TestTopAttachment:
+    def test_metadata_is_stored_on_upload(self, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+        content = b"%PDF-1.4\n%Test Inhalt\n"
+        top = mixer.blend("tops.Top", attachment=SimpleUploadedFile("test.pdf", content))
+        top.refresh_from_db()
+        assert top.attachment_content_type == "application/pdf"
+        assert top.attachment_size == len(content)
+        assert top.attachment_sha256 == hashlib.sha256(content).hexdigest()
+
+        top.attachment = None
+        top.save()
+        assert top.attachment_content_type == "" and top.attachment_size is None, "Should reset the metadata"
@@ -12,6 +12,11 @@ urlpatterns = [
                 path("edit/<uuid:top_pk>/", views.edit_top, name="edit_top"),
                 path("delete/<uuid:top_pk>/", views.del_top, name="del_top"),
                 path("attachment/<uuid:top_pk>/", views.show_attachment, name="show_attachment"),
+                path(
+                    "attachment/<uuid:top_pk>/thumbnail/<str:sha256>/",
+                    views.show_attachment_thumbnail,
+                    name="show_attachment_thumbnail",
+                ),
             ],
         ),
     ),
@@ -6,13 +6,14 @@ from django.contrib.auth.views import redirect_to_login
 from django.core.exceptions import PermissionDenied, ValidationError
 from django.core.handlers.wsgi import WSGIRequest
 from django.http import Http404, HttpResponse, HttpResponseBadRequest
-from django.http.response import JsonResponse
+from django.http.response import HttpResponseBase, JsonResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.views.decorators.clickjacking import xframe_options_exempt
 
 from meetings.models import Meeting
 from meetingtypes.models import MeetingType
-from toptool.utils.files import prep_file
+from meetingtypes.search import deferred_indexing
+from toptool.utils.files import prep_file, send_thumbnail
 from toptool.utils.helpers import get_meeting_or_404_on_validation_error
 from toptool.utils.permission import at_least_admin, at_least_sitzungsleitung, auth_login_required, require
 from toptool.utils.shortcuts import render
@@ -72,18 +73,20 @@ def sort_tops(request: AuthWSGIRequest, meeting_pk: UUID) -> HttpResponse:
         tops = request.POST.getlist("tops[]")
         tops = [t for t in tops if t]
         if tops:
-            for counter, top_id in enumerate(tops):
-                try:
-                    top_pk = top_id.partition("_")[2]
-                except IndexError:
-                    return HttpResponseBadRequest()
-                try:
-                    top = Top.objects.get(pk=top_pk)
-                except (Top.DoesNotExist, ValidationError):
-                    return HttpResponseBadRequest()
-                if top.topid < 10000:
-                    top.topid = counter + 1
-                    top.save()
+            # the TOPs of the meeting are indexed once
+            with deferred_indexing():
+                for counter, top_id in enumerate(tops):
+                    try:
+                        top_pk = top_id.partition("_")[2]
+                    except IndexError:
+                        return HttpResponseBadRequest()
+                    try:
+                        top = Top.objects.get(pk=top_pk)
+                    except (Top.DoesNotExist, ValidationError):
+                        return HttpResponseBadRequest()
+                    if top.topid < 10000:
+                        top.topid = counter + 1
+                        top.save()
             return JsonResponse({"success": True})
 
     return HttpResponseBadRequest()
@@ -190,7 +193,7 @@ def del_top(request: AuthWSGIRequest, top_pk: UUID) -> HttpResponse:
     return render(request, "tops/del.html", context)
 
 
-def show_attachment(request: WSGIRequest, top_pk: UUID) -> HttpResponse:
+def show_attachment(request: WSGIRequest, top_pk: UUID) -> HttpResponseBase:
     """
     Shows the attachment of a given TOP.
 
@@ -209,15 +212,41 @@ def show_attachment(request: WSGIRequest, top_pk: UUID) -> HttpResponse:
     if not meeting.meetingtype.public:
         if not request.user.is_authenticated:
             return redirect_to_login(request.get_full_path())
-        if not request.user.has_perm(meeting.meetingtype.access_permission):
-            raise PermissionDenied
+    _check_attachment_permission(request, top)
+
+    return prep_file(request, top.attachment.path, top.attachment_content_type)
+
+
+def show_attachment_thumbnail(request: WSGIRequest, top_pk: UUID, sha256: str) -> HttpResponseBase:
+    """
+    Shows the thumbnail of the attachment of a given TOP.
+
+    @permission: allowed only by users with permission for the meetingtype or allowed for public if public-bit set
+    @param request: a WSGIRequest
+    @param top_pk: uuid of a TOP
+    @param sha256: the hash of the attachment, so the thumbnail can be cached until the attachment is replaced
+    @return: a HttpResponse
+    """
+
+    top: Top = get_object_or_404(Top, pk=top_pk)
+    _check_attachment_permission(request, top)
+    if not top.attachment or sha256 != top.attachment_sha256:
+        raise Http404
+    return send_thumbnail(request, top.attachment.path, top.attachment_sha256, top.attachment_content_type)
+
+
+def _check_attachment_permission(request: WSGIRequest, top: Top) -> None:
+    """
+    Raises PermissionDenied or Http404, if the user may not view the attachment of the TOP.
+    """
+    meeting: Meeting = top.meeting
+    if not meeting.meetingtype.public and not request.user.has_perm(meeting.meetingtype.access_permission):
+        raise PermissionDenied
     require(not meeting.imported)
 
     if not meeting.meetingtype.tops or not meeting.meetingtype.attachment_tops:
         raise Http404
 
-    return prep_file(top.attachment.path)
-
 
 def add_top(request: WSGIRequest, meeting_pk: UUID) -> HttpResponse:
     """
@@ -267,6 +296,7 @@ def add_top(request: WSGIRequest, meeting_pk: UUID) -> HttpResponse:
         request.POST or None,
         request.FILES or None,
         meeting=meeting,
+        user=request.user,
         initial=initial,
         authenticated=authenticated,
     )
@@ -325,6 +355,7 @@ def edit_top(request: AuthWSGIRequest, top_pk: UUID) -> HttpResponse:
         request.POST or None,
         request.FILES or None,
         instance=top,
+        user=request.user,
         user_edit=user_edit,
     )
     if form.is_valid():
@@ -168,6 +168,7 @@ def _generate_meetingtypes() -> None:
             point_of_order_tag=random.choice((True, False)),
             attachment_protokoll=random.choice((True, False)),
             pad_setting=random.choice((True, False)),
+            lazy_pdf=random.choice((True, False, False)),
             tops=random.choice((True, False)),
             top_perms=random.choice(mt_models.MeetingType.TOP_PERMS)[0],
             top_user_edit=random.choice((True, True, True, False)),
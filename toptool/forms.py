@@ -1,10 +1,18 @@
 # pylint: disable=imported-auth-user
-from typing import Any
+import os
+from pathlib import Path
+from typing import Any, Optional, Union
 
 from django import forms
-from django.contrib.auth.models import User
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.exceptions import ValidationError
+from django.db.models import F
+from django.urls import reverse_lazy
 from django.utils.translation import gettext_lazy as _
 
+from toptool.models import Upload
+
 
 class DualListField(forms.ModelMultipleChoiceField):
     def __init__(self, *args, **kwargs):
@@ -26,6 +34,89 @@ class UserDualListField(DualListField):
         return "invalid-user"
 
 
+class ChunkedFileInput(forms.ClearableFileInput):
+    """
+    A file input, whose file is uploaded in chunks by toptool/js/chunked_upload.js before the form is sent.
+    The form only contains the id of the complete upload in the field "<name>_upload".
+    Without javascript, the file is sent with the form as usual.
+
+    Only the uploads of the user set by the form can be used, the ids of other uploads are ignored.
+    """
+
+    class Media:
+        js = ["toptool/js/chunked_upload.js"]
+
+    def __init__(self, attrs=None):
+        super().__init__({"data-chunked-upload": reverse_lazy("start_upload"), **(attrs or {})})
+        self.user: Optional[Union[User, AnonymousUser]] = None
+
+    def value_from_datadict(self, data, files, name):
+        upload_pk = data.get(name + "_upload")
+        if upload_pk and self.user is not None and self.user.is_authenticated:
+            try:
+                upload = Upload.objects.filter(pk=upload_pk, user=self.user, offset=F("size")).first()
+            except ValidationError:
+                upload = None
+            if upload is not None:
+                staged_file = upload.open()
+                if staged_file is not None:
+                    return staged_file
+        return super().value_from_datadict(data, files, name)
+
+    def value_omitted_from_data(self, data, files, name):
+        return super().value_omitted_from_data(data, files, name) and not data.get(name + "_upload")
+
+
+class StartUploadForm(forms.Form):
+    """
+    Validates the file of an upload in chunks before the first chunk is sent (see toptool.views.start_upload).
+    """
+
+    filename = forms.CharField()
+    size = forms.IntegerField(error_messages={"required": _("Die Dateigröße fehlt.")})
+
+    def clean_filename(self) -> str:
+        """
+        @return: the name of the file without its directories, if its extension is allowed
+        """
+        filename: str = os.path.basename(self.cleaned_data["filename"])
+        extension = Path(filename).suffix[1:].lower()
+        if extension not in settings.ALLOWED_FILE_TYPES:
+            raise ValidationError(
+                _("Diese Dateierweiterung %(extension)s wird nicht unterstützt. ") % {"extension": extension},
+            )
+        return filename[:200]
+
+    def clean_size(self) -> int:
+        """
+        @return: the size of the file, if it does not exceed settings.CHUNKED_UPLOAD_MAX_SIZE
+        """
+        size: int = self.cleaned_data["size"]
+        if not 0 < size <= settings.CHUNKED_UPLOAD_MAX_SIZE:
+            raise ValidationError(_("Die Datei ist zu groß."))
+        return size
+
+
+class UploadChunkForm(forms.Form):
+    """
+    Validates the position of a chunk of an upload (see toptool.views.upload_chunk).
+    """
+
+    offset = forms.IntegerField(min_value=0)
+    length = forms.IntegerField(min_value=0)
+
+    def __init__(self, *args, **kwargs):
+        self.upload: Upload = kwargs.pop("upload")
+        super().__init__(*args, **kwargs)
+
+    def clean(self) -> dict[str, Any]:
+        cleaned_data: dict[str, Any] = super().clean() or {}
+        if "offset" in cleaned_data and "length" in cleaned_data:
+            if cleaned_data["offset"] + cleaned_data["length"] > self.upload.size:
+                raise ValidationError(_("Die Datei ist zu groß."))
+        return cleaned_data
+
+
 class EmailForm(forms.Form):
     subject = forms.CharField(label=_("Betreff"))
     text = forms.CharField(
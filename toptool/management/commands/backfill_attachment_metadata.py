@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from protokolle.models import Attachment
+from tops.models import Top
+from toptool.utils.files import sniff_file
+
+
+class Command(BaseCommand):
+    help = "Stores the mime type, size and hash of attachments, which were uploaded before these were recorded."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Recompute the metadata of all attachments, not only of the ones without metadata.",
+        )
+
+    def handle(self, *args, **options):
+        attachments = Attachment.objects.all()
+        tops = Top.objects.exclude(attachment="").exclude(attachment__isnull=True)
+        if not options["all"]:
+            attachments = attachments.filter(attachment_sha256="")
+            tops = tops.filter(attachment_sha256="")
+        for queryset in [attachments, tops]:
+            updated = 0
+            for instance in queryset.iterator():
+                try:
+                    with instance.attachment.open("rb") as file:
+                        metadata = sniff_file(file)
+                except OSError as err:
+                    self.stderr.write(f"{instance.attachment.name}: {err}")
+                    continue
+                instance.attachment_content_type, instance.attachment_size, instance.attachment_sha256 = metadata
+                instance.save(update_fields=["attachment_content_type", "attachment_size", "attachment_sha256"])
+                updated += 1
+            self.stdout.write(f"{queryset.model.__name__}: updated {updated}")
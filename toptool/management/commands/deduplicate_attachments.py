@@ -0,0 +1,96 @@
+import os
+import time
+from pathlib import Path
+from typing import Union
+
+from django.conf import settings
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+
+from protokolle.models import Attachment
+from tops.models import Top
+from toptool.models import Blob, BLOB_DIR
+from toptool.utils.files import sniff_file
+
+# seconds after which a file in the blob store without a blob is considered orphaned
+ORPHAN_MIN_AGE = 24 * 60 * 60
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves the attachments, which were uploaded before the blob store was introduced, into the blob store, "
+        "so files with the same content are only stored once. "
+        "Afterwards the reference counts of all blobs are recounted and unreferenced blobs are removed."
+    )
+
+    def handle(self, *args, **options):
+        freed = 0
+        for model in [Attachment, Top]:
+            moved = 0
+            queryset = model.objects.exclude(attachment="").exclude(attachment__isnull=True)
+            for instance in queryset.exclude(attachment__startswith=BLOB_DIR + "/").iterator():
+                try:
+                    freed += self._move_to_blob_store(instance)
+                except OSError as err:
+                    self.stderr.write(f"{instance.attachment.name}: {err}")
+                    continue
+                moved += 1
+            self.stdout.write(f"{model.__name__}: moved {moved} attachments into the blob store")
+        freed += self._recount_references()
+        self.stdout.write(f"freed {freed} bytes")
+
+    @staticmethod
+    def _move_to_blob_store(instance: Union[Attachment, Top]) -> int:
+        """
+        @return: the size of the old file, if it was removed
+        """
+        old_name: str = instance.attachment.name
+        old_path: str = instance.attachment.path
+        # Attachment and Top have primary keys of different types, so the row is updated via the model class
+        model: type[models.Model] = type(instance)
+        with transaction.atomic(), open(old_path, "rb") as old_file:
+            file = File(old_file, name=old_name)
+            content_type, size, sha256 = sniff_file(file)
+            blob = Blob.store(file, sha256)
+            model._default_manager.filter(pk=instance.pk).update(
+                attachment=blob.file.name,
+                attachment_content_type=content_type,
+                attachment_size=size,
+                attachment_sha256=sha256,
+            )
+        # the same file may be referenced by other attachments, which are moved later
+        if Attachment.objects.filter(attachment=old_name).exists() or Top.objects.filter(attachment=old_name).exists():
+            return 0
+        os.remove(old_path)
+        return size
+
+    def _recount_references(self) -> int:
+        """
+        Fixes the reference counts, e.g. after a crash, and removes the blobs and files, which are not referenced.
+
+        @return: the number of bytes freed
+        """
+        references: dict[str, int] = {}
+        for model in [Attachment, Top]:
+            counts = model.objects.filter(attachment__startswith=BLOB_DIR + "/").values("attachment")
+            for row in counts.annotate(count=models.Count("pk")):
+                references[row["attachment"]] = references.get(row["attachment"], 0) + row["count"]
+        freed = 0
+        for blob in Blob.objects.iterator():
+            refcount = references.get(blob.file.name, 0)
+            if blob.refcount != refcount:
+                self.stdout.write(f"{blob.file.name}: {blob.refcount} references recorded, {refcount} found")
+                Blob.objects.filter(pk=blob.pk).update(refcount=refcount)
+            if refcount == 0:
+                Blob.remove_unreferenced(blob.file.name)
+                freed += blob.size
+        # files of blobs, which were created in a transaction that was rolled back.
+        # Recent files are kept, as they may belong to an upload, whose transaction is not committed yet.
+        known: set[str] = set(Blob.objects.values_list("file", flat=True))
+        for path in Path(settings.MEDIA_ROOT, BLOB_DIR).glob("*/*"):
+            name = path.relative_to(settings.MEDIA_ROOT).as_posix()
+            if name not in known and path.stat().st_mtime < time.time() - ORPHAN_MIN_AGE:
+                freed += path.stat().st_size
+                path.unlink()
+        return freed
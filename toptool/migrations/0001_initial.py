@@ -0,0 +1,22 @@
+# Generated by Django 4.1.13 on 2026-10-18 16:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="Blob",
+            fields=[
+                ("sha256", models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name="SHA-256")),
+                ("file", models.FileField(unique=True, upload_to="", verbose_name="Datei")),
+                ("size", models.PositiveBigIntegerField(verbose_name="Dateigröße")),
+                ("refcount", models.PositiveIntegerField(default=0, verbose_name="Anzahl der Referenzen")),
+            ],
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.1.13 on 2026-10-18 16:35
+
+import uuid
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("toptool", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Upload",
+            fields=[
+                ("id", models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ("filename", models.CharField(max_length=200, verbose_name="Dateiname")),
+                ("size", models.PositiveBigIntegerField(verbose_name="Dateigröße")),
+                ("offset", models.PositiveBigIntegerField(default=0, verbose_name="Empfangene Bytes")),
+                ("content_type", models.CharField(blank=True, max_length=100, verbose_name="Dateityp")),
+                ("created", models.DateTimeField(auto_now_add=True, verbose_name="Erstellt")),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Benutzer",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.1.13 on 2026-10-18 16:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("toptool", "0002_upload"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedFile",
+            fields=[
+                ("name", models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name="Dateiname")),
+                ("archive", models.CharField(db_index=True, max_length=255, verbose_name="Archiv")),
+            ],
+        ),
+    ]
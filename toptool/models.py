@@ -0,0 +1,390 @@
+import functools
+import io
+import os
+import struct
+import uuid
+import zipfile
+from contextlib import suppress
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import BinaryIO, cast, Iterable, Optional, TYPE_CHECKING
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.files.uploadedfile import UploadedFile
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.fields.files import FieldFile
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from toptool.utils import thumbnails
+
+if TYPE_CHECKING:
+    from _typeshed import WriteableBuffer
+
+# all blobs are stored in MEDIA_ROOT/blobs/<first two characters of the hash>/<hash><extension>
+BLOB_DIR = "blobs"
+# files uploaded in chunks are staged in MEDIA_ROOT/uploads/<id>.part, until the upload is attached to a TOP or protokoll
+UPLOAD_DIR = "uploads"
+# the files of old meetings are moved into MEDIA_ROOT/archive/<meetingtype>/<year>.zip (see toptool.utils.archives)
+ARCHIVE_DIR = "archive"
+# the local file header of a member of a zip archive, it ends with the lengths of the filename and the extra field
+_ZIP_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+_ZIP_LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+
+
+def blob_path(sha256: str, filename: str) -> str:
+    """
+    constructs the path for the blob file
+
+    dir:      MEDIA_ROOT/blobs/<sha256[:2]>/
+    filename: <sha256><extension of the first uploaded file>
+    """
+    return f"{BLOB_DIR}/{sha256[:2]}/{sha256}{Path(filename).suffix.lower()}"
+
+
+class Blob(models.Model):
+    """
+    A file in the content-addressed store, which is shared by all attachments (TOPs and protokolle) with this content.
+    The file is removed, when the last attachment referencing it is deleted or replaced.
+    """
+
+    sha256 = models.CharField(_("SHA-256"), max_length=64, primary_key=True)
+    file = models.FileField(_("Datei"), unique=True)
+    size = models.PositiveBigIntegerField(_("Dateigröße"))
+    refcount = models.PositiveIntegerField(_("Anzahl der Referenzen"), default=0)
+
+    @classmethod
+    def store(cls, file: File, sha256: str) -> "Blob":
+        """
+        Adds a reference to the blob with this content and writes the file, if it is not stored yet.
+
+        @param file: the uploaded file
+        @param sha256: the sha256 hash of the file (see toptool.utils.files.sniff_file)
+        @return: the blob
+        """
+        with transaction.atomic():
+            # the lock serializes storing and removing the same content
+            blob, created = cls.objects.select_for_update().get_or_create(
+                sha256=sha256,
+                defaults={"file": blob_path(sha256, file.name or ""), "size": file.size},
+            )
+            if created or blob.refcount == 0 or not os.path.exists(blob.file.path):
+                blob.write(file)
+            blob.refcount = F("refcount") + 1
+            blob.save(update_fields=["refcount"])
+        blob.refresh_from_db(fields=["refcount"])
+        return blob
+
+    @classmethod
+    def release(cls, name: Optional[str]) -> None:
+        """
+        Removes a reference to the blob with this file name.
+        The file is removed after the transaction is committed, if this was the last reference.
+        Files, which were not stored in the blob store, are not affected.
+
+        @param name: the name of the file of the attachment
+        """
+        if not name or not name.startswith(BLOB_DIR + "/"):
+            return
+        updated: int = cls.objects.filter(file=name, refcount__gt=0).update(refcount=F("refcount") - 1)
+        if updated:
+            transaction.on_commit(functools.partial(cls.remove_unreferenced, name))
+
+    @classmethod
+    def remove_unreferenced(cls, name: str) -> None:
+        """
+        Removes the blob with this file name and its file, if it is not referenced anymore.
+
+        @param name: the name of the file of the blob
+        """
+        with transaction.atomic():
+            blob = cls.objects.select_for_update().filter(file=name, refcount=0).first()
+            if blob is None:
+                return
+            if os.path.exists(blob.file.path):
+                os.remove(blob.file.path)
+            ArchivedFile.forget([blob.file.path])
+            thumbnails.remove_thumbnail(blob.sha256)
+            blob.delete()
+
+    def write(self, file: File) -> None:
+        """
+        Writes the content of the file to the blob. The file is replaced atomically, so it is never read partially.
+        Files already stored on disk (uploads, which were staged in a temporary file) are moved instead of copied.
+
+        @param file: the file with the content of this blob
+        """
+        path: str = self.file.path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if hasattr(file, "temporary_file_path"):
+            try:
+                os.replace(file.temporary_file_path(), path)
+            except OSError:
+                pass  # e.g. the temporary file is on another filesystem
+            else:
+                os.chmod(path, 0o644)
+                return
+        with NamedTemporaryFile(dir=os.path.dirname(path), prefix=".tmp-", delete=False) as tmp_file:
+            try:
+                file.seek(0)
+                for chunk in file.chunks():
+                    tmp_file.write(chunk)
+                tmp_file.flush()
+                os.fchmod(tmp_file.fileno(), 0o644)
+            except BaseException:
+                os.remove(tmp_file.name)
+                raise
+        os.replace(tmp_file.name, path)
+        file.seek(0)
+
+    def __str__(self) -> str:
+        return f"{self.sha256} ({self.refcount})"
+
+
+def store_attachment(attachment: FieldFile, sha256: str) -> None:
+    """
+    Stores a newly uploaded attachment in the blob store instead of the storage of its field,
+    so identical files are only stored once. The caller has to release the previous file (see release_attachment).
+
+    @param attachment: the uploaded, not yet committed file of the attachment field
+    @param sha256: the sha256 hash of the file (see toptool.utils.files.sniff_file)
+    """
+    # the uploaded file itself, so a file staged on disk can be moved into the blob store
+    blob = Blob.store(attachment.file, sha256)
+    attachment.name = blob.file.name
+    # the file is already stored, so FileField.pre_save does not save it again
+    attachment._committed = True  # type: ignore[attr-defined]  # pylint: disable=protected-access
+
+
+def release_attachment(name: Optional[str]) -> None:
+    """
+    Releases the previous file of a replaced or removed attachment. Files in the blob store are released
+    (see Blob.release), files stored before the blob store was introduced only belong to this attachment,
+    so they are removed after the transaction is committed.
+
+    @param name: the name of the previous file of the attachment
+    """
+    if not name:
+        return
+    if name.startswith(BLOB_DIR + "/"):
+        Blob.release(name)
+    else:
+        transaction.on_commit(functools.partial(_remove_media_file, name))
+
+
+def _remove_media_file(name: str) -> None:
+    with suppress(FileNotFoundError):
+        os.remove(os.path.join(settings.MEDIA_ROOT, name))
+
+
+class Upload(models.Model):
+    """
+    A file, which is uploaded in chunks, so an interrupted upload can be resumed (see toptool.views.upload_chunk).
+    Once it is complete, it can be used instead of the file in the attachment fields (see toptool.forms.ChunkedFileInput).
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, verbose_name=_("Benutzer"))
+    filename = models.CharField(_("Dateiname"), max_length=200)
+    size = models.PositiveBigIntegerField(_("Dateigröße"))
+    # the number of bytes, which were received and written to the staging file
+    offset = models.PositiveBigIntegerField(_("Empfangene Bytes"), default=0)
+    content_type = models.CharField(_("Dateityp"), max_length=100, blank=True)
+    created = models.DateTimeField(_("Erstellt"), auto_now_add=True)
+
+    @property
+    def path(self) -> str:
+        """
+        @return: the path of the staging file
+        """
+        return os.path.join(settings.MEDIA_ROOT, UPLOAD_DIR, f"{self.id}.part")
+
+    @property
+    def complete(self) -> bool:
+        """
+        @return: True, if all bytes of the file were received
+        """
+        return self.offset == self.size
+
+    def open(self) -> Optional["StagedUploadedFile"]:
+        """
+        @return: the complete uploaded file or None, if the upload is not complete or was attached already
+        """
+        if not self.complete:
+            return None
+        try:
+            file = open(self.path, "rb")  # pylint: disable=consider-using-with
+        except FileNotFoundError:
+            return None
+        return StagedUploadedFile(file, self.filename, self.content_type, self.size)
+
+    def delete_file(self) -> None:
+        """
+        Removes the staging file, if it still exists.
+        """
+        with suppress(FileNotFoundError):
+            os.remove(self.path)
+
+    @classmethod
+    def remove_expired(cls) -> None:
+        """
+        Removes the uploads (and their staging files), which were started more than settings.UPLOAD_EXPIRY ago.
+        """
+        expired = cls.objects.filter(created__lt=timezone.now() - settings.UPLOAD_EXPIRY)
+        for upload in expired:
+            upload.delete_file()
+        expired.delete()
+
+    def __str__(self) -> str:
+        return f"{self.filename} ({self.offset}/{self.size})"
+
+
+class StagedUploadedFile(UploadedFile):
+    """
+    A file uploaded in chunks. Like a TemporaryUploadedFile, it is moved instead of copied, when it is stored.
+    """
+
+    def __init__(self, file: BinaryIO, name: str, content_type: str, size: int) -> None:
+        super().__init__(file, name, content_type, size)
+        self._path: str = file.name
+
+    def temporary_file_path(self) -> str:
+        """
+        @return: the path of the staging file, which is moved to its destination, when the file is stored
+        """
+        return self._path
+
+
+class ArchivedFile(models.Model):
+    """
+    The index of the archives: a file, which was moved from MEDIA_ROOT into a zip archive (see toptool.utils.archives).
+    A file on disk takes precedence over its archived copy, so regenerated files do not have to be removed from
+    the archive. The member is read with random access, the archive is never unpacked as a whole.
+    """
+
+    # the path relative to MEDIA_ROOT the file was stored at, also used as name of the member in the archive
+    name = models.CharField(_("Dateiname"), max_length=255, primary_key=True)
+    # the path of the archive relative to MEDIA_ROOT
+    archive = models.CharField(_("Archiv"), max_length=255, db_index=True)
+
+    @staticmethod
+    def relative_name(path: str) -> Optional[str]:
+        """
+        @return: the path relative to MEDIA_ROOT or None, if the path is outside of MEDIA_ROOT
+        """
+        media_root = Path(settings.MEDIA_ROOT).resolve()
+        resolved_path = Path(path).resolve()
+        if not resolved_path.is_relative_to(media_root):
+            return None
+        return resolved_path.relative_to(media_root).as_posix()
+
+    @classmethod
+    def find(cls, path: str) -> Optional["ArchivedFile"]:
+        """
+        @param path: the path the file was stored at before it was archived
+        @return: the archived file or None, if the file is not archived
+        """
+        name: Optional[str] = cls.relative_name(path)
+        if name is None:
+            return None
+        return cls.objects.filter(name=name).first()
+
+    @classmethod
+    def forget(cls, paths: Iterable[str]) -> None:
+        """
+        Removes the archived copies of these files from the index.
+        Their members are dropped from the archive, when it is written the next time.
+
+        @param paths: the paths the files were stored at
+        """
+        names: list[str] = [name for name in map(cls.relative_name, paths) if name is not None]
+        cls.objects.filter(name__in=names).delete()
+
+    @property
+    def archive_path(self) -> str:
+        """
+        @return: the absolute path of the archive
+        """
+        return os.path.join(settings.MEDIA_ROOT, self.archive)
+
+    def open(self) -> tuple[BinaryIO, zipfile.ZipInfo]:
+        """
+        Opens the member of the archive. Only the central directory and the member itself are read.
+
+        @return: the opened member and its metadata (size, checksum and modification time)
+        @raise FileNotFoundError: if the archive or the member does not exist
+        """
+        with zipfile.ZipFile(self.archive_path) as archive:
+            try:
+                info: zipfile.ZipInfo = archive.getinfo(self.name)
+            except KeyError as err:
+                raise FileNotFoundError(f"{self.name} is not in {self.archive}") from err
+            if info.compress_type != zipfile.ZIP_STORED:
+                # the compressed files are small text files (see ZIP_DEFLATED_EXTENSIONS)
+                return cast(BinaryIO, archive.open(info)), info
+        # zipfile seeks in stored members by reading up to the position, so they are read from the archive directly
+        # pylint: disable-next=consider-using-with
+        file = open(self.archive_path, "rb")  # noqa: SIM115
+        try:
+            file.seek(info.header_offset)
+            header: bytes = file.read(_ZIP_LOCAL_HEADER.size)
+            if len(header) != _ZIP_LOCAL_HEADER.size or header[:4] != _ZIP_LOCAL_HEADER_SIGNATURE:
+                raise zipfile.BadZipFile(f"Bad local file header of {self.name} in {self.archive}")
+            filename_length, extra_length = _ZIP_LOCAL_HEADER.unpack(header)[-2:]
+            start: int = info.header_offset + _ZIP_LOCAL_HEADER.size + filename_length + extra_length
+        except BaseException:
+            file.close()
+            raise
+        return io.BufferedReader(_ArchiveMember(file, self.name, start, info.file_size)), info
+
+    def __str__(self) -> str:
+        return f"{self.name} ({self.archive})"
+
+
+class _ArchiveMember(io.RawIOBase):
+    """
+    A seekable, read-only view of an uncompressed member of a zip archive.
+    """
+
+    def __init__(self, file: BinaryIO, name: str, start: int, size: int) -> None:
+        super().__init__()
+        self._file = file
+        self.name = name
+        self._start = start
+        self._size = size
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base: int = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self._size}[whence]
+        if base + offset < 0:
+            raise ValueError("negative seek position")
+        self._position = base + offset
+        return self._position
+
+    def readinto(self, buffer: "WriteableBuffer") -> int:
+        with memoryview(buffer).cast("B") as view:
+            length: int = max(min(len(view), self._size - self._position), 0)
+            if length == 0:
+                return 0
+            self._file.seek(self._start + self._position)
+            data: bytes = self._file.read(length)
+            view[: len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def close(self) -> None:
+        if not self.closed:
+            self._file.close()
+        super().close()
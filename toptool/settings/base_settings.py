@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/1.9/ref/settings/
 """
 
+from datetime import timedelta
 from pathlib import Path
 from typing import Optional
 
@@ -140,6 +141,13 @@ THOUSAND_SEPARATOR = "."
 MEDIA_ROOT = BASE_DIR / "media"
 MEDIA_URL = "/media/"
 
+# How protokolle and attachments are sent to the user after the permission checks:
+# "python" streams them through django,
+# "x-accel-redirect" (nginx) lets the web server send them from PROTECTED_MEDIA_URL, an internal location for MEDIA_ROOT,
+# "x-sendfile" (apache/lighttpd) lets the web server send them from their path in MEDIA_ROOT
+FILE_DOWNLOAD_BACKEND = "python"
+PROTECTED_MEDIA_URL = "/protected-media/"
+
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = "/static/"
 STATIC_ROOT = BASE_DIR / "static"
@@ -180,6 +188,41 @@ ALLOWED_FILE_TYPES: dict[str, str] = {
     "jpeg": "image/jpeg",
 }
 
+# attachments can be uploaded in chunks, so interrupted uploads of large files can be resumed.
+# Uploads, which were not attached to a TOP or protokoll within UPLOAD_EXPIRY, are removed.
+CHUNKED_UPLOAD_MAX_SIZE = 200 * 1024 * 1024
+UPLOAD_EXPIRY = timedelta(days=1)
+
+# the generated protokolle and attachments of meetings older than ARCHIVE_AFTER_YEARS complete years
+# are moved into compressed archives per meetingtype and year by the archive_old_files command
+ARCHIVE_AFTER_YEARS = 5
+
+# thumbnails of the first page of image and pdf attachments,
+# cached by their content and bounded by the total size of the thumbnails (least recently used are removed first)
+THUMBNAIL_CACHE_DIR: Path = MEDIA_ROOT / "thumbnails"
+THUMBNAIL_CACHE_SIZE: int = 100 * 1024 * 1024
+THUMBNAIL_SIZE: tuple[int, int] = (240, 240)
+
+# protokoll generation
+# if True, txt2tags and pdflatex are run by the worker `python manage.py generate_protokolle`
+# instead of inside the request
+PROTOKOLL_GENERATION_QUEUE = False
+# seconds after which a running job is considered stale (e.g. the worker was killed) and queued again
+PROTOKOLL_GENERATION_TIMEOUT = 15 * 60
+# run the txt2tags targets (html, txt, tex) and pdflatex in parallel with at most PROTOKOLL_GENERATION_WORKERS threads
+PROTOKOLL_CONCURRENT_GENERATION = True
+PROTOKOLL_GENERATION_WORKERS = 3
+# "inprocess" uses the txt2tags python module and parses the script only once,
+# its conversions are serialized (txt2tags is not thread-safe), so only pdflatex overlaps with them
+# "subprocess" runs the txt2tags command once per target (also used as fallback if the module is not installed)
+PROTOKOLL_T2T_ENGINE = "inprocess"
+# precompiled pdflatex formats of the protokoll preambles, dumped by `python manage.py dump_latex_formats`
+# set to None to always load the preamble in pdflatex
+PROTOKOLL_LATEX_FORMAT_DIR: Optional[Path] = BASE_DIR / "latex_formats"
+# compiled protokoll texts, bounded by the number of protokolle and the total length of their texts
+PROTOKOLL_TEMPLATE_CACHE_ENTRIES: int = 64
+PROTOKOLL_TEMPLATE_CACHE_SIZE: int = 4 * 1024 * 1024
+
 # Etherpad settings
 # to disable etherpad integration set ETHERPAD_API_URL = None
 ETHERPAD_API_URL = "http://localhost:9001/api"
@@ -9,6 +9,10 @@ DATABASES = {
     },
 }
 
+PROTOKOLL_GENERATION_QUEUE = False
+
 EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
 
 MEDIA_ROOT = BASE_DIR / "test_media"  # noqa: F405
+PROTOKOLL_LATEX_FORMAT_DIR = MEDIA_ROOT / "latex_formats"
+THUMBNAIL_CACHE_DIR = MEDIA_ROOT / "thumbnails"
@@ -0,0 +1,96 @@
+# pylint: disable=missing-function-docstring
+import io
+import os
+import zipfile
+
+import pytest
+from django.test import RequestFactory
+
+from toptool.models import ArchivedFile
+from toptool.utils.archives import move_into_archive
+from toptool.utils.files import open_file, send_file, stream_zip
+
+pytestmark = pytest.mark.django_db
+
+PDF = b"%PDF-1.4\n" + bytes(range(256)) * 100
+
+
+@pytest.fixture(name="media_root")
+def fixture_media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    (tmp_path / "protokolle").mkdir()
+    (tmp_path / "protokolle" / "protokoll.pdf").write_bytes(PDF)
+    (tmp_path / "protokolle" / "protokoll.txt").write_text("Protokoll\n" * 100, encoding="UTF-8")
+    return tmp_path
+
+
+def test_move_into_archive(media_root):
+    pdf, txt = str(media_root / "protokolle" / "protokoll.pdf"), str(media_root / "protokolle" / "protokoll.txt")
+    freed = move_into_archive("archive/mt/2010.zip", [pdf, txt])
+
+    assert freed == len(PDF) + 1000
+    assert not os.path.exists(pdf) and not os.path.exists(txt)
+    assert set(ArchivedFile.objects.values_list("name", "archive")) == {
+        ("protokolle/protokoll.pdf", "archive/mt/2010.zip"),
+        ("protokolle/protokoll.txt", "archive/mt/2010.zip"),
+    }
+    with zipfile.ZipFile(media_root / "archive" / "mt" / "2010.zip") as archive:
+        assert archive.getinfo("protokolle/protokoll.pdf").compress_type == zipfile.ZIP_STORED
+        assert archive.getinfo("protokolle/protokoll.txt").compress_type == zipfile.ZIP_DEFLATED
+    with open_file(pdf) as file:
+        assert file.read() == PDF
+    with open_file(txt) as file:
+        assert file.read() == b"Protokoll\n" * 100
+
+
+def test_rewrite_keeps_indexed_members(media_root):
+    pdf, txt = str(media_root / "protokolle" / "protokoll.pdf"), str(media_root / "protokolle" / "protokoll.txt")
+    move_into_archive("archive/mt/2010.zip", [pdf])
+    ArchivedFile.forget([pdf])
+    move_into_archive("archive/mt/2010.zip", [txt])
+
+    with zipfile.ZipFile(media_root / "archive" / "mt" / "2010.zip") as archive:
+        assert archive.namelist() == ["protokolle/protokoll.txt"], "Should drop members, which are not indexed"
+    (media_root / "protokolle" / "new.pdf").write_bytes(b"%PDF-1.4\n")
+    move_into_archive("archive/mt/2010.zip", [str(media_root / "protokolle" / "new.pdf")])
+    with open_file(txt) as file:
+        assert file.read() == b"Protokoll\n" * 100, "Should keep the indexed members"
+
+
+def test_file_on_disk_takes_precedence(media_root):
+    pdf = str(media_root / "protokolle" / "protokoll.pdf")
+    move_into_archive("archive/mt/2010.zip", [pdf])
+    with open(pdf, "wb") as file:
+        file.write(b"%PDF-1.4\nneu")
+    with open_file(pdf) as file:
+        assert file.read() == b"%PDF-1.4\nneu"
+
+
+@pytest.mark.parametrize(
+    "header,status,expected",
+    [
+        ("", 200, PDF),
+        ("bytes=9-12", 206, bytes(range(4))),
+        (f"bytes=-{len(PDF) - 20000}", 206, PDF[20000:]),
+    ],
+)
+def test_send_archived_file(media_root, header, status, expected):
+    pdf = str(media_root / "protokolle" / "protokoll.pdf")
+    move_into_archive("archive/mt/2010.zip", [pdf])
+
+    request = RequestFactory().get("/", HTTP_RANGE=header) if header else RequestFactory().get("/")
+    response = send_file(request, pdf, "application/pdf")
+    assert response.status_code == status
+    assert b"".join(response.streaming_content) == expected
+
+    etag = response["ETag"]
+    response = send_file(RequestFactory().get("/", HTTP_IF_NONE_MATCH=etag), pdf, "application/pdf")
+    assert response.status_code == 304
+
+
+def test_stream_zip_of_archived_file(media_root):
+    pdf = str(media_root / "protokolle" / "protokoll.pdf")
+    move_into_archive("archive/mt/2010.zip", [pdf])
+
+    with zipfile.ZipFile(io.BytesIO(b"".join(stream_zip([("protokoll.pdf", pdf)])))) as archive:
+        assert archive.read("protokoll.pdf") == PDF
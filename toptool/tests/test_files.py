@@ -0,0 +1,141 @@
+# pylint: disable=missing-function-docstring
+import gzip
+import io
+import os
+import zipfile
+
+import pytest
+from django.test import RequestFactory
+
+from toptool.utils.files import precompress_file, send_file, send_precompressed_file, serve_file, stream_zip
+
+
+@pytest.fixture(name="path")
+def fixture_path(tmp_path):
+    path = tmp_path / "protokoll.txt"
+    path.write_bytes(b"0123456789")
+    return str(path)
+
+
+def content(response):
+    return b"".join(response.streaming_content)
+
+
+def test_serve_file(path):
+    response = serve_file(RequestFactory().get("/"), path, "text/plain")
+    assert response.status_code == 200
+    assert content(response) == b"0123456789"
+    assert response["Content-Type"] == "text/plain"
+    assert response["Accept-Ranges"] == "bytes"
+    assert "no-cache" in response["Cache-Control"], "Should let browsers revalidate the file"
+
+
+def test_not_modified(path):
+    etag = serve_file(RequestFactory().get("/"), path, "text/plain")["ETag"]
+    response = serve_file(RequestFactory().get("/", HTTP_IF_NONE_MATCH=etag), path, "text/plain")
+    assert response.status_code == 304
+    assert response["ETag"] == etag
+
+
+@pytest.mark.parametrize(
+    "header,status,expected",
+    [
+        ("bytes=2-4", 206, b"234"),
+        ("bytes=7-", 206, b"789"),
+        ("bytes=-2", 206, b"89"),
+        ("bytes=8-100", 206, b"89"),
+        ("bytes=0-1,4-5", 200, b"0123456789"),
+        ("bytes=10-", 416, b""),
+    ],
+)
+def test_range(path, header, status, expected):
+    response = serve_file(RequestFactory().get("/", HTTP_RANGE=header), path, "text/plain")
+    assert response.status_code == status
+    if status == 416:
+        assert response["Content-Range"] == "bytes */10"
+    else:
+        assert content(response) == expected
+
+
+def test_range_of_changed_file(path):
+    request = RequestFactory().get("/", HTTP_RANGE="bytes=2-4", HTTP_IF_RANGE='"outdated"')
+    response = serve_file(request, path, "text/plain")
+    assert response.status_code == 200, "Should send the whole file, if it changed since the first part was loaded"
+
+
+@pytest.mark.parametrize(
+    "backend,header,value",
+    [
+        ("x-accel-redirect", "X-Accel-Redirect", "/protected-media/protokolle/mt/protokoll%20neu.txt"),
+        ("x-sendfile", "X-Sendfile", "{media_root}/protokolle/mt/protokoll neu.txt"),
+    ],
+)
+def test_send_file_offloads_to_web_server(settings, tmp_path, backend, header, value):
+    settings.MEDIA_ROOT = tmp_path
+    settings.FILE_DOWNLOAD_BACKEND = backend
+    path = tmp_path / "protokolle" / "mt" / "protokoll neu.txt"
+    path.parent.mkdir(parents=True)
+    path.write_bytes(b"0123456789")
+
+    response = send_file(RequestFactory().get("/"), str(path), "text/plain")
+    assert response[header] == value.format(media_root=tmp_path.resolve())
+    assert response.content == b"", "Should let the web server send the file"
+    assert response["Content-Type"] == "text/plain"
+
+
+def test_send_file_outside_of_media_root(settings, path):
+    settings.FILE_DOWNLOAD_BACKEND = "x-accel-redirect"
+    response = send_file(RequestFactory().get("/"), path, "text/plain")
+    assert "X-Accel-Redirect" not in response, "Should only offload files in MEDIA_ROOT"
+    assert content(response) == b"0123456789"
+
+
+@pytest.mark.parametrize(
+    "accept_encoding,encoding",
+    [
+        ("gzip, deflate", "gzip"),
+        ("br;q=0.5, gzip", "br"),
+        ("*", "br"),
+        ("*, br;q=0", "gzip"),
+        ("gzip;q=0, identity", None),
+        ("", None),
+    ],
+)
+def test_send_precompressed_file(path, accept_encoding, encoding):
+    precompress_file(path)
+    # stands in for the copy written by brotli
+    with open(path + ".br", "wb") as file:
+        file.write(b"br")
+
+    request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING=accept_encoding)
+    response = send_precompressed_file(request, path, "text/plain")
+    assert response["Content-Type"] == "text/plain"
+    assert response["Vary"] == "Accept-Encoding"
+    assert response.get("Content-Encoding") == encoding
+    expected = {None: b"0123456789", "gzip": gzip.compress(b"0123456789", compresslevel=9, mtime=0), "br": b"br"}
+    assert content(response) == expected[encoding]
+
+
+def test_outdated_precompressed_file_is_ignored(path):
+    precompress_file(path)
+    stat = os.stat(path)
+    os.utime(path + ".gz", ns=(stat.st_atime_ns, stat.st_mtime_ns - 1))
+
+    response = send_precompressed_file(RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip"), path, "text/plain")
+    assert "Content-Encoding" not in response, "Should not send a copy of a previous version of the file"
+    assert content(response) == b"0123456789"
+
+
+def test_stream_zip(tmp_path):
+    pdf = tmp_path / "protokoll.pdf"
+    pdf.write_bytes(b"%PDF-1.4\n" * 20000)
+    txt = tmp_path / "protokoll.txt"
+    txt.write_text("Protokoll\n" * 1000)
+    chunks = list(stream_zip([("a/protokoll.pdf", str(pdf)), ("a/missing.txt", "/nonexistent"), ("a/p.txt", str(txt))]))
+    assert len(chunks) > 2, "Should send the archive while it is built"
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+        assert archive.namelist() == ["a/protokoll.pdf", "a/p.txt"]
+        assert archive.read("a/protokoll.pdf") == pdf.read_bytes()
+        assert archive.getinfo("a/protokoll.pdf").compress_type == zipfile.ZIP_STORED
+        assert archive.getinfo("a/p.txt").compress_type == zipfile.ZIP_DEFLATED
+        assert archive.testzip() is None
@@ -0,0 +1,100 @@
+# pylint: disable=missing-function-docstring
+import os
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from mixer.backend.django import mixer
+
+from protokolle.models import Attachment
+from tops.models import Top
+from toptool.models import Blob
+
+pytestmark = pytest.mark.django_db
+
+CONTENT = b"%PDF-1.4\n%Geschaeftsordnung\n"
+
+
+@pytest.fixture(name="media_root")
+def fixture_media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    return tmp_path
+
+
+def test_identical_uploads_are_stored_once(media_root):
+    top = mixer.blend("tops.Top", attachment=SimpleUploadedFile("go.pdf", CONTENT))
+    attachment = mixer.blend("protokolle.Attachment", attachment=SimpleUploadedFile("ordnung.pdf", CONTENT))
+    assert top.attachment.name == attachment.attachment.name
+    blob = Blob.objects.get()
+    assert blob.refcount == 2
+    assert blob.file.name.startswith("blobs/") and blob.file.name.endswith(".pdf")
+    with open(top.attachment.path, "rb") as file:
+        assert file.read() == CONTENT
+    assert [path.name for path in media_root.rglob("*") if path.is_file()] == [os.path.basename(blob.file.name)]
+
+
+@pytest.mark.usefixtures("media_root")
+def test_blob_is_removed_with_last_reference(django_capture_on_commit_callbacks):
+    tops = [mixer.blend("tops.Top", attachment=SimpleUploadedFile("go.pdf", CONTENT)) for _ in range(2)]
+    path = tops[0].attachment.path
+
+    with django_capture_on_commit_callbacks(execute=True):
+        tops[0].delete()
+    assert Blob.objects.get().refcount == 1
+    assert os.path.exists(path), "Should keep the file while it is referenced"
+
+    with django_capture_on_commit_callbacks(execute=True):
+        tops[1].delete()
+    assert not Blob.objects.exists()
+    assert not os.path.exists(path), "Should remove the file with the last reference"
+
+
+@pytest.mark.usefixtures("media_root")
+def test_replaced_attachment_is_released(django_capture_on_commit_callbacks):
+    top = mixer.blend("tops.Top", attachment=SimpleUploadedFile("go.pdf", CONTENT))
+    path = top.attachment.path
+
+    with django_capture_on_commit_callbacks(execute=True):
+        top.attachment = SimpleUploadedFile("go.pdf", CONTENT + b"%neu\n")
+        top.save()
+    assert not os.path.exists(path)
+    assert Blob.objects.get().file.name == top.attachment.name
+
+    with django_capture_on_commit_callbacks(execute=True):
+        top.attachment = None
+        top.save()
+    assert not Blob.objects.exists()
+
+
+def test_replaced_legacy_attachment_is_removed(media_root, django_capture_on_commit_callbacks):
+    legacy_file = media_root / "attachments" / "gruppe" / "a.pdf"
+    legacy_file.parent.mkdir(parents=True)
+    legacy_file.write_bytes(CONTENT)
+    attachment = mixer.blend("protokolle.Attachment", attachment=SimpleUploadedFile("c.pdf", b"%PDF-1.4\n"))
+    Attachment.objects.filter(pk=attachment.pk).update(attachment="attachments/gruppe/a.pdf", attachment_sha256="")
+    attachment.refresh_from_db()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        attachment.attachment = SimpleUploadedFile("a.pdf", CONTENT + b"%neu\n")
+        attachment.save()
+    assert not legacy_file.exists(), "Should remove the file stored before the blob store, as it has no blob"
+
+
+def test_deduplicate_attachments(media_root):
+    legacy_dir = media_root / "attachments" / "gruppe"
+    legacy_dir.mkdir(parents=True)
+    for name in ["a.pdf", "b.pdf"]:
+        (legacy_dir / name).write_bytes(CONTENT)
+    top = mixer.blend("tops.Top", attachment=None)
+    attachment = mixer.blend("protokolle.Attachment", attachment=SimpleUploadedFile("c.pdf", b"%PDF-1.4\n"))
+    Top.objects.filter(pk=top.pk).update(attachment="attachments/gruppe/a.pdf")
+    Attachment.objects.filter(pk=attachment.pk).update(attachment="attachments/gruppe/b.pdf", attachment_sha256="")
+
+    call_command("deduplicate_attachments")
+
+    top.refresh_from_db()
+    attachment.refresh_from_db()
+    assert top.attachment.name == attachment.attachment.name
+    assert attachment.attachment_sha256 == Blob.objects.get().sha256, "Should remove the unreferenced blob"
+    assert Blob.objects.get().refcount == 2
+    assert not (legacy_dir / "a.pdf").exists() and not (legacy_dir / "b.pdf").exists()
@@ -0,0 +1,73 @@
+# pylint: disable=missing-function-docstring
+import io
+import os
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from mixer.backend.django import mixer
+from PIL import Image
+
+from toptool.utils import thumbnails
+
+
+def png(width: int, height: int, color: str = "red") -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture(name="cache_dir")
+def fixture_cache_dir(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    settings.THUMBNAIL_CACHE_DIR = tmp_path / "thumbnails"
+    settings.THUMBNAIL_SIZE = (100, 100)
+    return settings.THUMBNAIL_CACHE_DIR
+
+
+def test_thumbnail_is_generated_lazily(cache_dir, tmp_path):
+    image = tmp_path / "scan.png"
+    image.write_bytes(png(1000, 500))
+    thumbnail = thumbnails.get_thumbnail(str(image), "ab" * 32, "image/png")
+    assert thumbnail == cache_dir / "ab" / f"{'ab' * 32}.jpg"
+    with Image.open(thumbnail) as thumbnail_image:
+        assert thumbnail_image.size == (100, 50)
+
+    os.remove(thumbnail)
+    assert thumbnails.get_thumbnail(str(image), "ab" * 32, "image/png") == thumbnail, "Should regenerate the thumbnail"
+    assert thumbnails.get_thumbnail(str(image), "cd" * 32, "application/vnd.oasis.opendocument.spreadsheet") is None
+
+
+@pytest.mark.usefixtures("cache_dir")
+def test_least_recently_used_thumbnails_are_evicted(tmp_path, settings):
+    paths = []
+    for i, color in enumerate(["red", "green", "blue"]):
+        image = tmp_path / f"{color}.png"
+        image.write_bytes(png(300, 300, color))
+        paths.append(thumbnails.generate_thumbnail(str(image), f"{i:02}" * 32, "image/png"))
+        os.utime(paths[-1], (i, i))
+    settings.THUMBNAIL_CACHE_SIZE = sum(os.path.getsize(path) for path in paths[1:])
+    os.utime(paths[0], None)  # the first thumbnail was used recently
+
+    image = tmp_path / "black.png"
+    image.write_bytes(png(300, 300, "black"))
+    new_thumbnail = thumbnails.generate_thumbnail(str(image), "ff" * 32, "image/png")
+    assert new_thumbnail.exists()
+    assert paths[0].exists(), "Should keep the recently used thumbnail"
+    assert not paths[1].exists()
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("cache_dir")
+def test_show_top_thumbnail(client):
+    meetingtype = mixer.blend("meetingtypes.MeetingType", public=True, tops=True, attachment_tops=True)
+    meeting = mixer.blend("meetings.Meeting", meetingtype=meetingtype, imported=False)
+    top = mixer.blend("tops.Top", meeting=meeting, attachment=SimpleUploadedFile("scan.png", png(400, 400)))
+
+    response = client.get(top.get_thumbnail_url())
+    assert response.status_code == 200
+    assert response["Content-Type"] == "image/jpeg"
+    assert "immutable" in response["Cache-Control"]
+
+    response = client.get(reverse("tops:show_attachment_thumbnail", args=[top.pk, "00" * 32]))
+    assert response.status_code == 404, "Should not serve the thumbnail of a replaced attachment"
@@ -0,0 +1,104 @@
+# pylint: disable=missing-function-docstring
+import os
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.test import Client
+from django.urls import reverse
+from mixer.backend.django import mixer
+
+from protokolle.forms import AttachmentForm
+from toptool.models import Blob, Upload
+
+pytestmark = pytest.mark.django_db
+
+CONTENT = b"%PDF-1.4\n" + b"%Seite\n" * 1000
+
+
+@pytest.fixture(name="client")
+def fixture_client(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    settings.THUMBNAIL_CACHE_DIR = tmp_path / "thumbnails"
+    client = Client()
+    client.force_login(mixer.blend(get_user_model()))
+    return client
+
+
+def start(client, filename="scan.pdf", size=len(CONTENT)):
+    return client.post(reverse("start_upload"), {"filename": filename, "size": size})
+
+
+def send(client, url, offset, data):
+    return client.post(f"{url}?offset={offset}", data, content_type="application/octet-stream")
+
+
+def upload_file(client):
+    url = start(client).json()["url"]
+    for offset in range(0, len(CONTENT), 1000):
+        assert send(client, url, offset, CONTENT[offset : offset + 1000]).json()["offset"] == min(
+            offset + 1000,
+            len(CONTENT),
+        )
+    return Upload.objects.get()
+
+
+def test_chunked_upload(client):
+    upload = upload_file(client)
+    assert upload.complete
+    assert upload.content_type == "application/pdf"
+    with open(upload.path, "rb") as file:
+        assert file.read() == CONTENT
+
+
+def test_resume_at_acknowledged_offset(client):
+    url = start(client).json()["url"]
+    send(client, url, 0, CONTENT[:1000])
+
+    response = send(client, url, 2000, CONTENT[2000:3000])
+    assert response.status_code == 409, "Should reject chunks after a gap"
+    assert response.json()["offset"] == 1000
+    assert client.get(url).json() == {"offset": 1000, "size": len(CONTENT)}
+
+    assert send(client, url, 1000, CONTENT[1000:]).json()["offset"] == len(CONTENT)
+
+
+def test_unsupported_files_are_rejected_early(client):
+    assert start(client, filename="script.sh").status_code == 400
+    url = start(client).json()["url"]
+    assert send(client, url, 0, b"#!/bin/sh\nrm -rf /\n").status_code == 400
+    assert not Upload.objects.exists()
+
+
+def test_upload_of_other_user(client):
+    url = start(client).json()["url"]
+    other_client = Client()
+    other_client.force_login(mixer.blend(get_user_model()))
+    assert send(other_client, url, 0, CONTENT).status_code == 404
+
+
+def test_upload_is_attached_without_copy(client):
+    upload = upload_file(client)
+    meeting = mixer.blend("meetings.Meeting")
+    data = {"name": "Scan", "attachment_upload": str(upload.id)}
+    form = AttachmentForm(data, {}, meeting=meeting, user=upload.user)
+    assert form.is_valid(), form.errors
+    attachment = form.save()
+
+    assert not os.path.exists(upload.path), "Should move the staging file into the blob store"
+    assert Blob.objects.get().file.name == attachment.attachment.name
+    with open(attachment.attachment.path, "rb") as file:
+        assert file.read() == CONTENT
+    assert attachment.attachment_size == len(CONTENT)
+
+
+def test_only_own_complete_uploads_are_attached(client):
+    upload = upload_file(client)
+    meeting = mixer.blend("meetings.Meeting")
+    data = {"name": "Scan", "attachment_upload": str(upload.id)}
+    form = AttachmentForm(data, {}, meeting=meeting, user=mixer.blend(get_user_model()))
+    assert not form.is_valid(), "Should not attach the upload of another user"
+
+    Upload.objects.filter(pk=upload.pk).update(offset=upload.size - 1)
+    form = AttachmentForm(data, {}, meeting=meeting, user=upload.user)
+    assert not form.is_valid(), "Should not attach an incomplete upload"
+    assert os.path.exists(upload.path)
@@ -8,7 +8,7 @@ from django.contrib.auth.views import LoginView, LogoutView
 from django.urls import path, URLPattern, URLResolver
 from django.views.generic import RedirectView, TemplateView
 
-from toptool.views import login_failed
+from toptool.views import login_failed, start_upload, upload_chunk
 
 urlpatterns: list[Union[URLResolver, URLPattern]] = [
     # general browser stuff
@@ -18,6 +18,9 @@ urlpatterns: list[Union[URLResolver, URLPattern]] = [
     path("admin/", admin.site.urls),
     # localization
     path("i18n/", include("django.conf.urls.i18n")),
+    # chunked uploads of attachments
+    path("upload/", start_upload, name="start_upload"),
+    path("upload/<uuid:upload_pk>/", upload_chunk, name="upload_chunk"),
     # apps
     path("profile/", include("userprofile.urls")),
     path("meeting/", include("meetings.urls")),
@@ -0,0 +1,95 @@
+import os
+import shutil
+import zipfile
+from contextlib import suppress
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Iterable
+
+from django.conf import settings
+from django.db import transaction
+
+from toptool.models import ARCHIVE_DIR, ArchivedFile
+from toptool.utils.files import FILE_CHUNK_SIZE, ZIP_DEFLATED_EXTENSIONS
+
+
+def archive_name(meetingtype_id: str, year: int) -> str:
+    """
+    constructs the name of the archive of a meetingtype and year
+
+    dir:      MEDIA_ROOT/archive/<meetingtype>/
+    filename: <year>.zip
+    """
+    return f"{ARCHIVE_DIR}/{meetingtype_id}/{year}.zip"
+
+
+def move_into_archive(archive: str, paths: Iterable[str]) -> int:
+    """
+    Moves files from MEDIA_ROOT into a zip archive and adds them to the index (see ArchivedFile).
+
+    The archive is rewritten with the members, which are still indexed, and the new files. It replaces the old
+    archive atomically, so files are read from the old or the new archive while it is written.
+    A file is only removed from disk, if it was not replaced while it was copied (e.g. by a regeneration).
+
+    @param archive: the name of the archive relative to MEDIA_ROOT (see archive_name)
+    @param paths: the paths of the files to archive; files, which do not exist, are skipped
+    @return: the number of bytes freed on disk
+    """
+    archive_path = Path(settings.MEDIA_ROOT, archive)
+    archive_path.parent.mkdir(parents=True, exist_ok=True)
+    added: dict[str, tuple[str, os.stat_result]] = {}
+    for path in paths:
+        name = ArchivedFile.relative_name(path)
+        if name is None:
+            raise ValueError(f"{path} is not in MEDIA_ROOT")
+        with suppress(FileNotFoundError):
+            added[name] = (path, os.stat(path))
+    if not added:
+        return 0
+    kept: set[str] = set(ArchivedFile.objects.filter(archive=archive).values_list("name", flat=True)) - set(added)
+    copied: set[str] = set()
+
+    with NamedTemporaryFile(dir=archive_path.parent, prefix=".tmp-", suffix=".zip", delete=False) as tmp_file:
+        try:
+            with zipfile.ZipFile(tmp_file, mode="w", allowZip64=True) as new_archive:
+                if kept and archive_path.exists():
+                    with zipfile.ZipFile(archive_path) as old_archive:
+                        for info in old_archive.infolist():
+                            if info.filename in kept:
+                                with old_archive.open(info) as src, new_archive.open(info, mode="w") as dst:
+                                    shutil.copyfileobj(src, dst, FILE_CHUNK_SIZE)
+                                copied.add(info.filename)
+                for name, (path, _stat) in list(added.items()):
+                    try:
+                        _write_member(new_archive, name, path)
+                    except FileNotFoundError:
+                        del added[name]
+            os.fchmod(tmp_file.fileno(), 0o644)
+        except BaseException:
+            os.remove(tmp_file.name)
+            raise
+    os.replace(tmp_file.name, archive_path)
+
+    with transaction.atomic():
+        ArchivedFile.objects.filter(archive=archive).exclude(name__in=copied).delete()
+        ArchivedFile.objects.filter(name__in=added).delete()
+        ArchivedFile.objects.bulk_create(ArchivedFile(name=name, archive=archive) for name in added)
+
+    freed = 0
+    for path, stat in added.values():
+        with suppress(FileNotFoundError):
+            current = os.stat(path)
+            if (current.st_ino, current.st_mtime_ns, current.st_size) == (stat.st_ino, stat.st_mtime_ns, stat.st_size):
+                os.remove(path)
+                freed += stat.st_size
+    return freed
+
+
+def _write_member(archive: zipfile.ZipFile, name: str, path: str) -> None:
+    with open(path, "rb") as file:
+        info = zipfile.ZipInfo.from_file(path, name)
+        # pdfs and images are stored uncompressed, so ranges can be read directly (see ArchivedFile.open)
+        if Path(name).suffix.lower() in ZIP_DEFLATED_EXTENSIONS:
+            info.compress_type = zipfile.ZIP_DEFLATED
+        with archive.open(info, mode="w") as entry:
+            shutil.copyfileobj(file, entry, FILE_CHUNK_SIZE)
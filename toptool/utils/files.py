@@ -1,13 +1,78 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import shutil
+import time
+import zipfile
+from contextlib import contextmanager, suppress
 from pathlib import Path
-from wsgiref.util import FileWrapper
+from tempfile import TemporaryDirectory
+from typing import BinaryIO, cast, Iterable, Iterator, Optional, Protocol
+from urllib.parse import quote
 
 import magic
 from django.conf import settings
-from django.core.exceptions import ValidationError
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.files import File
+from django.db import models
 from django.db.models.fields.files import FieldFile
-from django.http import HttpResponse
+from django.http import FileResponse, Http404, HttpRequest, HttpResponse, StreamingHttpResponse
+from django.http.response import HttpResponseBase
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
 from django.utils.translation import gettext_lazy as _
 
+from toptool.models import ArchivedFile
+from toptool.utils import thumbnails
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    # without brotli, only the gzip-compressed files are generated and sent
+    brotli = None
+
+# only a single range is supported, requests for multiple ranges get the whole file
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+FILE_CHUNK_SIZE = 64 * 1024
+THUMBNAIL_MAX_AGE = 365 * 24 * 60 * 60
+# files, which are compressed already (e.g. pdfs and images), are stored in zip archives without compression again
+ZIP_DEFLATED_EXTENSIONS = {".html", ".txt", ".t2t", ".tex", ".csv", ".svg"}
+# the content codings of precompressed files (in the order of preference) and the extensions of the files
+PRECOMPRESSED_ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+
+class AttachmentModel(Protocol):  # pylint: disable=too-few-public-methods
+    """A model with an AttachmentField."""
+
+    def get_attachment_url(self) -> str:
+        """
+        @return: the url of the view, which serves the attachment after checking the permissions
+        """
+
+
+class AttachmentFieldFile(FieldFile):
+    """
+    A file, whose url is built from the primary key of the model instance (see get_attachment_url),
+    as attachments are only served after checking the permissions.
+    """
+
+    @property
+    def url(self) -> str:
+        if not self:
+            raise ValueError(f"The '{self.field.name}' attribute has no file associated with it.")
+        return cast(AttachmentModel, self.instance).get_attachment_url()
+
+
+class AttachmentField(models.FileField):
+    """
+    A FileField for attachments. The model has to implement get_attachment_url.
+    Building the url does not need a query, as it uses the model instance the file belongs to.
+    """
+
+    attr_class = AttachmentFieldFile
+
 
 def validate_file_type(upload: FieldFile) -> None:
     """
@@ -35,15 +100,396 @@ def validate_file_type(upload: FieldFile) -> None:
         )
 
 
-def prep_file(path: str) -> HttpResponse:
+def sniff_file(file: File) -> tuple[str, int, str]:
+    """
+    Determines the metadata of an uploaded file, which is stored to serve it without reading it first
+
+    @param file: the uploaded file
+    @return: the mime type (sniffed like in validate_file_type), the size and the sha256 hash of the file
+    """
+    file.seek(0)
+    head: bytes = file.read(1024)
+    sha256 = hashlib.sha256(head)
+    size = len(head)
+    while chunk := file.read(FILE_CHUNK_SIZE):
+        sha256.update(chunk)
+        size += len(chunk)
+    file.seek(0)
+    return magic.from_buffer(head, mime=True), size, sha256.hexdigest()
+
+
+def prep_file(request: HttpRequest, path: str, content_type: str = "") -> HttpResponseBase:
+    """
+    Prepares an uploaded file for download by the user
+
+    @param request: the request
+    @param path: the path of the file
+    @param content_type: the mime type sniffed during the upload (see sniff_file), guessed from the extension if empty
+    @return: a response containing the file (see send_file)
+    """
+    if not content_type:
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    return send_file(request, path, content_type)
+
+
+def send_thumbnail(request: HttpRequest, path: str, sha256: str, content_type: str) -> HttpResponseBase:
+    """
+    Sends the thumbnail of an uploaded file, the thumbnail is generated if it is not cached.
+    The permissions have to be checked before, and the url has to contain the hash of the file,
+    as browsers may cache the thumbnail forever.
+
+    @param request: the request
+    @param path: the path of the file
+    @param sha256: the sha256 hash of the file
+    @param content_type: the mime type of the file
+    @return: a response containing the jpeg thumbnail (see send_file)
+    """
+    with _file_on_disk(path, keep_archived=thumbnails.thumbnail_path(sha256).exists()) as local_path:
+        thumbnail: Optional[Path] = thumbnails.get_thumbnail(local_path, sha256, content_type)
+    if thumbnail is None:
+        raise Http404
+    response = send_file(request, str(thumbnail), "image/jpeg")
+    # the thumbnail of a file never changes
+    response["Cache-Control"] = f"private, max-age={THUMBNAIL_MAX_AGE}, immutable"
+    return response
+
+
+@contextmanager
+def _file_on_disk(path: str, keep_archived: bool = False) -> Iterator[str]:
+    """
+    Provides the path of a file on disk for tools, which can not read from archives.
+
+    @param path: the path of the file
+    @param keep_archived: if an archived file should not be extracted (e.g. as it is not needed)
+    @return: the path itself or the path of a temporary copy of the archived file
+    """
+    if keep_archived or os.path.exists(path):
+        yield path
+        return
+    try:
+        file: BinaryIO = open_file(path)
+    except FileNotFoundError:
+        yield path
+        return
+    with file, TemporaryDirectory() as tmp_dir:
+        tmp_path: str = os.path.join(tmp_dir, os.path.basename(path))
+        with open(tmp_path, "wb") as tmp_file:
+            shutil.copyfileobj(file, tmp_file, FILE_CHUNK_SIZE)
+        yield tmp_path
+
+
+def send_file(request: HttpRequest, path: str, content_type: str) -> HttpResponseBase:
     """
-    Prepares a file for download by the user
+    Sends a file to the user with the configured settings.FILE_DOWNLOAD_BACKEND.
+    The permissions have to be checked before. Archived files are always streamed (see serve_archived_file).
+
+    With "x-accel-redirect" or "x-sendfile", the web server sends the file (including conditional and range requests),
+    so the worker is free as soon as the response is returned. Files outside of MEDIA_ROOT are always streamed.
+
+    @param request: the request
+    @param path: the path of the file
+    @param content_type: the content type of the response
+    @return: a response containing the file or telling the web server which file to send
+    """
+    if not os.path.exists(path):
+        archived: Optional[ArchivedFile] = ArchivedFile.find(path)
+        if archived is not None:
+            return serve_archived_file(request, archived, content_type)
+    backend: str = settings.FILE_DOWNLOAD_BACKEND
+    media_root = Path(settings.MEDIA_ROOT).resolve()
+    resolved_path = Path(path).resolve()
+    if backend == "python" or not resolved_path.is_relative_to(media_root):
+        return serve_file(request, path, content_type)
+    response = HttpResponse(content_type=content_type)
+    if backend == "x-accel-redirect":
+        relative_path: str = resolved_path.relative_to(media_root).as_posix()
+        response["X-Accel-Redirect"] = settings.PROTECTED_MEDIA_URL.rstrip("/") + "/" + quote(relative_path)
+    elif backend == "x-sendfile":
+        response["X-Sendfile"] = str(resolved_path)
+    else:
+        raise ImproperlyConfigured(f"Unknown FILE_DOWNLOAD_BACKEND {backend!r}")
+    # the files are only accessible with permissions and may change, so browsers have to revalidate them
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def precompress_file(path: str) -> list[str]:
+    """
+    Stores compressed copies of a file next to it (see PRECOMPRESSED_ENCODINGS), which are sent by send_precompressed_file.
+    The compression uses the highest level, as it runs only once per file instead of on every download.
+
+    @param path: the path of the file
+    @return: the extensions of the written files
     """
     with open(path, "rb") as file:
-        filetype = magic.from_buffer(file.read(1024), mime=True)
-    # can't do with open, as we have to return a valid file handle
-    # used by the renderer we return to
+        content: bytes = file.read()
+    compressed: dict[str, bytes] = {".gz": gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        compressed[".br"] = brotli.compress(content, quality=11)
+    for extension, data in compressed.items():
+        with open(path + extension, "wb") as file:
+            file.write(data)
+    return list(compressed)
+
+
+def send_precompressed_file(request: HttpRequest, path: str, content_type: str) -> HttpResponseBase:
+    """
+    Sends a file like send_file, but prefers a compressed copy (see precompress_file) the client accepts.
+    Copies older than the file are ignored, as they may belong to a previous version of the file.
+
+    @param request: the request
+    @param path: the path of the file
+    @param content_type: the content type of the uncompressed file
+    @return: a response containing the compressed or the uncompressed file (see send_file)
+    """
+    encoding: Optional[str] = None
+    with suppress(OSError):
+        modified: int = os.stat(path).st_mtime_ns
+        accepted: set[str] = _accepted_encodings(request.headers.get("Accept-Encoding", ""))
+        for candidate, extension in PRECOMPRESSED_ENCODINGS.items():
+            if candidate in accepted and _modified_since(path + extension, modified):
+                encoding = candidate
+                break
+    if encoding is None:
+        response = send_file(request, path, content_type)
+    else:
+        response = send_file(request, path + PRECOMPRESSED_ENCODINGS[encoding], content_type)
+        response["Content-Encoding"] = encoding
+    patch_vary_headers(response, ("Accept-Encoding",))
+    return response
+
+
+def _accepted_encodings(header: str) -> set[str]:
+    """
+    @return: the content codings of an Accept-Encoding header, which are not rejected with q=0
+    """
+    accepted: set[str] = set()
+    rejected: set[str] = set()
+    for item in header.split(","):
+        coding, *params = item.split(";")
+        coding = coding.strip().lower()
+        quality: float = 1.0
+        for param in params:
+            name, separator, value = param.partition("=")
+            if separator and name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        (accepted if quality > 0 else rejected).add(coding)
+    if "*" in accepted:
+        accepted.update(PRECOMPRESSED_ENCODINGS)
+    return accepted - rejected
+
+
+def _modified_since(path: str, modified: int) -> bool:
+    try:
+        return os.stat(path).st_mtime_ns >= modified
+    except OSError:
+        return False
+
+
+def serve_file(request: HttpRequest, path: str, content_type: str) -> HttpResponseBase:
+    """
+    Streams a file to the user.
+    Supports conditional requests (ETag/Last-Modified) and the download of a single byte range.
+
+    @param request: the request
+    @param path: the path of the file
+    @param content_type: the content type of the response
+    @return: a streaming response or an empty 304/412/416-response
+    """
+    # the headers are computed from the opened file, so they match the content even if the file is replaced meanwhile
     # pylint: disable-next=consider-using-with
     file = open(path, "rb")  # noqa: SIM115
-    wrapper = FileWrapper(file)
-    return HttpResponse(wrapper, content_type=filetype)
+    stat = os.fstat(file.fileno())
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    return _serve_opened_file(request, file, stat.st_size, etag, int(stat.st_mtime), content_type)
+
+
+def serve_archived_file(request: HttpRequest, archived: ArchivedFile, content_type: str) -> HttpResponseBase:
+    """
+    Streams a file, which was moved into an archive, to the user like serve_file.
+    Only the requested range is read from the archive.
+
+    @param request: the request
+    @param archived: the archived file
+    @param content_type: the content type of the response
+    @return: a streaming response or an empty 304/412/416-response
+    """
+    try:
+        file, info = archived.open()
+    except FileNotFoundError as err:
+        raise Http404 from err
+    # the checksum stays the same, when the archive is rewritten
+    etag = f'"{info.CRC:x}-{info.file_size:x}"'
+    last_modified = int(time.mktime((*info.date_time, 0, 0, -1)))
+    return _serve_opened_file(request, file, info.file_size, etag, last_modified, content_type)
+
+
+def open_file(path: str) -> BinaryIO:
+    """
+    Opens a file for reading, also if it was moved into an archive (see ArchivedFile).
+
+    @param path: the path of the file
+    @return: the opened file
+    @raise FileNotFoundError: if the file neither exists nor is archived
+    """
+    try:
+        return open(path, "rb")  # pylint: disable=consider-using-with
+    except FileNotFoundError:
+        archived: Optional[ArchivedFile] = ArchivedFile.find(path)
+        if archived is None:
+            raise
+        return archived.open()[0]
+
+
+def _serve_opened_file(
+    request: HttpRequest,
+    file: BinaryIO,
+    size: int,
+    etag: str,
+    last_modified: int,
+    content_type: str,
+) -> HttpResponseBase:
+    response: Optional[HttpResponseBase] = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        file.close()
+    else:
+        try:
+            byte_range = _requested_range(request, etag, last_modified, size)
+        except ValueError:
+            file.close()
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+        else:
+            if byte_range is None:
+                response = FileResponse(file, content_type=content_type)
+            else:
+                start, end = byte_range
+                response = StreamingHttpResponse(
+                    _read_range(file, start, end - start + 1),
+                    status=206,
+                    content_type=content_type,
+                )
+                response["Content-Length"] = str(end - start + 1)
+                response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Accept-Ranges"] = "bytes"
+    # the files are only accessible with permissions and may change, so browsers have to revalidate them
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _requested_range(request: HttpRequest, etag: str, last_modified: int, size: int) -> Optional[tuple[int, int]]:
+    """
+    @return: the first and the last byte of the requested range or None, if the whole file should be sent
+    @raise ValueError: if the requested range is not satisfiable
+    """
+    header: Optional[str] = request.headers.get("Range")
+    if not header or request.method not in ("GET", "HEAD"):
+        return None
+    if_range: Optional[str] = request.headers.get("If-Range")
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != last_modified:
+        # the file changed since the client downloaded the first part
+        return None
+    match = RANGE_RE.match(header.strip())
+    if match is None or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if not first:
+        if int(last) == 0 or size == 0:
+            raise ValueError("empty suffix range")
+        return max(size - int(last), 0), size - 1
+    if last and int(last) < int(first):
+        return None
+    if int(first) >= size:
+        raise ValueError("range starts after the end of the file")
+    return int(first), min(int(last), size - 1) if last else size - 1
+
+
+def _read_range(file: BinaryIO, start: int, length: int) -> Iterator[bytes]:
+    with file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(FILE_CHUNK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+class _ZipStream:
+    """
+    A write-only, non-seekable file for zipfile.ZipFile, which collects the written bytes until they are sent.
+    As it can not be seeked, ZipFile writes the sizes and checksums after the data of each file.
+    """
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def pop(self) -> Iterator[bytes]:
+        """
+        @return: the bytes written since the last call (nothing, if no bytes were written)
+        """
+        if self._chunks:
+            yield b"".join(self._chunks)
+            self._chunks = []
+
+
+def stream_zip(files: Iterable[tuple[str, str]]) -> Iterator[bytes]:
+    """
+    Builds a zip archive on the fly. Only one chunk of a file is kept in memory at a time and no temporary files
+    are written, so the archive can be sent while it is built (e.g. in a StreamingHttpResponse).
+
+    @param files: the name in the archive and the path of each file; files, which do not exist (anymore), are skipped
+    @return: the chunks of the zip archive
+    """
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, mode="w") as archive:  # type: ignore[arg-type]
+        for name, path in files:
+            try:
+                file, info = _open_zip_entry(path, name)
+            except FileNotFoundError:
+                continue
+            with file:
+                if Path(name).suffix.lower() in ZIP_DEFLATED_EXTENSIONS:
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                with archive.open(info, mode="w") as entry:
+                    while chunk := file.read(FILE_CHUNK_SIZE):
+                        entry.write(chunk)
+                        yield from stream.pop()
+            yield from stream.pop()
+    yield from stream.pop()
+
+
+def _open_zip_entry(path: str, name: str) -> tuple[BinaryIO, zipfile.ZipInfo]:
+    """
+    @return: the opened file and the entry for it in a zip archive; archived files are read from their archive
+    @raise FileNotFoundError: if the file neither exists nor is archived
+    """
+    try:
+        file: BinaryIO = open(path, "rb")  # pylint: disable=consider-using-with
+    except FileNotFoundError:
+        archived: Optional[ArchivedFile] = ArchivedFile.find(path)
+        if archived is None:
+            raise
+        file, member = archived.open()
+        info = zipfile.ZipInfo(name, member.date_time)
+        info.file_size = member.file_size
+        return file, info
+    # the size of the file is used to decide, if the entry needs zip64 extensions
+    return file, zipfile.ZipInfo.from_file(path, name)
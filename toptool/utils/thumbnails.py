@@ -0,0 +1,168 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from pathlib import Path
+from subprocess import PIPE, Popen, TimeoutExpired  # nosec: used in a secure manner
+from tempfile import TemporaryDirectory
+from typing import Optional
+
+from django.conf import settings
+from django.db import transaction
+from PIL import Image, UnidentifiedImageError
+
+# the content types (see toptool.utils.files.sniff_file), for which thumbnails of the first page are shown
+THUMBNAIL_CONTENT_TYPES = {"image/png", "image/jpeg", "application/pdf"}
+# pdftoppm is killed, if rendering the first page of a pdf takes longer
+PDFTOPPM_TIMEOUT = 60
+
+# thumbnails of uploaded attachments are generated one after another in the background
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="thumbnails")
+
+
+def supports_thumbnail(content_type: str) -> bool:
+    """
+    @param content_type: the content type of an attachment
+    @return: if a thumbnail can be generated for the attachment
+    """
+    return content_type in THUMBNAIL_CONTENT_TYPES
+
+
+def thumbnail_path(sha256: str) -> Path:
+    """
+    constructs the path for the thumbnail of a file
+
+    dir:      THUMBNAIL_CACHE_DIR/<sha256[:2]>/
+    filename: <sha256>.jpg
+    """
+    return Path(settings.THUMBNAIL_CACHE_DIR) / sha256[:2] / f"{sha256}.jpg"
+
+
+def get_thumbnail(path: str, sha256: str, content_type: str) -> Optional[Path]:
+    """
+    Returns the cached thumbnail of a file or generates it, if it was not generated yet or evicted from the cache.
+
+    @param path: the path of the file
+    @param sha256: the sha256 hash of the file, thumbnails are cached by the content of the file
+    @param content_type: the content type of the file
+    @return: the path of the thumbnail or None, if no thumbnail could be generated
+    """
+    thumbnail = thumbnail_path(sha256)
+    try:
+        # the modification time is the last use, the least recently used thumbnails are evicted first
+        os.utime(thumbnail)
+    except FileNotFoundError:
+        return generate_thumbnail(path, sha256, content_type)
+    return thumbnail
+
+
+def generate_thumbnail_later(path: str, sha256: str, content_type: str) -> None:
+    """
+    Generates the thumbnail of an uploaded file in the background, after the current transaction is committed.
+
+    @param path: the path of the file
+    @param sha256: the sha256 hash of the file
+    @param content_type: the content type of the file
+    """
+    if supports_thumbnail(content_type):
+        transaction.on_commit(lambda: _executor.submit(generate_thumbnail, path, sha256, content_type))
+
+
+def generate_thumbnail(path: str, sha256: str, content_type: str) -> Optional[Path]:
+    """
+    Generates a small jpeg of the (first page of the) file and adds it to the cache.
+
+    @param path: the path of the file
+    @param sha256: the sha256 hash of the file
+    @param content_type: the content type of the file
+    @return: the path of the thumbnail or None, if no thumbnail could be generated
+    """
+    if not supports_thumbnail(content_type) or not os.path.exists(path):
+        return None
+    thumbnail = thumbnail_path(sha256)
+    thumbnail.parent.mkdir(parents=True, exist_ok=True)
+    with TemporaryDirectory(dir=thumbnail.parent, prefix=".tmp-") as tmp_dir:
+        tmp_thumbnail = Path(tmp_dir) / thumbnail.name
+        try:
+            if content_type == "application/pdf":
+                _render_pdf(path, tmp_thumbnail)
+            else:
+                _render_image(path, tmp_thumbnail)
+        except (OSError, RuntimeError, UnidentifiedImageError, Image.DecompressionBombError):
+            return None
+        tmp_thumbnail.replace(thumbnail)
+    _evict(thumbnail)
+    return thumbnail
+
+
+def remove_thumbnail(sha256: str) -> None:
+    """
+    Removes the thumbnail of a file, which is not stored anymore.
+
+    @param sha256: the sha256 hash of the file
+    """
+    with suppress(FileNotFoundError):
+        os.remove(thumbnail_path(sha256))
+
+
+def _render_image(path: str, thumbnail: Path) -> None:
+    width, height = settings.THUMBNAIL_SIZE
+    with Image.open(path) as image:
+        # jpegs are decoded at a reduced scale right away, instead of decoding the full scan first
+        image.draft("RGB", (width, height))
+        image.thumbnail((width, height))
+        image.convert("RGB").save(thumbnail, "JPEG", quality=80, optimize=True)
+
+
+def _render_pdf(path: str, thumbnail: Path) -> None:
+    width: int = settings.THUMBNAIL_SIZE[0]
+    # pdftoppm (poppler-utils) renders only the first page, scaled to fit into the thumbnail
+    cmd = [
+        "pdftoppm",
+        "-f",
+        "1",
+        "-l",
+        "1",
+        "-singlefile",
+        "-jpeg",
+        "-scale-to-x",
+        str(width),
+        "-scale-to-y",
+        "-1",
+        path,
+        str(thumbnail.with_suffix("")),
+    ]
+    with Popen(cmd, stdout=PIPE, stderr=PIPE) as process:  # nosec: used in a secure manner
+        try:
+            _stdout, stderr = process.communicate(timeout=PDFTOPPM_TIMEOUT)
+        except TimeoutExpired as err:
+            process.kill()
+            raise RuntimeError(f"pdftoppm did not finish within {PDFTOPPM_TIMEOUT}s") from err
+    if process.returncode != 0 or not thumbnail.exists():
+        raise RuntimeError(stderr)
+    # pages in landscape format or very long pages are fitted into the thumbnail size as well
+    _render_image(str(thumbnail), thumbnail)
+
+
+def _evict(keep: Path) -> None:
+    """
+    Removes the least recently used thumbnails, until the cache is not larger than settings.THUMBNAIL_CACHE_SIZE.
+
+    @param keep: the thumbnail, which was just generated
+    """
+    thumbnails: list[tuple[float, int, Path]] = []
+    size = 0
+    for thumbnail in Path(settings.THUMBNAIL_CACHE_DIR).glob("*/*.jpg"):
+        try:
+            stat = thumbnail.stat()
+        except FileNotFoundError:
+            continue
+        thumbnails.append((stat.st_mtime, stat.st_size, thumbnail))
+        size += stat.st_size
+    for _mtime, thumbnail_size, thumbnail in sorted(thumbnails):
+        if size <= settings.THUMBNAIL_CACHE_SIZE:
+            break
+        if thumbnail == keep:
+            continue
+        with suppress(FileNotFoundError):
+            thumbnail.unlink()
+        size -= thumbnail_size
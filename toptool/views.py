@@ -1,12 +1,27 @@
+import fcntl
+import os
+from typing import BinaryIO, Optional
+from uuid import UUID
+
+import magic
+from django import forms
+from django.conf import settings
 from django.contrib import messages
 from django.core.handlers.wsgi import WSGIRequest
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect
+from django.urls import reverse
 from django.utils.translation import gettext as _
+from django.views.decorators.http import require_http_methods, require_POST
 
 from meetings.models import Meeting
 from meetingtypes.models import MeetingType
+from toptool.forms import StartUploadForm, UploadChunkForm
+from toptool.models import Upload
+from toptool.utils.files import FILE_CHUNK_SIZE
+from toptool.utils.permission import auth_login_required
 from toptool.utils.shortcuts import render
+from toptool.utils.typing import AuthWSGIRequest
 
 
 def next_view(next_view_name):
@@ -50,3 +65,124 @@ def login_failed(request: WSGIRequest) -> HttpResponse:
     """
     messages.error(request, _("Dir ist nicht erlaubt dich in diese Applikation einzuloggen."))
     return render(request, "base.html", {})
+
+
+@auth_login_required()
+@require_POST
+def start_upload(request: AuthWSGIRequest) -> JsonResponse:
+    """
+    Starts an upload of a file in chunks (see upload_chunk).
+
+    @permission: allowed only for logged-in users
+    @param request: a WSGIRequest by a logged-in user with the POST-parameters "filename" and "size"
+    @return: a JsonResponse with the id and the url of the upload
+    """
+    form = StartUploadForm(request.POST)
+    if not form.is_valid():
+        return _form_error_response(form)
+
+    Upload.remove_expired()
+    upload = Upload.objects.create(
+        user=request.user,
+        filename=form.cleaned_data["filename"],
+        size=form.cleaned_data["size"],
+    )
+    os.makedirs(os.path.dirname(upload.path), exist_ok=True)
+    with open(upload.path, "wb"):
+        pass
+    return JsonResponse(
+        {"id": upload.id, "url": reverse("upload_chunk", args=[upload.id]), "offset": 0, "size": upload.size},
+    )
+
+
+@auth_login_required()
+@require_http_methods(["GET", "POST"])
+def upload_chunk(request: AuthWSGIRequest, upload_pk: UUID) -> JsonResponse:
+    """
+    Appends the request body to an upload at the offset given in the GET-parameter "offset".
+    With GET, the offset to resume an interrupted upload at is returned.
+
+    The mime type is checked with the first chunk, so uploads of unsupported files are rejected early.
+
+    @permission: allowed only for the user, who started the upload
+    @param request: a WSGIRequest by a logged-in user
+    @param upload_pk: uuid of an Upload
+    @return: a JsonResponse with the number of bytes received so far
+    """
+    upload: Upload = get_object_or_404(Upload, pk=upload_pk, user=request.user)
+    if request.method == "GET":
+        return JsonResponse({"offset": upload.offset, "size": upload.size})
+
+    form = UploadChunkForm(
+        {"offset": request.GET.get("offset"), "length": request.headers.get("Content-Length")},
+        upload=upload,
+    )
+    if not form.is_valid():
+        return _form_error_response(form)
+    try:
+        file = open(upload.path, "r+b")  # pylint: disable=consider-using-with
+    except FileNotFoundError:
+        return JsonResponse({"error": "the upload was attached or expired"}, status=404)
+    with file:
+        error_response: Optional[JsonResponse] = _write_chunk(
+            request,
+            upload,
+            file,
+            form.cleaned_data["offset"],
+            form.cleaned_data["length"],
+        )
+    return error_response or JsonResponse({"offset": upload.offset, "size": upload.size})
+
+
+def _write_chunk(
+    request: WSGIRequest,
+    upload: Upload,
+    file: BinaryIO,
+    offset: int,
+    length: int,
+) -> Optional[JsonResponse]:
+    """
+    Writes the request body to the staging file of the upload and acknowledges it, if it was received completely.
+
+    @return: a JsonResponse, if the chunk was rejected
+    """
+    try:
+        # a client retrying a chunk, while the first attempt is still received, has to wait for it
+        fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return JsonResponse({"offset": upload.offset, "size": upload.size}, status=409)
+    upload.refresh_from_db(fields=["offset"])
+    if offset != upload.offset:
+        # the client has to resume at the acknowledged offset
+        return JsonResponse({"offset": upload.offset, "size": upload.size}, status=409)
+    # bytes after the acknowledged offset belong to a chunk, which was interrupted
+    file.truncate(offset)
+    file.seek(offset)
+    received = 0
+    while received < length:
+        chunk: bytes = request.read(min(FILE_CHUNK_SIZE, length - received))
+        if not chunk:
+            break
+        file.write(chunk)
+        received += len(chunk)
+    file.flush()
+    if offset == 0:
+        file.seek(0)
+        upload.content_type = magic.from_buffer(file.read(1024), mime=True)
+        if upload.content_type not in settings.ALLOWED_FILE_TYPES.values():
+            upload.delete_file()
+            upload.delete()
+            return JsonResponse({"error": _("Der Dateityp wird nicht unterstützt. ")}, status=400)
+    # the chunk is only acknowledged, when it was received completely
+    if received == length:
+        upload.offset = offset + length
+        upload.save(update_fields=["offset", "content_type"])
+    return None
+
+
+def _form_error_response(form: forms.Form) -> JsonResponse:
+    """
+    @return: a JsonResponse with the validation errors of the form
+    """
+    errors: list[str] = [str(error) for field_errors in form.errors.values() for error in field_errors]
+    return JsonResponse({"error": " ".join(errors)}, status=400)